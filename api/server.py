@@ -0,0 +1,315 @@
+# File: api/server.py
+
+import argparse
+import asyncio
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    from aiohttp import web
+except ImportError:
+    # The API is optional; the desktop app does not need aiohttp
+    web = None
+
+from data.database_manager import DatabaseManager
+from models.fleet_analytics import group_measurements
+from models.prediction_service import PredictionService, DEFAULT_WEAR_THRESHOLD, forecast_asset_history
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+READ_WORKERS = 4
+PAGE_LIMIT = 500
+MAX_PAGE_LIMIT = 5000
+CACHE_SIZE = 256
+
+ASSET_FIELDS = ("asset_id", "tul_id", "asset_type_id", "instance_number", "installation_date",
+                "notes", "asset_type_name", "location")
+MEASUREMENT_FIELDS = ("measurement_id", "asset_id", "date", "wear", "shims", "notes",
+                      "tul_id", "asset_type_id", "instance_number", "asset_type_name", "wear_threshold")
+
+def to_json(value):
+    """Serialize a response body, writing dates as ISO strings."""
+    return json.dumps(value, default=lambda v: v.isoformat()).encode()
+
+class ApiService:
+    """Blocking data access for the API, run off the event loop.
+    
+    Reads run on a pool of worker threads, each holding its own read-only
+    DatabaseManager and PredictionService. Writes go through one writer
+    thread and one write connection. GET responses are cached with the
+    database watermark they saw: the highest MeasurementID, the latest
+    MeasurementChanges Seq and the ReferenceVersion. They are reused until
+    any of these moves, and a moved ReferenceVersion also drops each
+    reader's cached TULs, asset types and assets.
+    """
+    
+    def __init__(self, db_path, read_workers=READ_WORKERS, cache_size=CACHE_SIZE, wal=False):
+        self.db_path = db_path
+        self.wal = wal
+        self.read_workers = read_workers
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._read_pool = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="api-read")
+        self._write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-write")
+        self._writer = None
+        
+        # Bring older databases up to the current schema (e.g. AssetTypes.FitMethod) before reading
+        schema = DatabaseManager(db_path)
+        schema.create_tables()
+        schema.close()
+        
+        # key -> (watermark, body); in-flight computations are shared by key
+        self._cache = OrderedDict()
+        self._pending = {}
+        
+    def _reader(self):
+        """This read worker's PredictionService over its own read-only DatabaseManager."""
+        if not hasattr(self._local, "service"):
+            self._local.service = PredictionService(DatabaseManager(self.db_path, read_only=True))
+            self._local.reference_version = None
+        
+        # Other connections' edits to thresholds, fit methods, assets or TULs reach no listener here
+        service = self._local.service
+        version = service.db_manager.reference_version(analytics=True)
+        if version != self._local.reference_version:
+            service.reference_data.invalidate()
+            service.on_data_changed("AssetTypes")
+            self._local.reference_version = version
+        return service
+        
+    def _writer_db(self):
+        """The write connection, only used on the writer thread."""
+        if self._writer is None:
+            self._writer = DatabaseManager(self.db_path, wal=self.wal)
+        return self._writer
+    
+    async def read(self, func, *args):
+        """Run func(prediction_service, *args) on a read worker."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_pool, lambda: func(self._reader(), *args))
+    
+    async def write(self, func, *args):
+        """Run func(db_manager, *args) on the writer thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_pool, lambda: func(self._writer_db(), *args))
+    
+    async def cached(self, key, func, *args):
+        """JSON body of func(prediction_service, *args), reused while no new reading arrives."""
+        watermark = await self.read(lambda service: (service.db_manager.get_latest_measurement_id(analytics=True),
+                                                     service.db_manager.latest_change_seq(analytics=True),
+                                                     service.db_manager.reference_version(analytics=True)))
+        
+        hit = self._cache.get(key)
+        if hit and hit[0] == watermark:
+            self._cache.move_to_end(key)
+            return hit[1]
+        
+        # Concurrent requests for the same data wait on one computation
+        pending = self._pending.get(key)
+        if pending and pending[0] == watermark:
+            return await asyncio.shield(pending[1])
+        
+        future = asyncio.ensure_future(self.read(lambda service: to_json(func(service, *args))))
+        self._pending[key] = (watermark, future)
+        try:
+            body = await future
+        finally:
+            if self._pending.get(key, (None, None))[1] is future:
+                del self._pending[key]
+        
+        self._cache[key] = (watermark, body)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return body
+        
+    def _close_reader(self, barrier):
+        """Close this read worker's connections, once every worker holds one of these tasks."""
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        if hasattr(self._local, "service"):
+            self._local.service.db_manager.close()
+            del self._local.service
+        
+    def close(self):
+        """Close the read connections on their own threads, then the write connection.
+        
+        The write connection closes last, so a WAL database can go back to a
+        rollback journal.
+        """
+        barrier = threading.Barrier(self.read_workers)
+        for future in [self._read_pool.submit(self._close_reader, barrier) for _ in range(self.read_workers)]:
+            future.result()
+        self._read_pool.shutdown()
+        if self._writer is not None:
+            self._write_pool.submit(self._writer.close).result()
+        self._write_pool.shutdown()
+
+# Blocking queries, called with a read worker's PredictionService
+def list_assets(service, tul_id, asset_type_id):
+    rows = service.db_manager.get_assets(tul_id, asset_type_id, analytics=True)
+    return [dict(zip(ASSET_FIELDS, row)) for row in rows]
+
+def page_measurements(service, after_id, limit, asset_id, tul_id, asset_type_id):
+    rows = service.db_manager.get_measurements_page(after_id, limit, asset_id, tul_id, asset_type_id,
+                                                    analytics=True)
+    return {
+        "measurements": [dict(zip(MEASUREMENT_FIELDS, row)) for row in rows],
+        "next_after_id": rows[-1][0] if len(rows) == limit else None,
+    }
+
+def forecast_asset(service, asset_id, days_ahead):
+    """Fit the asset's current wear segment and forecast its threshold crossing."""
+    rows = service.db_manager.get_measurements(asset_id=asset_id, analytics=True)
+    if not rows:
+        return None
+    threshold = DEFAULT_WEAR_THRESHOLD if rows[0][10] is None else float(rows[0][10])
+    
+    _, _, days, wear = group_measurements(rows)
+    result = {"asset_id": asset_id, "threshold": threshold}
+    result.update(forecast_asset_history(days, wear, threshold, days_ahead, with_range=True,
+                                         fit_method=service.get_fit_method(rows[0][7])))
+    return result
+
+def forecast_fleet(service, asset_type_id, days_ahead):
+    threshold, forecasts = service.forecast_type(asset_type_id, days_ahead, with_range=True)
+    return {"asset_type_id": asset_type_id, "threshold": threshold,
+            "forecasts": [dict(forecast, asset_id=asset_id) for asset_id, forecast in forecasts.items()]}
+
+def insert_measurements(db, records):
+    known = {row[0] for row in db.get_assets_by_ids(sorted({r[0] for r in records}))}
+    unknown = sorted({r[0] for r in records} - known)
+    if unknown:
+        return None, f"Unknown assets: {', '.join(unknown)}"
+    ids = db.add_measurements(records)
+    if ids is None:
+        return None, "Measurements could not be saved"
+    return ids, "Measurements added"
+
+def parse_amount(item, name, default=None):
+    """A finite, non-negative number from a POSTed measurement, raising ValueError otherwise."""
+    value = item.get(name, default)
+    if value is None:
+        raise ValueError(f"{name} is required")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    # float() accepts "nan" and "inf", which would poison every fit of the asset
+    if not math.isfinite(number) or number < 0:
+        raise ValueError(f"{name} must be a finite number of at least 0")
+    return number
+
+def parse_measurement(item):
+    """Validate one POSTed measurement and return it as a database record."""
+    if not isinstance(item, dict):
+        raise ValueError("each measurement must be an object")
+    asset_id = item.get("asset_id")
+    if not isinstance(asset_id, str) or not asset_id:
+        raise ValueError("asset_id is required")
+    date = datetime.strptime(str(item.get("date")), '%Y-%m-%d').strftime('%Y-%m-%d')
+    wear = parse_amount(item, "wear")
+    shims = parse_amount(item, "shims", 0)
+    return (asset_id, date, wear, shims, str(item.get("notes", "")))
+
+def int_param(request, name, default, maximum=None):
+    """Integer query parameter, raising HTTPBadRequest when it is malformed."""
+    try:
+        value = int(request.query.get(name, default))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be an integer")
+    if value < 0:
+        raise web.HTTPBadRequest(text=f"{name} must not be negative")
+    return min(value, maximum) if maximum else value
+
+def json_response(body, status=200):
+    return web.Response(body=body, status=status, content_type="application/json")
+
+def create_app(db_path, read_workers=READ_WORKERS, wal=False):
+    """Build the aiohttp application serving the database at db_path.
+    
+    wal lets readers run while a write commits, at the cost of -wal and -shm
+    files next to the database while the server runs.
+    """
+    if web is None:
+        raise RuntimeError("The API server needs aiohttp (pip install aiohttp)")
+    
+    service = ApiService(db_path, read_workers, wal=wal)
+    routes = web.RouteTableDef()
+    
+    @routes.get("/assets")
+    async def get_assets(request):
+        tul_id = request.query.get("tul_id")
+        asset_type_id = request.query.get("asset_type_id")
+        body = await service.cached(("assets", tul_id, asset_type_id), list_assets, tul_id, asset_type_id)
+        return json_response(body)
+        
+    @routes.get("/measurements")
+    async def get_measurements(request):
+        after_id = int_param(request, "after_id", 0)
+        limit = int_param(request, "limit", PAGE_LIMIT, MAX_PAGE_LIMIT) or PAGE_LIMIT
+        filters = tuple(request.query.get(name) for name in ("asset_id", "tul_id", "asset_type_id"))
+        body = await service.cached(("measurements", after_id, limit) + filters,
+                                    page_measurements, after_id, limit, *filters)
+        return json_response(body)
+        
+    @routes.post("/measurements")
+    async def post_measurements(request):
+        try:
+            items = await request.json()
+            if isinstance(items, dict):
+                items = [items]
+            records = [parse_measurement(item) for item in items]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise web.HTTPBadRequest(text=f"Invalid measurements: {e}")
+        
+        ids, message = await service.write(insert_measurements, records)
+        if ids is None:
+            raise web.HTTPBadRequest(text=message)
+        return json_response(to_json({"ids": ids}), status=201)
+        
+    @routes.get("/assets/{asset_id}/forecast")
+    async def get_asset_forecast(request):
+        asset_id = request.match_info["asset_id"]
+        days_ahead = int_param(request, "days_ahead", 365, 3650)
+        body = await service.cached(("asset_forecast", asset_id, days_ahead), forecast_asset, asset_id, days_ahead)
+        if body == b"null":
+            raise web.HTTPNotFound(text=f"No measurements for asset {asset_id}")
+        return json_response(body)
+        
+    @routes.get("/forecasts/{asset_type_id}")
+    async def get_fleet_forecast(request):
+        asset_type_id = request.match_info["asset_type_id"]
+        days_ahead = int_param(request, "days_ahead", 365, 3650)
+        body = await service.cached(("fleet_forecast", asset_type_id, days_ahead),
+                                    forecast_fleet, asset_type_id, days_ahead)
+        return json_response(body)
+    
+    async def on_cleanup(app):
+        service.close()
+    
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main():
+    """Run the API server from the command line."""
+    parser = argparse.ArgumentParser(description="Local HTTP API for TUL measurements and forecasts")
+    parser.add_argument("--db", default="./tul_maintenance.db", help="SQLite database path")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=READ_WORKERS, help="Read connections in the pool")
+    parser.add_argument("--wal", action="store_true", help="Run the database in WAL mode while serving")
+    args = parser.parse_args()
+    
+    web.run_app(create_app(args.db, args.workers, args.wal), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
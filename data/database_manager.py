@@ -2,25 +2,187 @@
 
 import sqlite3
 import os
-import pandas as pd
-from datetime import datetime
+from array import array
+from datetime import date, datetime, timedelta
+from utils.instrumentation import instrument_class
+from data.query_audit import QueryAuditor
+
+# NumPy and the modules built on it (history cache, MeasurementSeries, fleet
+# analytics, downsampling) are imported where they are used, so opening the
+# database does not delay the first window
+
+# Column list shared by every asset query so rows always have the same shape
+ASSET_SELECT = """
+    SELECT a.AssetID, a.TULID, a.AssetTypeID, a.InstanceNumber, a.InstallationDate, a.Notes,
+           t.Name as AssetTypeName, tul.Location
+    FROM Assets a
+    JOIN AssetTypes t ON a.AssetTypeID = t.AssetTypeID
+    JOIN TULs tul ON a.TULID = tul.TULID
+"""
+
+# Primary-key lookups use a fixed SQL text so sqlite3's statement cache
+# compiles each of them only once per connection. ID lists are looked up in
+# chunks of ASSET_ID_BATCH, padding the last chunk with NULLs.
+ASSET_ID_BATCH = 64
+GET_ASSET_SQL = ASSET_SELECT + " WHERE a.AssetID = ?"
+GET_ASSETS_BY_IDS_SQL = ASSET_SELECT + " WHERE a.AssetID IN ({})".format(", ".join("?" * ASSET_ID_BATCH))
+
+# Setting this environment variable turns on SQL auditing for every DatabaseManager
+SQL_AUDIT_ENV = "TUL_SQL_AUDIT"
+
+# Setting this environment variable lets the desktop app run the database in WAL mode
+WAL_ENV = "TUL_WAL"
+
+# Entries kept in MeasurementChanges when it is compacted at startup
+CHANGE_LOG_KEEP = 100000
+
+# Rollup resolutions kept in MeasurementRollups: weekly and monthly
+ROLLUP_RESOLUTIONS = ("W", "M")
+
+# Up to this many changed assets are refreshed from their own readings rather than the whole history
+ROLLUP_ASSET_QUERIES = 50
+
+# Plot width assumed when the caller does not know it
+DEFAULT_PLOT_WIDTH = 1000
+
+EPOCH_DATE = date(1970, 1, 1)
 
 class DatabaseManager:
     """Handles database connections and operations for the expanded asset management system."""
     
-    def __init__(self, db_path="./tul_maintenance.db"):
+    def __init__(self, db_path="./tul_maintenance.db", auditor=None, wal=False, read_only=False):
         self.db_path = db_path
         self.connection = None
+        self.analytics_connection = None
+        
+        # WAL is a lasting change to the file, so it is opt-in and undone by close();
+        # read-only consumers such as other sites' databases are opened with mode=ro
+        self.wal = wal
+        self.read_only = read_only
+        
+        # Debug mode: log statements and audit query plans
+        if auditor is None and os.environ.get(SQL_AUDIT_ENV):
+            auditor = QueryAuditor()
+        self.auditor = auditor
+        
+        # Columnar copy of the measurement history, built on first use
+        self._history_cache = None
+        self._change_listeners = []
+        self._measurement_listeners = []
+        
+    @property
+    def history_cache(self):
+        """The HistoryCache next to the database file, or None for an in-memory database."""
+        if self._history_cache is None and self.db_path != ":memory:":
+            from data.history_cache import HistoryCache
+            self._history_cache = HistoryCache(self.db_path + ".history", read_only=self.read_only)
+        return self._history_cache
+        
+    def add_change_listener(self, callback):
+        """Register callback(table) to run after rows are added to or deleted from a table.
+        
+        Measurement inserts are reported through add_measurement_listener instead.
+        """
+        self._change_listeners.append(callback)
+        
+    def _notify_change(self, table):
+        """Tell registered listeners that a table has changed."""
+        for callback in self._change_listeners:
+            callback(table)
+        
+    def add_measurement_listener(self, callback):
+        """Register callback(asset_id, measurement_date, wear_value) to run after a measurement is added."""
+        self._measurement_listeners.append(callback)
+        
+    def notify_measurements_added(self, records):
+        """Tell measurement listeners about committed (asset_id, measurement_date, wear_value, ...) records.
+        
+        Called after inserts on this manager, and by callers whose readings
+        were committed on another connection, such as a MeasurementWriteQueue.
+        """
+        for record in records:
+            for callback in self._measurement_listeners:
+                callback(record[0], record[1], record[2])
+        
+    def _open(self, target, **kwargs):
+        """Open a sqlite3 connection, audited when the auditor is set."""
+        if self.auditor:
+            return self.auditor.connect(target, **kwargs)
+        return sqlite3.connect(target, **kwargs)
         
     def connect(self):
         """Establish connection to the SQLite database."""
         try:
-            self.connection = sqlite3.connect(self.db_path)
+            if self.read_only and self.db_path != ":memory:":
+                self.connection = self._open(self._read_only_uri(), uri=True)
+                self.connection.execute("PRAGMA query_only = ON")
+            else:
+                self.connection = self._open(self.db_path)
+                if self.wal and self.db_path != ":memory:":
+                    # WAL lets the analytics connection read while writes commit
+                    self.connection.execute("PRAGMA journal_mode=WAL")
             return True
         except sqlite3.Error as e:
             print(f"Database connection error: {e}")
             return False
         
+    def connect_analytics(self):
+        """Open the read-only connection used for long analytics queries.
+        
+        File databases get a second connection opened with mode=ro and
+        query_only, so scans never hold the write connection. An in-memory
+        database cannot be shared, so it has no analytics connection and
+        returns False; its reads use the main connection and see every write.
+        """
+        if self.analytics_connection:
+            return True
+        if self.db_path == ":memory:":
+            return False
+        
+        try:
+            self.analytics_connection = self._open(self._read_only_uri(), uri=True)
+            self.analytics_connection.execute("PRAGMA query_only = ON")
+            return True
+        except sqlite3.Error as e:
+            print(f"Analytics connection error: {e}")
+            return False
+        
+    def _read_only_uri(self):
+        from urllib.request import pathname2url
+        return "file:{}?mode=ro".format(pathname2url(os.path.abspath(self.db_path)))
+        
+    def snapshot_connection(self):
+        """Copy the database into a new read-only in-memory connection.
+        
+        Uses the online backup API, so the copy is consistent even while
+        other connections keep committing.
+        """
+        if not self.connection:
+            self.connect()
+        
+        snapshot = self._open(":memory:")
+        self.connection.backup(snapshot)
+        snapshot.execute("PRAGMA query_only = ON")
+        return snapshot
+        
+    def snapshot(self):
+        """Get a DatabaseManager over an in-memory snapshot of this database.
+        
+        All getters work on the snapshot, so several aggregation queries see
+        one consistent state. Writes to the snapshot fail.
+        """
+        snapshot = DatabaseManager(":memory:", auditor=self.auditor)
+        snapshot.connection = self.snapshot_connection()
+        return snapshot
+        
+    def _read_cursor(self, analytics=False):
+        """Cursor on the analytics connection if requested and available, else the main one."""
+        if analytics and self.connect_analytics():
+            return self.analytics_connection.cursor()
+        if not self.connection:
+            self.connect()
+        return self.connection.cursor()
+        
     def create_tables(self):
         """Create necessary tables if they don't exist."""
         if not self.connection:
@@ -45,10 +207,16 @@ class DatabaseManager:
                 AssetTypeID TEXT PRIMARY KEY,
                 Name TEXT,
                 Description TEXT,
-                WearThreshold REAL
+                WearThreshold REAL,
+                FitMethod TEXT DEFAULT 'ols'
             )
             ''')
             
+            # Databases created before fit methods were selectable lack the column
+            cursor.execute("PRAGMA table_info(AssetTypes)")
+            if "FitMethod" not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE AssetTypes ADD COLUMN FitMethod TEXT DEFAULT 'ols'")
+            
             # Create Assets table
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS Assets (
@@ -76,6 +244,84 @@ class DatabaseManager:
             )
             ''')
             
+            # Per-asset history reads and the asset filters use these instead of full scans
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_measurements_asset_date ON Measurements (AssetID, MeasurementDate)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_assets_tul_type ON Assets (TULID, AssetTypeID, InstanceNumber)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_assets_type ON Assets (AssetTypeID)")
+            
+            # Change log of Measurements, filled by triggers so every writer is covered.
+            # AUTOINCREMENT keeps Seq increasing even after old entries are compacted away.
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MeasurementChanges (
+                Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                Op TEXT NOT NULL,
+                MeasurementID INTEGER,
+                AssetID TEXT
+            )
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_measurements_insert AFTER INSERT ON Measurements
+            BEGIN
+                INSERT INTO MeasurementChanges (Op, MeasurementID, AssetID) VALUES ('I', NEW.MeasurementID, NEW.AssetID);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_measurements_update AFTER UPDATE ON Measurements
+            BEGIN
+                INSERT INTO MeasurementChanges (Op, MeasurementID, AssetID) VALUES ('U', NEW.MeasurementID, NEW.AssetID);
+            END
+            ''')
+            # A reading moved to another asset changes the history of both assets
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_measurements_move AFTER UPDATE OF AssetID ON Measurements
+            WHEN OLD.AssetID IS NOT NEW.AssetID
+            BEGIN
+                INSERT INTO MeasurementChanges (Op, MeasurementID, AssetID) VALUES ('U', OLD.MeasurementID, OLD.AssetID);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_measurements_delete AFTER DELETE ON Measurements
+            BEGIN
+                INSERT INTO MeasurementChanges (Op, MeasurementID, AssetID) VALUES ('D', OLD.MeasurementID, OLD.AssetID);
+            END
+            ''')
+            
+            # Change log position each derived table has caught up to
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ChangeConsumers (
+                Name TEXT PRIMARY KEY,
+                Seq INTEGER
+            )
+            ''')
+            
+            # Counter bumped by every change to TULs, asset types and assets, so readers on
+            # other connections can tell when their cached reference rows are stale
+            cursor.execute("CREATE TABLE IF NOT EXISTS ReferenceVersion (Version INTEGER NOT NULL)")
+            cursor.execute("INSERT INTO ReferenceVersion (Version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM ReferenceVersion)")
+            for table in ("TULs", "AssetTypes", "Assets"):
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_{event.lower()}_version AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE ReferenceVersion SET Version = Version + 1;
+                    END
+                    ''')
+            
+            # Wear per asset, maintenance segment and week or month, kept by refresh_rollups
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS MeasurementRollups (
+                Resolution TEXT,
+                AssetID TEXT,
+                Segment INTEGER,
+                PeriodStart DATE,
+                MinWear REAL,
+                MaxWear REAL,
+                MeanWear REAL,
+                ReadingCount INTEGER,
+                PRIMARY KEY (Resolution, AssetID, Segment, PeriodStart)
+            ) WITHOUT ROWID
+            ''')
+            
             # Add default asset types if they don't exist
             cursor.execute("SELECT COUNT(*) FROM AssetTypes")
             count = cursor.fetchone()[0]
@@ -110,6 +356,10 @@ class DatabaseManager:
                 )
             
             self.connection.commit()
+            self.compact_changes()
+            
+            # Builds the rollups of databases that predate them; later writes keep them current
+            self.refresh_rollups()
             return True
         except sqlite3.Error as e:
             print(f"Table creation error: {e}")
@@ -128,6 +378,7 @@ class DatabaseManager:
                 (tul_id, location, installation_date, notes)
             )
             self.connection.commit()
+            self._notify_change("TULs")
             return True
         except sqlite3.Error as e:
             print(f"Error adding TUL: {e}")
@@ -158,9 +409,10 @@ class DatabaseManager:
             cursor.execute("SELECT AssetID FROM Assets WHERE TULID = ?", (tul_id,))
             assets = cursor.fetchall()
             
-            # Delete all measurements for these assets
+            # Delete all measurements and rollups for these assets
             for asset in assets:
                 cursor.execute("DELETE FROM Measurements WHERE AssetID = ?", (asset[0],))
+                cursor.execute("DELETE FROM MeasurementRollups WHERE AssetID = ?", (asset[0],))
             
             # Delete all assets for this TUL
             cursor.execute("DELETE FROM Assets WHERE TULID = ?", (tul_id,))
@@ -169,24 +421,32 @@ class DatabaseManager:
             cursor.execute("DELETE FROM TULs WHERE TULID = ?", (tul_id,))
             
             self.connection.commit()
+            self._invalidate_history()
+            self.refresh_rollups(rebuild=False)
+            self._notify_change("TULs")
             return True
         except sqlite3.Error as e:
             print(f"Error deleting TUL: {e}")
             return False
     
     # Basic CRUD operations for Asset Types
-    def add_asset_type(self, type_id, name, description, wear_threshold):
+    def add_asset_type(self, type_id, name, description, wear_threshold, fit_method="ols"):
         """Add a new asset type to the database."""
+        from models.fleet_analytics import FIT_METHODS
+        if fit_method not in FIT_METHODS:
+            print(f"Error adding asset type: unknown fit method {fit_method!r}")
+            return False
         if not self.connection:
             self.connect()
             
         try:
             cursor = self.connection.cursor()
             cursor.execute(
-                "INSERT INTO AssetTypes (AssetTypeID, Name, Description, WearThreshold) VALUES (?, ?, ?, ?)",
-                (type_id, name, description, wear_threshold)
+                "INSERT INTO AssetTypes (AssetTypeID, Name, Description, WearThreshold, FitMethod) VALUES (?, ?, ?, ?, ?)",
+                (type_id, name, description, wear_threshold, fit_method)
             )
             self.connection.commit()
+            self._notify_change("AssetTypes")
             return True
         except sqlite3.Error as e:
             print(f"Error adding asset type: {e}")
@@ -199,12 +459,31 @@ class DatabaseManager:
             
         try:
             cursor = self.connection.cursor()
-            cursor.execute("SELECT AssetTypeID, Name, Description, WearThreshold FROM AssetTypes ORDER BY Name")
+            cursor.execute("SELECT AssetTypeID, Name, Description, WearThreshold, FitMethod FROM AssetTypes ORDER BY Name")
             return cursor.fetchall()
         except sqlite3.Error as e:
             print(f"Error getting asset types: {e}")
             return []
     
+    def set_asset_type_fit_method(self, type_id, fit_method):
+        """Choose how the wear of an asset type's assets is fitted (see fleet_analytics.FIT_METHODS)."""
+        from models.fleet_analytics import FIT_METHODS
+        if fit_method not in FIT_METHODS:
+            print(f"Error setting fit method: unknown fit method {fit_method!r}")
+            return False
+        if not self.connection:
+            self.connect()
+        
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("UPDATE AssetTypes SET FitMethod = ? WHERE AssetTypeID = ?", (fit_method, type_id))
+            self.connection.commit()
+            self._notify_change("AssetTypes")
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error setting fit method: {e}")
+            return False
+        
     def delete_asset_type(self, type_id):
         """Delete an asset type if no assets are using it."""
         if not self.connection:
@@ -223,6 +502,7 @@ class DatabaseManager:
             # Delete the asset type
             cursor.execute("DELETE FROM AssetTypes WHERE AssetTypeID = ?", (type_id,))
             self.connection.commit()
+            self._notify_change("AssetTypes")
             return True, ""
         except sqlite3.Error as e:
             print(f"Error deleting asset type: {e}")
@@ -242,25 +522,17 @@ class DatabaseManager:
                 (asset_id, tul_id, asset_type_id, instance_number, installation_date, notes)
             )
             self.connection.commit()
+            self._notify_change("Assets")
             return True
         except sqlite3.Error as e:
             print(f"Error adding asset: {e}")
             return False
     
-    def get_assets(self, tul_id=None, asset_type_id=None):
+    def get_assets(self, tul_id=None, asset_type_id=None, analytics=False):
         """Get assets filtered by TUL and/or asset type."""
-        if not self.connection:
-            self.connect()
-            
         try:
-            cursor = self.connection.cursor()
-            query = """
-                SELECT a.AssetID, a.TULID, a.AssetTypeID, a.InstanceNumber, a.InstallationDate, a.Notes,
-                       t.Name as AssetTypeName, tul.Location
-                FROM Assets a
-                JOIN AssetTypes t ON a.AssetTypeID = t.AssetTypeID
-                JOIN TULs tul ON a.TULID = tul.TULID
-            """
+            cursor = self._read_cursor(analytics)
+            query = ASSET_SELECT
             
             params = []
             if tul_id and asset_type_id:
@@ -281,6 +553,42 @@ class DatabaseManager:
             print(f"Error getting assets: {e}")
             return []
     
+    def get_asset(self, asset_id):
+        """Get a single asset by primary key, or None if it does not exist."""
+        if not self.connection:
+            self.connect()
+            
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(GET_ASSET_SQL, (asset_id,))
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Error getting asset: {e}")
+            return None
+    
+    def get_assets_by_ids(self, asset_ids):
+        """Get the assets with the given IDs, in the order the IDs were given.
+        
+        IDs that do not exist are skipped.
+        """
+        if not self.connection:
+            self.connect()
+            
+        asset_ids = list(dict.fromkeys(asset_ids))
+        try:
+            cursor = self.connection.cursor()
+            found = {}
+            for start in range(0, len(asset_ids), ASSET_ID_BATCH):
+                chunk = asset_ids[start:start + ASSET_ID_BATCH]
+                params = chunk + [None] * (ASSET_ID_BATCH - len(chunk))
+                cursor.execute(GET_ASSETS_BY_IDS_SQL, params)
+                for row in cursor.fetchall():
+                    found[row[0]] = row
+            return [found[asset_id] for asset_id in asset_ids if asset_id in found]
+        except sqlite3.Error as e:
+            print(f"Error getting assets: {e}")
+            return []
+    
     def delete_asset(self, asset_id):
         """Delete an asset and all its associated measurements."""
         if not self.connection:
@@ -289,13 +597,17 @@ class DatabaseManager:
         try:
             cursor = self.connection.cursor()
             
-            # Delete all measurements for this asset
+            # Delete all measurements and rollups for this asset
             cursor.execute("DELETE FROM Measurements WHERE AssetID = ?", (asset_id,))
+            cursor.execute("DELETE FROM MeasurementRollups WHERE AssetID = ?", (asset_id,))
             
             # Delete the asset
             cursor.execute("DELETE FROM Assets WHERE AssetID = ?", (asset_id,))
             
             self.connection.commit()
+            self._invalidate_history()
+            self.refresh_rollups(rebuild=False)
+            self._notify_change("Assets")
             return True
         except sqlite3.Error as e:
             print(f"Error deleting asset: {e}")
@@ -315,22 +627,122 @@ class DatabaseManager:
                 (asset_id, measurement_date, wear_value, shims_added, notes)
             )
             self.connection.commit()
+            self._append_history([cursor.lastrowid], [(asset_id, measurement_date, wear_value)])
+            self.refresh_rollups(rebuild=False)
+            self.notify_measurements_added([(asset_id, measurement_date, wear_value)])
             return True
         except sqlite3.Error as e:
             print(f"Error adding measurement: {e}")
             return False
     
-    def get_measurements(self, asset_id=None, tul_id=None, asset_type_id=None):
-        """Get measurements filtered by asset, TUL, and/or asset type."""
+    def add_measurements(self, records):
+        """Add many measurement records in one transaction.
+        
+        records are (asset_id, measurement_date, wear_value, shims_added, notes)
+        tuples. Returns the new MeasurementIDs in order, or None if the batch
+        failed, in which case nothing is inserted.
+        """
         if not self.connection:
             self.connect()
             
         try:
             cursor = self.connection.cursor()
+            ids = []
+            for record in records:
+                cursor.execute(
+                    "INSERT INTO Measurements (AssetID, MeasurementDate, WearValue, ShimsAdded, Notes) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    record
+                )
+                ids.append(cursor.lastrowid)
+            self.connection.commit()
+            self._append_history(ids, [record[:3] for record in records])
+            self.refresh_rollups(rebuild=False)
+            self.notify_measurements_added(records)
+            return ids
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            print(f"Error adding measurements: {e}")
+            return None
+    
+    def _append_history(self, measurement_ids, readings):
+        """Add committed (asset_id, measurement_date, wear_value) readings to the history cache."""
+        if self.history_cache is None:
+            return
+        import numpy as np
+        days = []
+        for _, measurement_date, _ in readings:
+            try:
+                days.append(int(np.datetime64(str(measurement_date), 'D').astype(np.int64)))
+            except ValueError:
+                days.append(None)
+        self.history_cache.append(measurement_ids, [r[0] for r in readings], days, [r[2] for r in readings],
+                                  self.latest_change_seq())
+        
+    def _invalidate_history(self):
+        """Drop the history cache after readings are deleted."""
+        if self.history_cache is not None:
+            self.history_cache.invalidate()
+        
+    def get_latest_measurement_id(self, analytics=False):
+        """Get the highest MeasurementID, or 0 if there are no measurements."""
+        try:
+            cursor = self._read_cursor(analytics)
+            cursor.execute("SELECT MAX(MeasurementID) FROM Measurements")
+            return cursor.fetchone()[0] or 0
+        except sqlite3.Error as e:
+            print(f"Error getting latest measurement: {e}")
+            return 0
+    
+    def get_measurements_page(self, after_id=0, limit=500, asset_id=None, tul_id=None, asset_type_id=None,
+                              analytics=False):
+        """Get up to limit measurements with MeasurementID above after_id, in ID order.
+        
+        Rows have the same columns as get_measurements. Pass the last row's
+        MeasurementID as after_id to fetch the next page.
+        """
+        try:
+            cursor = self._read_cursor(analytics)
+            
+            query = """
+                SELECT m.MeasurementID, m.AssetID, m.MeasurementDate, m.WearValue, m.ShimsAdded, m.Notes,
+                       a.TULID, a.AssetTypeID, a.InstanceNumber, t.Name as AssetTypeName, t.WearThreshold
+                FROM Measurements m
+                JOIN Assets a ON m.AssetID = a.AssetID
+                JOIN AssetTypes t ON a.AssetTypeID = t.AssetTypeID
+                WHERE m.MeasurementID > ?
+            """
+            params = [after_id]
+            if asset_id:
+                query += " AND m.AssetID = ?"
+                params.append(asset_id)
+            if tul_id:
+                query += " AND a.TULID = ?"
+                params.append(tul_id)
+            if asset_type_id:
+                query += " AND a.AssetTypeID = ?"
+                params.append(asset_type_id)
+            query += " ORDER BY m.MeasurementID LIMIT ?"
+            params.append(limit)
+            
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error getting measurements: {e}")
+            return []
+    
+    def get_measurements(self, asset_id=None, tul_id=None, asset_type_id=None, analytics=False):
+        """Get measurements filtered by asset, TUL, and/or asset type.
+        
+        With analytics=True the query runs on the read-only analytics
+        connection instead of the one writes go through.
+        """
+        try:
+            cursor = self._read_cursor(analytics)
             
             base_query = """
                 SELECT m.MeasurementID, m.AssetID, m.MeasurementDate, m.WearValue, m.ShimsAdded, m.Notes,
-                       a.TULID, a.AssetTypeID, a.InstanceNumber, t.Name as AssetTypeName
+                       a.TULID, a.AssetTypeID, a.InstanceNumber, t.Name as AssetTypeName, t.WearThreshold
                 FROM Measurements m
                 JOIN Assets a ON m.AssetID = a.AssetID
                 JOIN AssetTypes t ON a.AssetTypeID = t.AssetTypeID
@@ -357,7 +769,360 @@ class DatabaseManager:
         except sqlite3.Error as e:
             print(f"Error getting measurements: {e}")
             return []
-    
+        
+    def get_measurement_series(self, asset_id=None, tul_id=None, asset_type_id=None, analytics=True,
+                               chunk_size=50000, after_id=0):
+        """Get measurement history as a MeasurementSeries of compact arrays.
+        
+        Takes the same filters as get_measurements, plus after_id to only read
+        readings with a higher MeasurementID. Rows are streamed in chunks
+        straight into typed arrays, so no per-row tuples are kept.
+        """
+        from models.measurement import MeasurementSeries
+        try:
+            cursor = self._read_cursor(analytics)
+            
+            query = """
+                SELECT m.MeasurementID, m.AssetID,
+                       CAST(julianday(m.MeasurementDate) - 2440587.5 AS INTEGER), m.WearValue
+                FROM Measurements m
+            """
+            # Readings without a valid date cannot be placed on the time axis
+            conditions = ["julianday(m.MeasurementDate) IS NOT NULL"]
+            params = []
+            if after_id:
+                conditions.append("m.MeasurementID > ?")
+                params.append(after_id)
+            if asset_id:
+                conditions.append("m.AssetID = ?")
+                params.append(asset_id)
+            if tul_id or asset_type_id:
+                query += " JOIN Assets a ON m.AssetID = a.AssetID"
+            if tul_id:
+                conditions.append("a.TULID = ?")
+                params.append(tul_id)
+            if asset_type_id:
+                conditions.append("a.AssetTypeID = ?")
+                params.append(asset_type_id)
+            query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY m.AssetID, m.MeasurementDate"
+            
+            cursor.execute(query, params)
+            asset_ids = []
+            measurement_ids, codes, days, wear = array('i'), array('i'), array('i'), array('f')
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for measurement_id, row_asset_id, day, wear_value in rows:
+                    if not asset_ids or asset_ids[-1] != row_asset_id:
+                        asset_ids.append(row_asset_id)
+                    measurement_ids.append(measurement_id)
+                    codes.append(len(asset_ids) - 1)
+                    days.append(day)
+                    wear.append(wear_value)
+            return MeasurementSeries(asset_ids, measurement_ids, codes, days, wear)
+        except sqlite3.Error as e:
+            print(f"Error getting measurement series: {e}")
+            return MeasurementSeries.empty()
+        
+    def latest_change_seq(self, analytics=False):
+        """Get the Seq of the newest MeasurementChanges entry, or 0 if nothing has changed.
+        
+        A consumer that scans the whole Measurements table should store this
+        first and then follow changes_since from it.
+        """
+        try:
+            cursor = self._read_cursor(analytics)
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'MeasurementChanges'")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error getting change sequence: {e}")
+            return 0
+        
+    def reference_version(self, analytics=False):
+        """Get the ReferenceVersion counter, which changes whenever TULs, asset types or assets do.
+        
+        Returns 0 for databases created before the counter existed.
+        """
+        try:
+            cursor = self._read_cursor(analytics)
+            cursor.execute("SELECT Version FROM ReferenceVersion")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.OperationalError as e:
+            # Read-only site databases cannot be upgraded, so a missing table is expected
+            if "no such table" not in str(e):
+                print(f"Error getting reference version: {e}")
+            return 0
+        except sqlite3.Error as e:
+            print(f"Error getting reference version: {e}")
+            return 0
+        
+    def changes_since(self, seq, limit=None, analytics=False):
+        """Get Measurements changes after seq as (Seq, Op, MeasurementID, AssetID) rows in order.
+        
+        Op is 'I', 'U' or 'D' for an inserted, updated or deleted reading. Pass
+        the last row's Seq to read the next batch. Returns None when entries
+        after seq have already been compacted away; the consumer then has to
+        rescan Measurements.
+        """
+        try:
+            cursor = self._read_cursor(analytics)
+            
+            # Everything up to the floor is gone: the seq before the oldest entry left,
+            # or the last seq ever handed out once the log is empty
+            cursor.execute("""
+                SELECT COALESCE((SELECT MIN(Seq) - 1 FROM MeasurementChanges),
+                                (SELECT seq FROM sqlite_sequence WHERE name = 'MeasurementChanges'), 0)
+            """)
+            if seq < cursor.fetchone()[0]:
+                return None
+            
+            query = "SELECT Seq, Op, MeasurementID, AssetID FROM MeasurementChanges WHERE Seq > ? ORDER BY Seq"
+            params = [seq]
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error getting measurement changes: {e}")
+            return []
+        
+    def compact_changes(self, up_to_seq=None, keep=CHANGE_LOG_KEEP):
+        """Delete old MeasurementChanges entries.
+        
+        Removes entries up to up_to_seq when given (e.g. the oldest Seq every
+        consumer has processed), otherwise all but the newest keep entries.
+        Returns the number of entries deleted.
+        """
+        if not self.connection:
+            self.connect()
+        
+        try:
+            cursor = self.connection.cursor()
+            if up_to_seq is None:
+                cursor.execute("SELECT MAX(Seq) FROM MeasurementChanges")
+                up_to_seq = (cursor.fetchone()[0] or 0) - keep
+            cursor.execute("DELETE FROM MeasurementChanges WHERE Seq <= ?", (up_to_seq,))
+            self.connection.commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Error compacting measurement changes: {e}")
+            return 0
+        
+    def refresh_rollups(self, rebuild=True):
+        """Bring MeasurementRollups up to date with the MeasurementChanges log.
+        
+        Runs after this manager writes measurements, so readers never have
+        to. Only assets with logged changes are recomputed, each from its own
+        readings. When the rollups were never built or the log no longer
+        reaches back far enough, everything is rebuilt from the history, or
+        with rebuild=False nothing is done: writes leave that to the next
+        create_tables, and readers meanwhile compute rollups from the
+        history. Returns the number of assets recomputed.
+        """
+        if not self.connection:
+            self.connect()
+        
+        try:
+            cursor = self.connection.cursor()
+            
+            # Read the position first, so changes committed meanwhile are seen next time
+            change_seq = self.latest_change_seq()
+            cursor.execute("SELECT Seq FROM ChangeConsumers WHERE Name = 'MeasurementRollups'")
+            row = cursor.fetchone()
+            changes = self.changes_since(row[0]) if row else None
+            if changes == [] or (changes is None and not rebuild):
+                return 0
+            
+            if changes is None:
+                affected = None
+                parts = [self.get_measurement_history()]
+            else:
+                affected = sorted({change[3] for change in changes if change[3] is not None})
+                if len(affected) > ROLLUP_ASSET_QUERIES:
+                    parts = [self.get_measurement_history().subset(affected)]
+                else:
+                    parts = [self.get_measurement_series(asset_id=asset_id) for asset_id in affected]
+            records = [record for part in parts for record in self._rollup_records(part)]
+            
+            if affected is None:
+                cursor.execute("DELETE FROM MeasurementRollups")
+            else:
+                cursor.executemany("DELETE FROM MeasurementRollups WHERE AssetID = ?",
+                                   [(asset_id,) for asset_id in affected])
+            cursor.executemany(
+                "INSERT INTO MeasurementRollups (Resolution, AssetID, Segment, PeriodStart, MinWear, MaxWear, "
+                "MeanWear, ReadingCount) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            cursor.execute("INSERT OR REPLACE INTO ChangeConsumers (Name, Seq) VALUES ('MeasurementRollups', ?)",
+                           (change_seq,))
+            self.connection.commit()
+            return len(parts[0].asset_ids) if affected is None else len(affected)
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            print(f"Error refreshing rollups: {e}")
+            return 0
+        
+    def _rollup_records(self, series):
+        """MeasurementRollups rows for every asset in a MeasurementSeries."""
+        from models.fleet_analytics import rollup_periods
+        asset_ids, codes, days, wear = series.grouped()
+        records = []
+        for resolution in ROLLUP_RESOLUTIONS:
+            for code, segment, start, low, high, mean, count in zip(
+                    *(column.tolist() for column in rollup_periods(codes, days, wear, resolution))):
+                records.append((resolution, asset_ids[code], segment, str(EPOCH_DATE + timedelta(days=start)),
+                                low, high, mean, count))
+        return records
+        
+    def get_rollup_series(self, resolution, asset_id=None, tul_id=None, asset_type_id=None):
+        """Get weekly ("W") or monthly ("M") rollups as a MeasurementSeries.
+        
+        Each point is a period's mean wear at the period's first day, with one
+        point per wear segment when a reset falls inside the period;
+        measurement_ids are 0. Filters work as in get_measurements. Only
+        reads: if MeasurementRollups lags the change log, e.g. after writes
+        from another program, the rollups are computed from the history.
+        """
+        import numpy as np
+        from models.fleet_analytics import rollup_periods
+        from models.measurement import MeasurementSeries
+        try:
+            cursor = self._read_cursor(analytics=True)
+            cursor.execute("SELECT Seq FROM ChangeConsumers WHERE Name = 'MeasurementRollups'")
+            row = cursor.fetchone()
+            if row is None or row[0] != self.latest_change_seq(analytics=True):
+                history = self.get_measurement_history(asset_id, tul_id, asset_type_id)
+                asset_ids, codes, days, wear = history.grouped()
+                codes, _, starts, _, _, means, _ = rollup_periods(codes, days, wear, resolution)
+                return MeasurementSeries(asset_ids, np.zeros(len(codes)), codes, starts, means)
+            
+            query = """
+                SELECT r.AssetID, CAST(julianday(r.PeriodStart) - 2440587.5 AS INTEGER), r.MeanWear
+                FROM MeasurementRollups r
+            """
+            conditions = ["r.Resolution = ?"]
+            params = [resolution]
+            if asset_id:
+                conditions.append("r.AssetID = ?")
+                params.append(asset_id)
+            if tul_id or asset_type_id:
+                query += " JOIN Assets a ON r.AssetID = a.AssetID"
+            if tul_id:
+                conditions.append("a.TULID = ?")
+                params.append(tul_id)
+            if asset_type_id:
+                conditions.append("a.AssetTypeID = ?")
+                params.append(asset_type_id)
+            query += " WHERE " + " AND ".join(conditions) + " ORDER BY r.AssetID, r.PeriodStart, r.Segment"
+            
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error getting rollups: {e}")
+            return MeasurementSeries.empty()
+        
+        asset_ids = []
+        codes = []
+        for row in rows:
+            if not asset_ids or asset_ids[-1] != row[0]:
+                asset_ids.append(row[0])
+            codes.append(len(asset_ids) - 1)
+        return MeasurementSeries(asset_ids, np.zeros(len(rows)), codes,
+                                 [row[1] for row in rows], [row[2] for row in rows])
+        
+    def get_wear_history(self, asset_id=None, tul_id=None, asset_type_id=None, start_date=None,
+                         pixel_width=DEFAULT_PLOT_WIDTH):
+        """Get history at the resolution that suits a date range and plot width.
+        
+        The range runs from start_date (or the earliest reading) to today.
+        Returns (resolution, series) with resolution "raw", "W" or "M"; see
+        choose_resolution and get_rollup_series.
+        """
+        from utils.downsampling import choose_resolution
+        if start_date is None:
+            try:
+                cursor = self._read_cursor(analytics=True)
+                cursor.execute("SELECT MIN(MeasurementDate) FROM Measurements WHERE julianday(MeasurementDate) IS NOT NULL")
+                earliest = cursor.fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Error getting earliest measurement: {e}")
+                earliest = None
+            start_date = datetime.strptime(earliest, '%Y-%m-%d').date() if earliest else datetime.now().date()
+        
+        resolution = choose_resolution((datetime.now().date() - start_date).days, pixel_width)
+        if resolution == "raw":
+            return resolution, self.get_measurement_history(asset_id, tul_id, asset_type_id)
+        return resolution, self.get_rollup_series(resolution, asset_id, tul_id, asset_type_id)
+        
+    def _catch_up_history(self, change_seq):
+        """Append readings inserted by other connections to a stale history cache.
+        
+        Returns False when the change log shows edits or deletes, or no longer
+        reaches back to the cache, and the cache has to be rebuilt, and for
+        read-only managers, which read from SQLite instead.
+        """
+        if self.history_cache.read_only:
+            return False
+        meta = self.history_cache.read_meta()
+        if meta is None or meta.get("change_seq") is None:
+            return False
+        changes = self.changes_since(meta["change_seq"], analytics=True)
+        if changes is None or any(op != "I" for _, op, _, _ in changes):
+            return False
+        
+        new = self.get_measurement_series(after_id=meta["high_water"])
+        self.history_cache.append(new.measurement_ids.tolist(), [new.asset_ids[code] for code in new.codes],
+                                  new.days.tolist(), new.wear.tolist(), change_seq)
+        return True
+        
+    def get_measurement_history(self, asset_id=None, tul_id=None, asset_type_id=None):
+        """Get measurement history as a MeasurementSeries, from the history cache when current.
+        
+        The cache is checked against the highest MeasurementID, the row count
+        and the latest change Seq in one read transaction. When they differ,
+        readings inserted since are appended using the MeasurementChanges log;
+        after edits or deletes the cache is rebuilt from SQLite. Filters work
+        as in get_measurements.
+        """
+        from models.measurement import MeasurementSeries
+        series = None
+        cursor = self._read_cursor(analytics=True)
+        connection = cursor.connection
+        began = not connection.in_transaction
+        try:
+            if began:
+                cursor.execute("BEGIN")
+            cursor.execute("SELECT COALESCE(MAX(MeasurementID), 0), COUNT(*) FROM Measurements")
+            high_water, row_count = cursor.fetchone()
+            change_seq = self.latest_change_seq(analytics=True)
+            
+            if self.history_cache is not None:
+                series = self.history_cache.load(high_water, row_count, change_seq)
+                if series is None and self._catch_up_history(change_seq):
+                    series = self.history_cache.load(high_water, row_count, change_seq)
+            if series is None:
+                series = self.get_measurement_series()
+                if self.history_cache is not None and row_count:
+                    self.history_cache.write(series, high_water, row_count, change_seq)
+        except sqlite3.Error as e:
+            print(f"Error getting measurement history: {e}")
+            return MeasurementSeries.empty()
+        finally:
+            if began and connection.in_transaction:
+                connection.rollback()
+        
+        if asset_id:
+            return series.subset([asset_id])
+        if tul_id or asset_type_id:
+            return series.subset([row[0] for row in self.get_assets(tul_id, asset_type_id, analytics=True)])
+        return series
+        
     def delete_measurement(self, measurement_id):
         """Delete a measurement record by ID."""
         if not self.connection:
@@ -367,13 +1132,31 @@ class DatabaseManager:
             cursor = self.connection.cursor()
             cursor.execute("DELETE FROM Measurements WHERE MeasurementID = ?", (measurement_id,))
             self.connection.commit()
+            self._invalidate_history()
+            self.refresh_rollups(rebuild=False)
+            self._notify_change("Measurements")
             return True
         except sqlite3.Error as e:
             print(f"Error deleting measurement: {e}")
             return False
     
     def close(self):
-        """Close the database connection."""
+        """Close the database connection.
+        
+        A WAL manager first switches the file back to a rollback journal, so
+        no -wal and -shm files are left next to it. That needs the file to
+        itself; while other connections are open it stays in WAL mode.
+        """
+        if self.analytics_connection:
+            self.analytics_connection.close()
+            self.analytics_connection = None
         if self.connection:
+            if self.wal and not self.read_only and self.db_path != ":memory:":
+                try:
+                    self.connection.execute("PRAGMA journal_mode=DELETE")
+                except sqlite3.Error:
+                    pass
             self.connection.close()
-            self.connection = None
\ No newline at end of file
+            self.connection = None
+
+instrument_class(DatabaseManager, "db")
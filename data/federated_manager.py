@@ -0,0 +1,119 @@
+# File: data/federated_manager.py
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from data.database_manager import DatabaseManager
+
+class FederatedDatabaseManager:
+    """Runs read queries across one database per site and merges the results.
+    
+    Each site has its own DatabaseManager and worker thread, because sqlite3
+    connections must stay on the thread that opened them; a query is sent to
+    every site at once and the results are merged in site order. Merged rows
+    carry the site name as an extra last column, so code that indexes the
+    usual columns keeps working.
+    """
+    
+    def __init__(self, site_paths):
+        """site_paths maps site name to database path; missing files are skipped."""
+        self.sites = {}
+        self._executors = {}
+        self._services = {}
+        self._watermarks = {}
+        
+        for site, path in site_paths.items():
+            if not os.path.exists(path):
+                print(f"Site database not found for {site}: {path}")
+                continue
+            self.sites[site] = DatabaseManager(path, read_only=True)
+            self._executors[site] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"site-{site}")
+        
+    def _fan_out(self, task):
+        """Run task(site, db_manager) on every site's thread and return {site: result}."""
+        futures = {site: self._executors[site].submit(task, site, db) for site, db in self.sites.items()}
+        
+        results = {}
+        for site, future in futures.items():
+            try:
+                results[site] = future.result()
+            except Exception as e:
+                print(f"Error querying site {site}: {e}")
+        return results
+        
+    def _merge_rows(self, results):
+        """Concatenate per-site rows, adding the site name as the last column."""
+        return [tuple(row) + (site,) for site, rows in results.items() for row in rows]
+        
+    def get_assets(self, tul_id=None, asset_type_id=None):
+        """Get assets from all sites filtered by TUL and/or asset type."""
+        return self._merge_rows(self._fan_out(
+            lambda site, db: db.get_assets(tul_id, asset_type_id, analytics=True)))
+        
+    def get_measurements(self, asset_id=None, tul_id=None, asset_type_id=None):
+        """Get measurements from all sites filtered by asset, TUL, and/or asset type."""
+        return self._merge_rows(self._fan_out(
+            lambda site, db: db.get_measurements(asset_id, tul_id, asset_type_id, analytics=True)))
+        
+    def crossing_dates(self, asset_type_id, days_ahead=365):
+        """Forecast threshold crossings for an asset type at every site.
+        
+        Returns {(site, asset_id): forecast}, with the forecast dicts of
+        PredictionService.crossing_dates plus the site and its threshold.
+        Each site keeps its own forecast cache, which is dropped whenever the
+        site's latest MeasurementID, change Seq or ReferenceVersion moves.
+        """
+        def task(site, db):
+            service = self._services.get(site)
+            if service is None:
+                from models.prediction_service import PredictionService
+                service = self._services[site] = PredictionService(db)
+            
+            # Site databases are written by other programs, whose edits reach no listener here
+            watermark = (db.get_latest_measurement_id(analytics=True), db.latest_change_seq(analytics=True),
+                         db.reference_version(analytics=True))
+            if self._watermarks.get(site) != watermark:
+                service.reference_data.invalidate()
+                service.on_data_changed("Measurements")
+                self._watermarks[site] = watermark
+            return service.crossing_dates(asset_type_id, days_ahead)
+        
+        merged = {}
+        for site, (threshold, forecasts) in self._fan_out(task).items():
+            for asset_id, forecast in forecasts.items():
+                merged[(site, asset_id)] = dict(forecast, site=site, threshold=threshold)
+        return merged
+        
+    def close(self):
+        """Close every site connection and stop the worker threads."""
+        self._fan_out(lambda site, db: db.close())
+        for executor in self._executors.values():
+            executor.shutdown()
+        self._executors = {}
+        self.sites = {}
+        self._services = {}
+        self._watermarks = {}
+
+def main():
+    """Write the crossing forecasts of an asset type at every site as CSV."""
+    parser = argparse.ArgumentParser(description="Forecast threshold crossings across site databases")
+    parser.add_argument("sites", nargs="+", metavar="SITE=PATH", help="Site name and its database path")
+    parser.add_argument("--asset-type", required=True, help="Asset type to forecast")
+    parser.add_argument("--days-ahead", type=int, default=365)
+    args = parser.parse_args()
+    
+    site_paths = dict(site.split("=", 1) for site in args.sites)
+    manager = FederatedDatabaseManager(site_paths)
+    try:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["site", "asset_id", "threshold", "last_date", "last_wear", "crossing_date", "days_until"])
+        for (site, asset_id), forecast in sorted(manager.crossing_dates(args.asset_type, args.days_ahead).items()):
+            writer.writerow([site, asset_id, forecast["threshold"], forecast["last_date"],
+                             f"{forecast['last_wear']:.2f}", forecast["crossing_date"], forecast["days_until"]])
+    finally:
+        manager.close()
+
+if __name__ == "__main__":
+    main()
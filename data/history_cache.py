@@ -0,0 +1,229 @@
+# File: data/history_cache.py
+
+import glob
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from models.measurement import MeasurementSeries
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+
+# Sorted columns, one .npy file each per generation
+COLUMNS = ("measurement_ids", "codes", "days", "wear", "offsets")
+
+# Readings appended since the last rebuild, in MeasurementID order
+TAIL_DTYPE = np.dtype([("measurement_id", "<i4"), ("code", "<i4"), ("day", "<i4"), ("wear", "<f4")])
+
+# Appended readings are merged into new sorted columns once there are this many
+COMPACT_ROWS = 10000
+
+class HistoryCache:
+    """Columnar copy of the measurement history, loaded with np.memmap.
+    
+    Each rebuild writes a new generation of sorted .npy columns (the layout of
+    MeasurementSeries, offsets included) and then swaps meta.json, so readers
+    never see a half-written cache. New readings are appended to a small tail
+    file and merged in on load. meta.json records the highest MeasurementID
+    and row count the cache holds; load() returns None when they differ from
+    the database, and the caller rebuilds from SQLite.
+    
+    One process should append at a time; readers may be in any process.
+    Within a process, appends and rebuilds are serialized across instances.
+    Other processes, such as the API's read workers and the site databases
+    of a federated query, open the cache read_only: they load a current
+    cache but never write, append to, compact or invalidate it.
+    """
+    
+    _lock = threading.Lock()
+    
+    def __init__(self, directory, read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+        
+    def read_meta(self):
+        """The current meta.json contents, or None if there is no usable cache."""
+        try:
+            with open(self._path(META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == CACHE_VERSION else None
+        
+    def _write_meta(self, meta):
+        temp_path = self._path(f"{META_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._path(META_FILE))
+        
+    def load(self, high_water, row_count, change_seq=None):
+        """Memory-map the cached history if it matches the database watermark.
+        
+        change_seq, when both it and the cache know it, must also match, which
+        catches edits that leave the ID and count unchanged. Returns a
+        MeasurementSeries, or None when the cache is missing, stale or
+        unreadable.
+        """
+        for _ in range(2):
+            meta = self.read_meta()
+            if meta is None or meta["high_water"] != high_water or meta["rows"] != row_count:
+                return None
+            if None not in (change_seq, meta.get("change_seq")) and meta["change_seq"] != change_seq:
+                return None
+            
+            generation = meta["generation"]
+            try:
+                columns = [np.load(self._path(f"{name}.{generation}.npy"), mmap_mode="r") for name in COLUMNS]
+                tail = np.fromfile(self._path(f"tail.{generation}.bin"), dtype=TAIL_DTYPE,
+                                   count=meta["tail_rows"]) if meta["tail_rows"] else None
+                break
+            except FileNotFoundError:
+                # Another rebuild replaced this generation in the meantime; read the new meta
+                continue
+            except (OSError, ValueError) as e:
+                print(f"Error reading history cache: {e}")
+                return None
+        else:
+            return None
+        
+        measurement_ids, codes, days, wear, offsets = columns
+        n_assets = len(offsets) - 1
+        series = MeasurementSeries(meta["asset_ids"][:n_assets], measurement_ids, codes, days, wear, offsets)
+        if tail is None:
+            return series
+        if len(tail) != meta["tail_rows"]:
+            return None
+        
+        series = merge_tail(series, meta["asset_ids"], tail)
+        if len(tail) >= COMPACT_ROWS and not self.read_only:
+            # Keep the change position, or the compacted cache could no longer detect edits
+            self.write(series, high_water, row_count, meta.get("change_seq") if change_seq is None else change_seq)
+        return series
+        
+    def write(self, series, high_water, row_count, change_seq=None):
+        """Replace the cache with series, taken at the given database watermark.
+        
+        change_seq is the MeasurementChanges position the series reflects.
+        Returns False without writing for a read-only cache.
+        """
+        if self.read_only:
+            return False
+        with self._lock:
+            generation = uuid.uuid4().hex[:12]
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for name in COLUMNS:
+                    np.save(self._path(f"{name}.{generation}.npy"), getattr(series, name))
+                self._write_meta({
+                    "version": CACHE_VERSION,
+                    "generation": generation,
+                    "high_water": high_water,
+                    "rows": row_count,
+                    "tail_rows": 0,
+                    "change_seq": change_seq,
+                    "asset_ids": list(series.asset_ids),
+                })
+            except OSError as e:
+                print(f"Error writing history cache: {e}")
+                return False
+            
+            self._remove_stale(generation)
+            return True
+        
+    def append(self, measurement_ids, asset_ids, days, wear, change_seq=None):
+        """Add newly committed readings to the tail of the cache.
+        
+        days may hold None for readings without a valid date; they are
+        counted but not stored, as in a rebuild. Readings that do not follow
+        the cached high-water mark invalidate the cache instead. change_seq,
+        when known, is the MeasurementChanges position after these readings.
+        """
+        if self.read_only:
+            return
+        with self._lock:
+            meta = self.read_meta()
+            if meta is None:
+                return
+            if not measurement_ids:
+                if change_seq is not None:
+                    meta["change_seq"] = change_seq
+                    self._write_meta(meta)
+                return
+            if min(measurement_ids) <= meta["high_water"]:
+                self.invalidate()
+                return
+            
+            code_by_id = {asset_id: code for code, asset_id in enumerate(meta["asset_ids"])}
+            records = []
+            for measurement_id, asset_id, day, wear_value in zip(measurement_ids, asset_ids, days, wear):
+                if day is None:
+                    continue
+                if asset_id not in code_by_id:
+                    code_by_id[asset_id] = len(meta["asset_ids"])
+                    meta["asset_ids"].append(asset_id)
+                records.append((measurement_id, code_by_id[asset_id], day, wear_value))
+            
+            try:
+                with open(self._path(f"tail.{meta['generation']}.bin"), "ab") as f:
+                    # Drop anything past the committed tail, e.g. from an interrupted append
+                    f.truncate(meta["tail_rows"] * TAIL_DTYPE.itemsize)
+                    f.write(np.array(records, dtype=TAIL_DTYPE).tobytes())
+                meta["tail_rows"] += len(records)
+                meta["rows"] += len(measurement_ids)
+                meta["high_water"] = max(measurement_ids)
+                if change_seq is not None:
+                    meta["change_seq"] = change_seq
+                self._write_meta(meta)
+            except OSError as e:
+                print(f"Error appending to history cache: {e}")
+                self.invalidate()
+        
+    def invalidate(self):
+        """Mark the cache stale, so the next load rebuilds it."""
+        if self.read_only:
+            return
+        try:
+            os.remove(self._path(META_FILE))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error invalidating history cache: {e}")
+        
+    def _remove_stale(self, generation):
+        """Delete files of older generations; files still mapped elsewhere are left for later."""
+        for path in glob.glob(self._path("*.*.*")):
+            name = os.path.basename(path)
+            if f".{generation}." not in name and not name.startswith(META_FILE):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+def merge_tail(series, asset_ids, tail):
+    """Insert tail readings into a sorted series, returning a new in-memory series.
+    
+    asset_ids extends series.asset_ids with any assets first seen in the tail.
+    """
+    order = np.lexsort((tail["day"], tail["code"]))
+    tail = tail[order]
+    
+    # Each reading goes after the asset's readings up to the same day
+    n_assets = len(series.asset_ids)
+    positions = np.full(len(tail), len(series), dtype=np.int64)
+    for i, (code, day) in enumerate(zip(tail["code"].tolist(), tail["day"].tolist())):
+        if code < n_assets:
+            start, end = series.offsets[code], series.offsets[code + 1]
+            positions[i] = start + np.searchsorted(series.days[start:end], day, side="right")
+    
+    return MeasurementSeries(
+        asset_ids,
+        np.insert(series.measurement_ids, positions, tail["measurement_id"]),
+        np.insert(series.codes, positions, tail["code"]),
+        np.insert(series.days, positions, tail["day"]),
+        np.insert(series.wear, positions, tail["wear"]),
+    )
@@ -0,0 +1,195 @@
+# File: data/query_audit.py
+
+import itertools
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("tul.sql")
+
+# Statements worth asking SQLite for a query plan
+PLANNED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+def query_shape(sql):
+    """Normalize SQL text so executions differing only in literals share a shape."""
+    shape = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    return " ".join(shape.split())
+
+class QueryAuditor:
+    """Logs every statement on audited connections and checks each query shape's plan.
+    
+    Statements are logged with their duration and row count. The first time a
+    query shape runs, its EXPLAIN QUERY PLAN is recorded and full table scans
+    and temporary B-trees (sorts or DISTINCT without an index) are logged as
+    warnings.
+    """
+    
+    def __init__(self, log=logger):
+        self.log = log
+        self.plans = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+        
+    def connect(self, db_path, **kwargs):
+        """Open an audited sqlite3 connection."""
+        connection = sqlite3.connect(db_path, factory=AuditingConnection, **kwargs)
+        connection.auditor = self
+        connection.set_trace_callback(self.on_trace)
+        return connection
+        
+    def on_trace(self, statement):
+        """Trace callback: every statement SQLite runs, including implicit BEGIN/COMMIT."""
+        self.log.debug("trace: %s", statement)
+        
+    def record(self, sql, seconds, rows, connection, params=()):
+        """Log one finished statement and audit its plan on first sight of its shape."""
+        shape = query_shape(sql)
+        with self._lock:
+            count, total, total_rows = self.stats.get(shape, (0, 0.0, 0))
+            self.stats[shape] = (count + 1, total + seconds, total_rows + max(rows, 0))
+            first_time = shape not in self.plans
+            if first_time:
+                self.plans[shape] = None
+        
+        self.log.info("%.2f ms, %s rows: %s", seconds * 1000, rows if rows >= 0 else "?", shape)
+        if first_time:
+            self.plans[shape] = self.explain(sql, params, connection)
+        
+    def explain(self, sql, params, connection):
+        """Record EXPLAIN QUERY PLAN for a statement and warn about scans and temp B-trees.
+        
+        Returns (plan details, flags).
+        """
+        if not sql.lstrip().upper().startswith(PLANNED_STATEMENTS):
+            return [], []
+        try:
+            # A plain cursor, so the EXPLAIN itself is not audited
+            cursor = sqlite3.Cursor(connection)
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            details = [row[3] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            self.log.debug("Could not explain %s: %s", query_shape(sql), e)
+            return [], []
+        
+        flags = []
+        for detail in details:
+            if detail.startswith("SCAN") and "COVERING INDEX" not in detail:
+                flags.append(f"full scan: {detail}")
+            if "TEMP B-TREE" in detail:
+                flags.append(f"temp b-tree: {detail}")
+        
+        self.log.debug("plan for %s: %s", query_shape(sql), "; ".join(details))
+        if flags:
+            self.log.warning("%s -> %s", query_shape(sql), "; ".join(flags))
+        return details, flags
+        
+    def flagged(self):
+        """Query shapes whose plan was flagged, as {shape: flags}."""
+        return {shape: plan[1] for shape, plan in self.plans.items() if plan and plan[1]}
+        
+    def report(self):
+        """Text summary of every query shape by total time, with plan flags."""
+        lines = []
+        for shape, (count, total, rows) in sorted(self.stats.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{total * 1000:9.1f} ms {count:6d}x {rows:8d} rows  {shape}")
+            plan = self.plans.get(shape)
+            for flag in (plan[1] if plan else []):
+                lines.append(f"{'':34}! {flag}")
+        return "\n".join(lines)
+
+class AuditingCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's duration and row count to the auditor.
+    
+    Queries are reported once their rows are fetched, so the duration covers
+    execution and fetching; rows fetched in chunks are added up until the
+    cursor is exhausted, closed or runs its next statement. Other statements
+    are reported right away with the number of rows they changed;
+    executemany batches are explained with their first parameter row.
+    """
+    
+    _pending = None
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error as e:
+            self.connection.auditor.log.error("%s: %s", e, query_shape(sql))
+            raise
+        self._track(sql, parameters, start)
+        return self
+        
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        # Keep the first parameter row for EXPLAIN without consuming a generator
+        rows = iter(seq_of_parameters)
+        first = next(rows, None)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, rows if first is None else itertools.chain([first], rows))
+        except sqlite3.Error as e:
+            self.connection.auditor.log.error("%s: %s", e, query_shape(sql))
+            raise
+        self.connection.auditor.record(sql, time.perf_counter() - start, self.rowcount, self.connection,
+                                       () if first is None else first)
+        return self
+        
+    def _track(self, sql, parameters, start):
+        if self.description is None:
+            self.connection.auditor.record(sql, time.perf_counter() - start, self.rowcount,
+                                           self.connection, parameters)
+        else:
+            self._pending = [sql, parameters, start, None]
+        
+    def _fetched(self, rows):
+        """Add rows fetched by a pending query to its count."""
+        if self._pending is not None:
+            self._pending[3] = (self._pending[3] or 0) + rows
+        
+    def _finish(self):
+        """Report a pending query with the number of rows fetched, or "?" if none were."""
+        if self._pending is not None:
+            sql, parameters, start, rows = self._pending
+            self._pending = None
+            self.connection.auditor.record(sql, time.perf_counter() - start, -1 if rows is None else rows,
+                                           self.connection, parameters)
+        
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows))
+        self._finish()
+        return rows
+        
+    def fetchone(self):
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1)
+        self._finish()
+        return row
+        
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(len(rows))
+        # A short chunk means the cursor is exhausted
+        if len(rows) < size:
+            self._finish()
+        return rows
+        
+    def close(self):
+        self._finish()
+        super().close()
+
+class AuditingConnection(sqlite3.Connection):
+    """Connection whose cursors are AuditingCursors; opened by QueryAuditor.connect."""
+    
+    auditor = None
+    
+    def cursor(self, factory=AuditingCursor):
+        return super().cursor(factory)
+        
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
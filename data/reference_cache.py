@@ -0,0 +1,139 @@
+# File: data/reference_cache.py
+
+
+class ReferenceDataCache:
+    """In-memory copy of the TULs, asset types and assets shared by all tabs.
+
+    Rows are the same tuples DatabaseManager returns. Each table is loaded on
+    first use and dropped again when DatabaseManager reports an add or delete.
+    """
+
+    # Tables whose cached rows depend on each changed table
+    DEPENDENTS = {
+        "TULs": ("TULs", "Assets"),
+        "AssetTypes": ("AssetTypes", "Assets"),
+        "Assets": ("Assets",),
+    }
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._tuls = None
+        self._tuls_by_id = None
+        self._asset_types = None
+        self._asset_types_by_id = None
+        self._assets = None
+        self._assets_by_id = None
+        self._assets_by_tul = None
+        self._assets_by_type = None
+        self._assets_by_tul_type = None
+        self._single_assets = {}
+
+        db_manager.add_change_listener(self.invalidate)
+
+    def invalidate(self, table=None):
+        """Drop cached rows for a changed table, or everything if table is None."""
+        if table is None:
+            tables = ("TULs", "AssetTypes", "Assets")
+        else:
+            tables = self.DEPENDENTS.get(table, ())
+        if "TULs" in tables:
+            self._tuls = None
+            self._tuls_by_id = None
+        if "AssetTypes" in tables:
+            self._asset_types = None
+            self._asset_types_by_id = None
+        if "Assets" in tables:
+            self._assets = None
+            self._assets_by_id = None
+            self._assets_by_tul = None
+            self._assets_by_type = None
+            self._assets_by_tul_type = None
+            self._single_assets = {}
+
+    # TULs
+    def _load_tuls(self):
+        if self._tuls is None:
+            self._tuls = self.db_manager.get_tuls()
+            self._tuls_by_id = {row[0]: row for row in self._tuls}
+
+    def get_tuls(self):
+        """Get all TULs, ordered by ID."""
+        self._load_tuls()
+        return list(self._tuls)
+
+    def get_tul(self, tul_id):
+        """Get a single TUL row, or None if it does not exist."""
+        self._load_tuls()
+        return self._tuls_by_id.get(tul_id)
+
+    # Asset types
+    def _load_asset_types(self):
+        if self._asset_types is None:
+            self._asset_types = self.db_manager.get_asset_types()
+            self._asset_types_by_id = {row[0]: row for row in self._asset_types}
+
+    def get_asset_types(self):
+        """Get all asset types, ordered by name."""
+        self._load_asset_types()
+        return list(self._asset_types)
+
+    def get_asset_type(self, type_id):
+        """Get a single asset type row, or None if it does not exist."""
+        self._load_asset_types()
+        return self._asset_types_by_id.get(type_id)
+
+    # Assets
+    def _load_assets(self):
+        if self._assets is not None:
+            return
+
+        self._assets = self.db_manager.get_assets()
+        self._assets_by_id = {}
+        self._assets_by_tul = {}
+        self._assets_by_type = {}
+        self._assets_by_tul_type = {}
+
+        # Rows arrive ordered by TUL, type and instance, so each index keeps that order
+        for row in self._assets:
+            asset_id, tul_id, asset_type_id = row[0], row[1], row[2]
+            self._assets_by_id[asset_id] = row
+            self._assets_by_tul.setdefault(tul_id, []).append(row)
+            self._assets_by_type.setdefault(asset_type_id, []).append(row)
+            self._assets_by_tul_type.setdefault((tul_id, asset_type_id), []).append(row)
+
+    def get_assets(self, tul_id=None, asset_type_id=None):
+        """Get assets filtered by TUL and/or asset type."""
+        self._load_assets()
+        if tul_id and asset_type_id:
+            rows = self._assets_by_tul_type.get((tul_id, asset_type_id), [])
+        elif tul_id:
+            rows = self._assets_by_tul.get(tul_id, [])
+        elif asset_type_id:
+            rows = self._assets_by_type.get(asset_type_id, [])
+        else:
+            rows = self._assets
+        return list(rows)
+
+    def get_asset(self, asset_id):
+        """Get a single asset row, or None if it does not exist.
+
+        Uses the loaded asset table when available; otherwise a primary-key
+        lookup is made rather than loading every asset.
+        """
+        if self._assets is not None:
+            return self._assets_by_id.get(asset_id)
+        if asset_id not in self._single_assets:
+            self._single_assets[asset_id] = self.db_manager.get_asset(asset_id)
+        return self._single_assets[asset_id]
+
+    def get_assets_by_ids(self, asset_ids):
+        """Get the assets with the given IDs, in order, skipping unknown IDs."""
+        if self._assets is not None:
+            return [self._assets_by_id[a] for a in asset_ids if a in self._assets_by_id]
+
+        missing = [a for a in asset_ids if a not in self._single_assets]
+        if missing:
+            found = {row[0]: row for row in self.db_manager.get_assets_by_ids(missing)}
+            for asset_id in missing:
+                self._single_assets[asset_id] = found.get(asset_id)
+        return [self._single_assets[a] for a in asset_ids if self._single_assets[a] is not None]
@@ -0,0 +1,117 @@
+# File: data/write_queue.py
+
+import itertools
+import queue
+import threading
+import time
+from data.database_manager import DatabaseManager
+
+# A batch is committed once it holds this many readings or its first reading has waited this long
+MAX_BATCH_ROWS = 200
+MAX_BATCH_DELAY = 0.25
+
+class MeasurementWriteQueue:
+    """Write-behind queue that commits measurements on a background thread.
+    
+    put() returns at once. A writer thread with its own connection to the
+    file database gathers queued readings into one transaction per batch.
+    Outcomes are collected on the caller's thread with poll(), as
+    ("committed", tickets, ids, records) or ("failed", tickets, records,
+    message) events. A failed batch is retried one reading at a time, so
+    one bad reading does not lose the rest. close() commits everything
+    still queued before it returns.
+    """
+    
+    def __init__(self, db_path, max_rows=MAX_BATCH_ROWS, max_delay=MAX_BATCH_DELAY):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.closed = False
+        self._queue = queue.Queue()
+        self._events = queue.Queue()
+        self._tickets = itertools.count(1)
+        self._thread = threading.Thread(target=self._run, name="measurement-writer", daemon=True)
+        self._thread.start()
+        
+    def put(self, asset_id, measurement_date, wear_value, shims_added=0, notes=""):
+        """Queue a measurement and return the ticket that identifies it in events."""
+        if self.closed:
+            raise RuntimeError("The measurement write queue is closed")
+        ticket = next(self._tickets)
+        self._queue.put((ticket, (asset_id, str(measurement_date), wear_value, shims_added, notes)))
+        return ticket
+        
+    def flush(self, timeout=None):
+        """Wait until every measurement queued so far is committed or has failed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+        
+    def close(self, timeout=None):
+        """Commit the remaining measurements and stop the writer thread."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        
+    def poll(self):
+        """Events produced since the last call, oldest first."""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+        
+    def _run(self):
+        db = DatabaseManager(self.db_path)
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                flushes = []
+                item = self._queue.get()
+                deadline = time.monotonic() + self.max_delay
+                while True:
+                    if item is None:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        flushes.append(item)
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.max_rows:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                
+                if batch:
+                    self._commit(db, batch)
+                for done in flushes:
+                    done.set()
+        finally:
+            db.close()
+        
+    def _commit(self, db, batch):
+        """Insert a batch in one transaction, falling back to one reading at a time."""
+        tickets = [ticket for ticket, _ in batch]
+        records = [record for _, record in batch]
+        try:
+            ids = db.add_measurements(records)
+            if ids is not None:
+                self._events.put(("committed", tickets, ids, records))
+                return
+            
+            for ticket, record in batch:
+                ids = db.add_measurements([record])
+                if ids is None:
+                    self._events.put(("failed", [ticket], [record],
+                                      f"Could not save the reading for {record[0]} on {record[1]}."))
+                else:
+                    self._events.put(("committed", [ticket], ids, [record]))
+        except Exception as e:
+            # Keep the writer alive and report the batch rather than losing it silently
+            self._events.put(("failed", tickets, records, f"Error saving {len(records)} readings: {e}"))
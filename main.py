@@ -1,38 +1,68 @@
+import time
+
+# Taken before any other import so the startup measurement covers them
+_STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk
+import logging
+import multiprocessing
 import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from data.database_manager import DatabaseManager
-from models.prediction_model import WearPredictionModel
-from ui.tul_tab import TULManagementTab
-from ui.asset_tab import AssetManagementTab
-from ui.maintenance_tab import MaintenanceTab
-from ui.prediction_tab import PredictionTab
-from ui.comparison_tab import ComparisonTab
+from data.database_manager import DatabaseManager, SQL_AUDIT_ENV, WAL_ENV
+from data.reference_cache import ReferenceDataCache
+from utils.theme import ThemeDetector
+import tkthemeswitch
 
-def is_dark_mode():
-    """Check if the system is in dark mode (macOS)."""
-    try:
-        import subprocess
-        result = subprocess.run(
-            ['defaults', 'read', '-g', 'AppleInterfaceStyle'], 
-            capture_output=True, 
-            text=True
-        )
-        return result.stdout.strip() == 'Dark'
-    except Exception:
-        # If there's any error, assume light mode
-        return False
+# Each tab class is imported on first view. The imports are written out in
+# full so that PyInstaller still finds and bundles the tab modules.
+def _tul_tab():
+    from ui.tul_tab import TULManagementTab
+    return TULManagementTab
+
+def _asset_tab():
+    from ui.asset_tab import AssetManagementTab
+    return AssetManagementTab
+
+def _maintenance_tab():
+    from ui.maintenance_tab import MaintenanceTab
+    return MaintenanceTab
+
+def _prediction_tab():
+    from ui.prediction_tab import PredictionTab
+    return PredictionTab
+
+def _comparison_tab():
+    from ui.comparison_tab import ComparisonTab
+    return ComparisonTab
+
+def _performance_tab():
+    from ui.performance_tab import PerformanceTab
+    return PerformanceTab
+
+# Tab contents are built the first time each tab is shown. Each entry is
+# (frame attribute, tab title, class factory, UI attribute, needs prediction model).
+TAB_SPECS = [
+    ("tul_tab", "TUL Management", _tul_tab, "tul_management_tab", False),
+    ("asset_tab", "Asset Management", _asset_tab, "asset_management_tab", False),
+    ("maintenance_tab", "Maintenance Records", _maintenance_tab, "maintenance_tab_ui", False),
+    ("prediction_tab", "Wear Prediction", _prediction_tab, "prediction_tab_ui", True),
+    ("comparison_tab", "Comparison Analysis", _comparison_tab, "comparison_tab_ui", True),
+    ("performance_tab", "Performance", _performance_tab, "performance_tab_ui", False),
+]
 
 class TULApp:
     """Main application for TUL asset wear prediction and maintenance tracking."""
     
     def __init__(self, root):
         self.root = root
-        self.db_manager = DatabaseManager()
-        self.prediction_model = WearPredictionModel()
+        self.db_manager = DatabaseManager(wal=bool(os.environ.get(WAL_ENV)))
+        self.reference_data = ReferenceDataCache(self.db_manager)
+        self._prediction_model = None
+        self.startup_seconds = None
+        self.theme_detector = ThemeDetector()
         
         # Initialize database
         self.db_manager.connect()
@@ -40,6 +70,19 @@ class TULApp:
         
         # Set up the UI
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Measure once the first frame has been drawn, then check the system theme
+        self.root.after_idle(self.record_startup_time)
+        self.root.after_idle(lambda: self.theme_detector.detect_async(self.root, self.on_theme_detected))
+    
+    @property
+    def prediction_model(self):
+        """Shared prediction model, created when a tab first needs it."""
+        if self._prediction_model is None:
+            from models.prediction_model import WearPredictionModel
+            self._prediction_model = WearPredictionModel()
+        return self._prediction_model
     
     def setup_ui(self):
         """Set up the user interface."""
@@ -53,18 +96,14 @@ class TULApp:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
         
-        # Create tabs
-        self.tul_tab = ttk.Frame(self.notebook)
-        self.asset_tab = ttk.Frame(self.notebook)
-        self.maintenance_tab = ttk.Frame(self.notebook)
-        self.prediction_tab = ttk.Frame(self.notebook)
-        self.comparison_tab = ttk.Frame(self.notebook)
-        
-        self.notebook.add(self.tul_tab, text="TUL Management")
-        self.notebook.add(self.asset_tab, text="Asset Management")
-        self.notebook.add(self.maintenance_tab, text="Maintenance Records")
-        self.notebook.add(self.prediction_tab, text="Wear Prediction")
-        self.notebook.add(self.comparison_tab, text="Comparison Analysis")
+        # Create empty tab frames; their contents are built on first view
+        self.tab_specs = {}
+        for frame_attr, title, tab_factory, ui_attr, needs_model in TAB_SPECS:
+            frame = ttk.Frame(self.notebook)
+            setattr(self, frame_attr, frame)
+            setattr(self, ui_attr, None)
+            self.notebook.add(frame, text=title)
+            self.tab_specs[str(frame)] = (frame, tab_factory, ui_attr, needs_model)
 
         # Company footer
         footer_frame = ttk.Frame(self.root)
@@ -86,45 +125,75 @@ class TULApp:
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Initialize tabs
-        self.tul_management_tab = TULManagementTab(self.tul_tab, self.db_manager, self.status_var)
-        self.asset_management_tab = AssetManagementTab(self.asset_tab, self.db_manager, self.status_var)
-        self.maintenance_tab_ui = MaintenanceTab(self.maintenance_tab, self.db_manager, self.status_var)
-        self.prediction_tab_ui = PredictionTab(self.prediction_tab, self.db_manager, self.prediction_model, self.status_var)
-        self.comparison_tab_ui = ComparisonTab(self.comparison_tab, self.db_manager, self.prediction_model, self.status_var)
+        # Build each tab the first time it is selected
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.build_tab(self.notebook.select())
+    
+    def on_tab_changed(self, event=None):
+        """Construct the selected tab's contents if this is its first view."""
+        self.build_tab(self.notebook.select())
+    
+    def build_tab(self, tab_name):
+        """Import and construct the UI for a tab frame, once."""
+        spec = self.tab_specs.get(str(tab_name))
+        if spec is None:
+            return None
+        
+        frame, tab_factory, ui_attr, needs_model = spec
+        tab_ui = getattr(self, ui_attr)
+        if tab_ui is not None:
+            return tab_ui
+        
+        tab_class = tab_factory()
+        if needs_model:
+            tab_ui = tab_class(frame, self.db_manager, self.prediction_model, self.status_var,
+                               reference_data=self.reference_data)
+        else:
+            tab_ui = tab_class(frame, self.db_manager, self.status_var, reference_data=self.reference_data)
+        setattr(self, ui_attr, tab_ui)
+        return tab_ui
+    
+    def on_close(self):
+        """Let built tabs finish pending work, then close the database and exit."""
+        for _, _, ui_attr, _ in self.tab_specs.values():
+            tab_ui = getattr(self, ui_attr)
+            if tab_ui is not None and hasattr(tab_ui, "close"):
+                tab_ui.close()
+        self.db_manager.close()
+        self.root.destroy()
+    
+    def record_startup_time(self):
+        """Record the time from process start until the first frame is drawn."""
+        self.root.update_idletasks()
+        self.startup_seconds = time.perf_counter() - _STARTUP_T0
+        self.status_var.set(f"Ready (started in {self.startup_seconds:.2f} s)")
     
     def setup_styles(self):
         """Set up custom styles for the application."""
         style = ttk.Style()
         
-        # Check if dark mode is enabled
-        is_dark = is_dark_mode()
-        
-        if is_dark:
-            # Dark mode theme
-            style.configure("TFrame", background="#2E2E2E")
-            style.configure("TLabel", background="#2E2E2E", foreground="#FFFFFF")
-            style.configure("TButton", background="#505050", foreground="#FFFFFF")
-            style.configure("TEntry", fieldbackground="#3E3E3E", foreground="#FFFFFF")
-            style.configure("TCombobox", fieldbackground="#3E3E3E", foreground="#FFFFFF")
-            style.configure("TNotebook", background="#2E2E2E", tabmargins=[2, 5, 2, 0])
-            style.configure("TNotebook.Tab", background="#2E2E2E", foreground="#FFFFFF", padding=[10, 2])
-            style.map("TNotebook.Tab", background=[("selected", "#505050")])
-            
-            style.configure("Delete.TButton", foreground="#FF6B6B")
-        else:
-            # Light mode theme
-            style.configure("Delete.TButton", foreground="#D32F2F")
+        # Start with the theme detected on the previous launch; the system is
+        # queried in the background after the window appears
+        tkthemeswitch.apply_theme(self.theme_detector.cached_theme(), style)
         
         # Common styles
         style.configure("Title.TLabel", font=("Arial", 14, "bold"))
         style.configure("Subtitle.TLabel", font=("Arial", 12, "bold"))
+    
+    def on_theme_detected(self, theme):
+        """Switch styles when the system theme differs from the cached one."""
+        tkthemeswitch.apply_theme(theme)
 
 def main(): 
     """Main function to start the application."""
+    if os.environ.get(SQL_AUDIT_ENV):
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
     root = tk.Tk()
     app = TULApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Frozen builds re-run this script in spawned forecast workers; let them
+    # do their work instead of opening another window
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from datetime import date
+from models.measurement import parse_date
+
+@dataclass(frozen=True, slots=True)
+class AssetType:
+    """Model representing a kind of wearing asset and its maintenance threshold."""
+    
+    asset_type_id: str
+    name: str = ""
+    description: str = ""
+    wear_threshold: float = None
+    fit_method: str = "ols"
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build an asset type from a DatabaseManager.get_asset_types row."""
+        return cls(row[0], row[1] or "", row[2] or "", row[3], (row[4] if len(row) > 4 else None) or "ols")
+
+@dataclass(frozen=True, slots=True)
+class Asset:
+    """Model representing one asset installed on a TUL."""
+    
+    asset_id: str
+    tul_id: str
+    asset_type_id: str
+    instance_number: int = 1
+    installation_date: date = None
+    notes: str = ""
+    asset_type_name: str = ""
+    location: str = ""
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build an asset from a DatabaseManager.get_assets row."""
+        return cls(row[0], row[1], row[2], row[3], parse_date(row[4]), row[5] or "", row[6] or "", row[7] or "")
+        
+    def to_dict(self):
+        """Convert to dictionary for database storage."""
+        return {
+            "AssetID": self.asset_id,
+            "TULID": self.tul_id,
+            "AssetTypeID": self.asset_type_id,
+            "InstanceNumber": self.instance_number,
+            "InstallationDate": self.installation_date,
+            "Notes": self.notes
+        }
@@ -0,0 +1,286 @@
+# File: models/backtest.py
+
+import argparse
+import time
+from datetime import date
+import numpy as np
+from models.fleet_analytics import segment_index, segment_polynomial_fits, DEFAULT_FIT_METHOD
+from models.prediction_service import PredictionService, threshold_crossings
+from models.wear_models import MODEL_FAMILIES, fit_wear_model
+
+# Share of each segment's readings the models are fitted on; the rest are predicted
+TRAIN_FRACTION = 0.5
+MIN_TRAIN_READINGS = 3
+
+# Crossings are searched for this far past the last held-out reading
+CROSSING_MARGIN_DAYS = 365
+
+# Cycle replays search this far past each window's last reading for the crossing
+REPLAY_DAYS_AHEAD = 730
+
+# Windows searched per batch; each takes one row of REPLAY_DAYS_AHEAD predictions
+REPLAY_BATCH_WINDOWS = 8192
+
+# Forecast errors are also summarized by how long before the reset they were made
+LEAD_BUCKETS = (0, 90, 180, 365)
+
+EPOCH = date(1970, 1, 1)
+
+def holdout_segments(series, train_fraction=TRAIN_FRACTION, min_train=MIN_TRAIN_READINGS):
+    """Yield (asset_id, days, wear, n_train) for every wear segment with readings to hold out.
+    
+    days count from the segment's first reading. The first n_train readings,
+    train_fraction of the segment but at least min_train, are for fitting.
+    """
+    asset_ids, codes, days, wear = series.grouped()
+    segments, segment_codes = segment_index(codes, wear)
+    starts = np.searchsorted(segments, np.arange(len(segment_codes) + 1))
+    for segment, code in enumerate(segment_codes):
+        start, end = starts[segment], starts[segment + 1]
+        n_train = max(min_train, int((end - start) * train_fraction))
+        if end - start > n_train:
+            yield asset_ids[code], days[start:end] - days[start], wear[start:end], n_train
+
+def backtest_models(series, families=MODEL_FAMILIES, threshold=None, train_fraction=TRAIN_FRACTION,
+                    min_train=MIN_TRAIN_READINGS, fit_method=DEFAULT_FIT_METHOD):
+    """Fit each model family to the early readings of every segment and predict the rest.
+    
+    Returns {family: result}. result["errors"] holds predicted minus actual
+    wear for every held-out reading and result["horizons"] its days past the
+    last fitted reading; result["fit_seconds"] holds the time of every fit and
+    result["failed"] counts segments the family could not fit. With a
+    threshold, result["crossing_errors"] holds the predicted minus the
+    observed crossing day for segments whose held-out readings reach it, and
+    result["missed"] counts those where the model predicts no crossing
+    within CROSSING_MARGIN_DAYS of the last held-out reading.
+    """
+    results = {family: {"errors": [], "horizons": [], "fit_seconds": [], "failed": 0,
+                        "crossing_errors": [], "missed": 0} for family in families}
+    for asset_id, days, wear, n_train in holdout_segments(series, train_fraction, min_train):
+        train_days, test_days = days[:n_train], days[n_train:]
+        last_day = int(train_days[-1])
+        reached = np.flatnonzero(wear[n_train:] >= threshold) if threshold is not None else []
+        
+        for family in families:
+            result = results[family]
+            start = time.perf_counter()
+            model = fit_wear_model(family, train_days, wear[:n_train], fit_method)
+            result["fit_seconds"].append(time.perf_counter() - start)
+            if model is None:
+                result["failed"] += 1
+                continue
+            
+            predictions, _ = model.predict(test_days)
+            result["errors"].append(predictions - wear[n_train:])
+            result["horizons"].append(test_days - last_day)
+            
+            if len(reached):
+                observed = int(test_days[reached[0]])
+                window = int(test_days[-1]) - last_day + CROSSING_MARGIN_DAYS
+                _, days_until = model.calculate_threshold_crossing(last_day, window, EPOCH, threshold)
+                if isinstance(days_until, int):
+                    result["crossing_errors"].append(last_day + days_until - observed)
+                else:
+                    result["missed"] += 1
+    
+    for result in results.values():
+        result["errors"] = np.concatenate(result["errors"]) if result["errors"] else np.array([])
+        result["horizons"] = np.concatenate(result["horizons"]) if result["horizons"] else np.array([])
+        result["fit_seconds"] = np.array(result["fit_seconds"])
+        result["crossing_errors"] = np.array(result["crossing_errors"])
+    return results
+
+def summarize_backtest(results):
+    """Accuracy and fit cost per family from backtest_models, as {family: {measure: value}}.
+    
+    Measures are NaN where a family produced nothing to measure.
+    """
+    def stat(function, values):
+        return float(function(values)) if len(values) else float("nan")
+    
+    summary = {}
+    for family, result in results.items():
+        errors = result["errors"]
+        abs_errors = np.abs(errors)
+        summary[family] = {
+            "fits": len(result["fit_seconds"]),
+            "failed": result["failed"],
+            "readings": len(errors),
+            "mae": stat(np.mean, abs_errors),
+            "median_abs_error": stat(np.median, abs_errors),
+            "p90_abs_error": stat(lambda v: np.percentile(v, 90), abs_errors),
+            "bias": stat(np.mean, errors),
+            "crossing_mae_days": stat(np.mean, np.abs(result["crossing_errors"])),
+            "missed_crossings": result["missed"],
+            "fit_ms": stat(np.mean, result["fit_seconds"]) * 1000,
+        }
+    return summary
+
+def replay_windows(series, min_readings=MIN_TRAIN_READINGS):
+    """Expanding windows over every completed wear cycle in a MeasurementSeries.
+    
+    A cycle is completed when the asset's next reading shows a reset. Each
+    cycle of n readings gives windows of its first min_readings..n readings.
+    Returns (window_rows, row_windows, last_days, reset_days, window_segments):
+    the reading index and window number of every windowed reading, and per
+    window the day of its last reading, the day of the first reading after
+    the reset and its segment number from segment_index.
+    """
+    _, codes, days, wear = series.grouped()
+    segments, segment_codes = segment_index(codes, wear)
+    starts = np.searchsorted(segments, np.arange(len(segment_codes) + 1))
+    completed = np.flatnonzero(segment_codes[:-1] == segment_codes[1:])
+    
+    counts = np.maximum(np.diff(starts)[completed] - min_readings + 1, 0)
+    window_segments = np.repeat(completed, counts)
+    window_sizes = min_readings + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    
+    # Reading i of window w is reading starts[segment] + i
+    row_windows = np.repeat(np.arange(len(window_sizes)), window_sizes)
+    first_rows = np.cumsum(window_sizes) - window_sizes
+    window_rows = (np.repeat(starts[window_segments], window_sizes)
+                   + np.arange(window_sizes.sum()) - np.repeat(first_rows, window_sizes))
+    
+    last_days = days[starts[window_segments] + window_sizes - 1]
+    reset_days = days[starts[window_segments + 1]]
+    return window_rows, row_windows, last_days, reset_days, window_segments
+
+def replay_cycles(series, threshold, degree=1, days_ahead=REPLAY_DAYS_AHEAD, min_readings=MIN_TRAIN_READINGS,
+                  fit_method=DEFAULT_FIT_METHOD):
+    """Forecast the threshold crossing from every expanding window of every completed cycle.
+    
+    All windows are fitted as one batch with segment_polynomial_fits and
+    searched with threshold_crossings, as PredictionService does for live
+    forecasts. The crossing forecast is compared with the reset, dated by the
+    first reading that shows it. Returns a dict with per-window arrays
+    errors (forecast minus reset day, NaN when no crossing was forecast
+    within days_ahead) and lead_days (reset day minus the window's last
+    reading), plus the number of cycles.
+    """
+    window_rows, row_windows, last_days, reset_days, window_segments = replay_windows(series, min_readings)
+    n_windows = len(last_days)
+    _, _, days, wear = series.grouped()
+    coefficients, origins, scales = segment_polynomial_fits(
+        row_windows, days[window_rows], wear[window_rows], n_windows, degree, fit_method)
+    
+    days_until = np.empty(n_windows, dtype=np.int64)
+    for start in range(0, n_windows, REPLAY_BATCH_WINDOWS):
+        batch = slice(start, start + REPLAY_BATCH_WINDOWS)
+        days_until[batch] = threshold_crossings(coefficients[batch], origins[batch], scales[batch],
+                                                last_days[batch].astype(float), threshold, days_ahead)
+    
+    return {
+        "errors": np.where(days_until >= 0, last_days + days_until - reset_days, np.nan),
+        "lead_days": reset_days - last_days,
+        "cycles": len(np.unique(window_segments)),
+    }
+
+def backtest_fleet(prediction_service, asset_type_ids=None, degrees=(1, 2, 3), days_ahead=REPLAY_DAYS_AHEAD,
+                   min_readings=MIN_TRAIN_READINGS):
+    """replay_cycles for every asset type and polynomial degree, as {(asset_type_id, degree): result}.
+    
+    Each type uses its own threshold and fit method; Theil-Sen types are
+    replayed at degree 1 only. asset_type_ids defaults to every type.
+    """
+    if asset_type_ids is None:
+        asset_type_ids = [row[0] for row in prediction_service.reference_data.get_asset_types()]
+    
+    results = {}
+    for asset_type_id in asset_type_ids:
+        series = prediction_service.db_manager.get_measurement_history(asset_type_id=asset_type_id)
+        threshold = prediction_service.get_threshold(asset_type_id)
+        fit_method = prediction_service.get_fit_method(asset_type_id)
+        for degree in degrees:
+            if fit_method == "theil_sen" and degree != 1:
+                continue
+            results[(asset_type_id, degree)] = replay_cycles(series, threshold, degree, days_ahead,
+                                                             min_readings, fit_method)
+    return results
+
+def summarize_cycles(results, lead_buckets=LEAD_BUCKETS):
+    """Crossing forecast error distribution per key of backtest_fleet, in days.
+    
+    Per key: cycles, windows, forecasts (windows that forecast a crossing),
+    mean absolute error, bias, the P10/P50/P90 error, and the mean absolute
+    error of forecasts made at least each lead_buckets number of days before
+    the reset (keys like "mae_lead_90"). NaN where nothing was forecast.
+    """
+    def stat(function, values):
+        return float(function(values)) if len(values) else float("nan")
+    
+    summary = {}
+    for key, result in results.items():
+        forecast = ~np.isnan(result["errors"])
+        errors = result["errors"][forecast]
+        leads = result["lead_days"][forecast]
+        row = {
+            "cycles": result["cycles"],
+            "windows": len(result["errors"]),
+            "forecasts": len(errors),
+            "mae_days": stat(np.mean, np.abs(errors)),
+            "bias_days": stat(np.mean, errors),
+        }
+        for p in (10, 50, 90):
+            row[f"p{p}_days"] = stat(lambda v: np.percentile(v, p), errors)
+        for lead in lead_buckets:
+            row[f"mae_lead_{lead}"] = stat(np.mean, np.abs(errors[leads >= lead]))
+        summary[key] = row
+    return summary
+
+def format_cycle_summary(summary, lead_buckets=LEAD_BUCKETS):
+    """Text table of summarize_cycles output, one asset type and degree per row."""
+    lead_headers = "".join(f"{f'MAE >={lead}d':>11}" for lead in lead_buckets)
+    lines = [f"{'type':<10}{'deg':>4}{'cycles':>8}{'windows':>9}{'forecast':>9}{'MAE':>8}{'bias':>8}"
+             f"{'P10':>8}{'P50':>8}{'P90':>8}{lead_headers}"]
+    for (asset_type_id, degree), row in summary.items():
+        leads = "".join(f"{row[f'mae_lead_{lead}']:>11.1f}" for lead in lead_buckets)
+        lines.append(f"{asset_type_id:<10}{degree:>4}{row['cycles']:>8}{row['windows']:>9}{row['forecasts']:>9}"
+                     f"{row['mae_days']:>8.1f}{row['bias_days']:>8.1f}{row['p10_days']:>8.1f}"
+                     f"{row['p50_days']:>8.1f}{row['p90_days']:>8.1f}{leads}")
+    return "\n".join(lines)
+
+def format_summary(summary):
+    """Text table of summarize_backtest output, one family per row."""
+    lines = [f"{'family':<12}{'fits':>7}{'failed':>7}{'MAE':>8}{'median':>8}{'P90':>8}{'bias':>8}"
+             f"{'cross MAE d':>12}{'missed':>7}{'fit ms':>8}"]
+    for family, row in summary.items():
+        lines.append(f"{family:<12}{row['fits']:>7}{row['failed']:>7}{row['mae']:>8.2f}"
+                     f"{row['median_abs_error']:>8.2f}{row['p90_abs_error']:>8.2f}{row['bias']:>8.2f}"
+                     f"{row['crossing_mae_days']:>12.1f}{row['missed_crossings']:>7}{row['fit_ms']:>8.2f}")
+    return "\n".join(lines)
+
+def main():
+    """Backtest forecasts on the history of a database from the command line."""
+    from data.database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Measure wear forecast accuracy on past readings")
+    parser.add_argument("--db", default="./tul_maintenance.db", help="SQLite database path")
+    parser.add_argument("--asset-type", action="append", help="Asset type to backtest (default: all)")
+    parser.add_argument("--cycles", action="store_true",
+                        help="Replay completed wear cycles against their reset dates instead of holding out readings")
+    parser.add_argument("--families", nargs="+", default=list(MODEL_FAMILIES), choices=MODEL_FAMILIES)
+    parser.add_argument("--train-fraction", type=float, default=TRAIN_FRACTION)
+    parser.add_argument("--degrees", nargs="+", type=int, default=[1, 2, 3], help="Polynomial degrees to replay")
+    parser.add_argument("--days-ahead", type=int, default=REPLAY_DAYS_AHEAD)
+    args = parser.parse_args()
+    
+    db_manager = DatabaseManager(args.db)
+    db_manager.create_tables()
+    try:
+        service = PredictionService(db_manager)
+        asset_type_ids = args.asset_type or [row[0] for row in service.reference_data.get_asset_types()]
+        if args.cycles:
+            results = backtest_fleet(service, asset_type_ids, args.degrees, args.days_ahead)
+            print(format_cycle_summary(summarize_cycles(results)))
+            return
+        
+        for asset_type_id in asset_type_ids:
+            series = db_manager.get_measurement_history(asset_type_id=asset_type_id)
+            results = backtest_models(series, args.families, service.get_threshold(asset_type_id),
+                                      args.train_fraction, fit_method=service.get_fit_method(asset_type_id))
+            print(f"{asset_type_id}\n{format_summary(summarize_backtest(results))}\n")
+    finally:
+        db_manager.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+# File: models/fleet_analytics.py
+
+import numpy as np
+
+# A reading below this fraction of the previous one marks a maintenance reset
+RESET_DROP_RATIO = 0.5
+
+# Robust z-score above which an asset's wear rate counts as an outlier
+OUTLIER_Z = 3.5
+
+# Ways to fit a wear segment: least squares, or fits that resist mistyped readings
+FIT_METHODS = ("ols", "huber", "theil_sen", "trimmed")
+DEFAULT_FIT_METHOD = "ols"
+
+# Huber weights start below 1 this many residual scales from the fit
+HUBER_K = 1.345
+
+# Trimmed and Theil-Sen fits leave out readings this many residual scales from the fit
+TRIM_CUTOFF = 3.5
+
+# Theil-Sen fits use every pair of readings in segments up to this long; longer segments
+# pair each reading with this many later readings instead, so memory stays linear
+THEIL_SEN_ALL_PAIRS = 100
+THEIL_SEN_LAGS = 50
+
+# Residuals this small count as on the fit, so exact data keeps its weights
+ROUNDING_TOLERANCE = 1e-9
+
+# Reweighting passes for the iterative robust fits, which stop once no weight moves by more than the tolerance
+ROBUST_ITERATIONS = 20
+ROBUST_TOLERANCE = 1e-3
+
+# Floor on variances that are divided by, for assets whose readings fit a line exactly
+MIN_VARIANCE = 1e-12
+
+
+def group_measurements(rows):
+    """Convert measurement rows into flat arrays grouped by asset.
+
+    rows are tuples as returned by DatabaseManager.get_measurements. Returns
+    (asset_ids, codes, days, wear): codes index into asset_ids, days count
+    from 1970-01-01, and the arrays are sorted by asset then date.
+    """
+    if not rows:
+        return [], np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+
+    asset_ids, codes = np.unique([row[1] for row in rows], return_inverse=True)
+    days = np.array([str(row[2]) for row in rows], dtype='datetime64[D]').astype(np.int64)
+    wear = np.array([row[3] for row in rows], dtype=float)
+
+    # Stable sort keeps rows from the same day in insertion order
+    order = np.lexsort((days, codes))
+    return asset_ids.tolist(), codes[order], days[order], wear[order]
+
+
+def asset_offsets(codes, n_assets):
+    """Start offsets of each asset's rows in code-sorted arrays (length n_assets + 1)."""
+    return np.searchsorted(codes, np.arange(n_assets + 1))
+
+
+def segment_index(codes, wear, drop_ratio=RESET_DROP_RATIO):
+    """Number the wear segments between maintenance resets.
+
+    A new segment starts at each asset's first reading and wherever a reading
+    drops below drop_ratio times the previous one. Returns (segments,
+    segment_codes): the segment number of every reading and the asset code of
+    every segment.
+    """
+    n = len(codes)
+    if n == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = (codes[1:] != codes[:-1]) | (wear[1:] < wear[:-1] * drop_ratio)
+    segments = np.cumsum(starts) - 1
+    return segments, codes[starts]
+
+
+def _centred_sums(groups, days, wear, n_groups):
+    """Per-group count, Sxx and Sxy around each group's mean day and wear."""
+    counts = np.bincount(groups, minlength=n_groups).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = np.bincount(groups, weights=days, minlength=n_groups) / counts
+        mean_y = np.bincount(groups, weights=wear, minlength=n_groups) / counts
+    dx = days - mean_x[groups]
+    dy = wear - mean_y[groups]
+    sxx = np.bincount(groups, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(groups, weights=dx * dy, minlength=n_groups)
+    return counts, sxx, sxy
+
+
+def segment_wear_rates(segments, days, wear, n_segments=None):
+    """Least-squares slope (mm/day) of every segment in one pass.
+
+    Segments with fewer than two distinct days get NaN.
+    """
+    if n_segments is None:
+        n_segments = int(segments.max()) + 1 if len(segments) else 0
+    counts, sxx, sxy = _centred_sums(segments, days.astype(float), wear, n_segments)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(sxx > 0, sxy / sxx, np.nan)
+
+
+def fleet_wear_rates(codes, days, wear, n_assets):
+    """Wear rate (mm/day) of every asset, ignoring the drops at maintenance resets.
+
+    Each asset's rate is the pooled within-segment least-squares slope: one
+    common slope with a separate intercept per segment. Assets without any
+    segment spanning two days get NaN.
+    """
+    segments, segment_codes = segment_index(codes, wear)
+    n_segments = len(segment_codes)
+    counts, sxx, sxy = _centred_sums(segments, days.astype(float), wear, n_segments)
+
+    asset_sxx = np.bincount(segment_codes, weights=sxx, minlength=n_assets)
+    asset_sxy = np.bincount(segment_codes, weights=sxy, minlength=n_assets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(asset_sxx > 0, asset_sxy / asset_sxx, np.nan)
+
+
+def _weighted_group_means(values, weights, groups, n_groups):
+    """Weighted mean of values per group and its variance 1/Σw (NaN and inf for empty groups)."""
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.bincount(groups, weights=weights * values, minlength=n_groups) / totals
+        return means, 1.0 / totals
+
+
+def _between_variance(values, variances, groups, n_groups):
+    """Method-of-moments spread of the true values around their group means.
+
+    The spread of values about the precision-weighted group means, less the
+    average sampling variance; never negative, and 0 without spare readings.
+    """
+    dof = len(values) - len(np.unique(groups))
+    if dof <= 0:
+        return 0.0
+    means, _ = _weighted_group_means(values, 1.0 / np.maximum(variances, MIN_VARIANCE), groups, n_groups)
+    spread = np.sum((values - means[groups]) ** 2) / dof - np.mean(variances)
+    return max(float(spread), 0.0)
+
+
+def shrink_estimates(estimates, variances, prior_means, prior_variances, tau2):
+    """Posterior mean and variance of noisy estimates under a normal prior.
+
+    Each estimate, with sampling variance variances (inf for no
+    information), is pulled toward its prior mean by the factor
+    B = v / (v + tau2), tau2 being the spread of the true values around the
+    prior. prior_variances is the uncertainty of the prior mean itself.
+    """
+    estimates = np.asarray(estimates, dtype=float)
+    variances = np.asarray(variances, dtype=float)
+    known = np.isfinite(variances) & np.isfinite(estimates)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shrinkage = np.where(known, variances / np.maximum(variances + tau2, MIN_VARIANCE), 1.0)
+        posterior = np.where(known, prior_means + (1.0 - shrinkage) * (estimates - prior_means), prior_means)
+        posterior_variances = np.where(known, (1.0 - shrinkage) * variances, tau2) + shrinkage ** 2 * prior_variances
+    return posterior, posterior_variances
+
+
+def pooled_wear_rates(codes, days, wear, n_assets, tul_codes, n_tuls):
+    """Wear rate of every asset shrunk toward its TUL and asset type (empirical Bayes).
+
+    codes, days and wear are one asset type's readings, grouped as
+    group_measurements returns them, and tul_codes the TUL of each asset.
+    Each asset's own rate is the pooled within-segment slope of
+    fleet_wear_rates, with sampling variance σ²/Sxx from the type's residual
+    variance σ². TUL means are shrunk toward the type mean and asset rates
+    toward their TUL's, with the spreads at both levels estimated by the
+    method of moments, so assets with little history lean on their sister
+    assets and those with a long history keep their own rate. Assets
+    without two distinct days get the TUL rate.
+
+    Returns (rates, rate_variances, residual_variance), the first two per asset.
+    """
+    segments, segment_codes = segment_index(codes, wear)
+    n_segments = len(segment_codes)
+    days = days.astype(float)
+    counts, sxx, sxy = _centred_sums(segments, days, wear, n_segments)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_y = np.bincount(segments, weights=wear, minlength=n_segments) / counts
+    syy = np.bincount(segments, weights=(wear - mean_y[segments]) ** 2, minlength=n_segments)
+
+    asset_sxx = np.bincount(segment_codes, weights=sxx, minlength=n_assets)
+    asset_sxy = np.bincount(segment_codes, weights=sxy, minlength=n_assets)
+    asset_syy = np.bincount(segment_codes, weights=syy, minlength=n_assets)
+
+    # One slope and an intercept per segment leave readings - segments - 1 degrees of freedom
+    dof = np.bincount(codes, minlength=n_assets) - np.bincount(segment_codes, minlength=n_assets) - 1
+    sloped = asset_sxx > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        own_rates = np.where(sloped, asset_sxy / asset_sxx, np.nan)
+        rss = np.where(sloped, asset_syy - asset_sxy * own_rates, 0.0)
+    counted = sloped & (dof > 0)
+    residual_variance = float(max(rss[counted].sum(), 0.0) / dof[counted].sum()) if counted.any() else 0.0
+    with np.errstate(divide="ignore"):
+        variances = np.where(sloped, residual_variance / np.where(sloped, asset_sxx, 1.0), np.inf)
+
+    # TUL means of the assets with a rate, then the type mean of the TULs with one
+    tau2 = _between_variance(own_rates[sloped], variances[sloped], tul_codes[sloped], n_tuls)
+    tul_means, tul_variances = _weighted_group_means(
+        own_rates[sloped], 1.0 / np.maximum(variances[sloped] + tau2, MIN_VARIANCE), tul_codes[sloped], n_tuls)
+    rated = np.isfinite(tul_means)
+    single = np.zeros(int(rated.sum()), dtype=np.int64)
+    tul_tau2 = _between_variance(tul_means[rated], tul_variances[rated], single, 1)
+    type_mean, type_variance = _weighted_group_means(
+        tul_means[rated], 1.0 / np.maximum(tul_variances[rated] + tul_tau2, MIN_VARIANCE), single, 1)
+
+    tul_rates, tul_rate_variances = shrink_estimates(tul_means, tul_variances, type_mean[0], type_variance[0],
+                                                     tul_tau2)
+    rates, rate_variances = shrink_estimates(own_rates, variances, tul_rates[tul_codes],
+                                             tul_rate_variances[tul_codes], tau2)
+    return rates, rate_variances, residual_variance
+
+
+def robust_z_scores(values):
+    """Robust z-scores, 0.6745 * (x - median) / MAD, ignoring NaNs.
+
+    Falls back to the mean absolute deviation when more than half the values
+    are identical (MAD of zero), and returns zeros if there is no spread at all.
+    """
+    values = np.asarray(values, dtype=float)
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return np.zeros_like(values)
+
+    median = np.median(finite)
+    mad = np.median(np.abs(finite - median))
+    if mad > 0:
+        return 0.6745 * (values - median) / mad
+
+    mean_ad = np.mean(np.abs(finite - median))
+    if mean_ad > 0:
+        return (values - median) / (1.253314 * mean_ad)
+    return np.zeros_like(values)
+
+
+def segment_medians(values, starts):
+    """Median of values[starts[i]:starts[i + 1]] for every group, NaN for empty groups."""
+    starts = np.asarray(starts)
+    counts = np.diff(starts)
+    groups = np.repeat(np.arange(len(counts)), counts)
+    ordered = values[starts[0]:starts[-1]][np.lexsort((values[starts[0]:starts[-1]], groups))]
+    if len(ordered) == 0:
+        return np.full(len(counts), np.nan)
+
+    # Mean of the two middle values, which are the same one for odd counts
+    first = starts[:-1] - starts[0]
+    lower = ordered[np.minimum(first + (counts - 1) // 2, len(ordered) - 1)]
+    upper = ordered[np.minimum(first + counts // 2, len(ordered) - 1)]
+    return np.where(counts > 0, (lower + upper) / 2, np.nan)
+
+
+def residual_scales(residuals, starts):
+    """Robust standard deviation, 1.4826 * MAD, of every group's residuals."""
+    medians = np.repeat(segment_medians(residuals, starts), np.diff(starts))
+    return 1.4826 * segment_medians(np.abs(residuals - medians), starts)
+
+
+def robust_weights(residuals, scales, method):
+    """Weight of each reading in a robust fit, given its residual and residual scale.
+
+    Huber weights fall from 1 as min(1, HUBER_K·s/|r|); the trimmed and
+    Theil-Sen methods give 0 to readings beyond TRIM_CUTOFF·s and 1 to the
+    rest. With a zero scale only readings on the fit, within rounding error,
+    keep their weight.
+    """
+    distance = np.abs(residuals)
+    if method == "huber":
+        limit = HUBER_K * scales + ROUNDING_TOLERANCE
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(distance > limit, limit / distance, 1.0)
+    return np.where(distance > TRIM_CUTOFF * scales + ROUNDING_TOLERANCE, 0.0, 1.0)
+
+
+def _weighted_fits(segments, powers, wear, weights, valid, n_segments, n_params):
+    """Weighted least-squares coefficients of every valid segment, NaN elsewhere."""
+    weighted = powers * weights[:, None]
+    moments = np.stack([np.bincount(segments, weights=weighted[:, k], minlength=n_segments)
+                        for k in range(2 * n_params - 1)], axis=1)
+    xty = np.stack([np.bincount(segments, weights=weighted[:, k] * wear, minlength=n_segments)
+                    for k in range(n_params)], axis=1)
+    xtx = moments[:, np.arange(n_params)[:, None] + np.arange(n_params)[None, :]]
+
+    coefficients = np.full((n_segments, n_params), np.nan)
+    if valid.any():
+        coefficients[valid] = (np.linalg.pinv(xtx[valid]) @ xty[valid][..., None])[..., 0]
+    return coefficients
+
+
+def _theil_sen_pairs(segments, starts):
+    """Index pairs (first, second) of readings in the same segment, in segment order.
+
+    Segments of up to THEIL_SEN_ALL_PAIRS readings give every pair. Longer
+    ones pair each reading with THEIL_SEN_LAGS later readings at evenly
+    spread offsets, so their pair count grows linearly with their length.
+    """
+    n = len(segments)
+    index = np.arange(n)
+    ends = starts[1:][segments]
+    counts = np.diff(starts)[segments]
+    short = counts <= THEIL_SEN_ALL_PAIRS
+
+    # Pair every reading of a short segment with each later reading of its segment
+    later = np.where(short, ends - index - 1, 0)
+    first = np.repeat(index, later)
+    second = first + 1 + np.arange(later.sum()) - np.repeat(np.cumsum(later) - later, later)
+    if short.all():
+        return first, second
+
+    long_first = index[~short]
+    steps = np.arange(1, THEIL_SEN_LAGS + 1)
+    lags = np.rint(steps * (counts[long_first, None] - 1) / THEIL_SEN_LAGS).astype(np.int64)
+    lag_first = np.repeat(long_first, THEIL_SEN_LAGS)
+    lag_second = lag_first + lags.ravel()
+    inside = lag_second < np.repeat(ends[long_first], THEIL_SEN_LAGS)
+
+    first = np.concatenate([first, lag_first[inside]])
+    second = np.concatenate([second, lag_second[inside]])
+    order = np.argsort(first, kind="stable")
+    return first[order], second[order]
+
+
+def _theil_sen_fits(segments, t, wear, starts, n_segments):
+    """Median pairwise slope and median intercept of every segment, as (n_segments, 2)."""
+    first, second = _theil_sen_pairs(segments, starts)
+    dt = t[second] - t[first]
+    distinct = dt > 0
+    first, second = first[distinct], second[distinct]
+    slopes = (wear[second] - wear[first]) / dt[distinct]
+
+    # Pairs are in segment order, so each segment's slopes are contiguous
+    pair_starts = np.searchsorted(segments[first], np.arange(n_segments + 1))
+    slope = segment_medians(slopes, pair_starts)
+    intercept = segment_medians(wear - slope[segments] * t, starts)
+    return np.stack([intercept, slope], axis=1)
+
+
+def robust_segment_fits(segments, days, wear, n_segments, degree=1, method=DEFAULT_FIT_METHOD):
+    """Polynomial fit of every segment by the given method, with each reading's weight.
+
+    "ols" is plain least squares. "theil_sen" (degree 1 only) takes the
+    median of the slopes between pairs of readings (every pair in segments
+    of up to THEIL_SEN_ALL_PAIRS readings). "huber" and "trimmed" start
+    from the Theil-Sen line, which a mistyped reading at the end of a
+    segment cannot drag the way it drags least squares, and then refit by
+    weighted least squares until the weights settle: "huber" with
+    Huber weights from the start's residual scale (IRLS), "trimmed"
+    dropping readings beyond TRIM_CUTOFF residual scales, in the manner of
+    RANSAC. Segments that would keep too few readings are not trimmed.
+    Every segment is solved at once in each pass.
+
+    Returns (coefficients, origins, scales, weights), the first three as
+    segment_polynomial_fits returns them; weights are 0..1 per reading, and
+    for "theil_sen" mark the readings within TRIM_CUTOFF of the fit.
+    """
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method {method!r}")
+    if method == "theil_sen" and degree != 1:
+        raise ValueError("Theil-Sen fits are straight lines; use degree 1")
+
+    n_params = degree + 1
+    days = np.asarray(days, dtype=float)
+    wear = np.asarray(wear, dtype=float)
+    weights = np.ones(len(days))
+    if len(days) == 0:
+        return np.full((n_segments, n_params), np.nan), np.zeros(n_segments), np.ones(n_segments), weights
+
+    starts = np.searchsorted(segments, np.arange(n_segments + 1))
+    counts = np.diff(starts)
+    min_points = max(3, n_params)
+    origins = days[np.minimum(starts[:-1], len(days) - 1)]
+    spans = days[np.maximum(starts[1:] - 1, 0)] - origins
+    scales = np.maximum(spans, 1.0)
+    valid = (counts >= min_points) & (spans > 0)
+
+    # Power sums Σwtᵏ for k up to 2·degree give every XᵀWX entry at once
+    t = (days - origins[segments]) / scales[segments]
+    powers = t[:, None] ** np.arange(2 * n_params - 1)
+
+    def residuals_of(coefficients):
+        fitted = np.einsum('ij,ij->i', powers[:, :n_params], coefficients[segments])
+        return np.where(valid[segments], wear - fitted, 0.0)
+
+    if method == "ols":
+        coefficients = _weighted_fits(segments, powers, wear, weights, valid, n_segments, n_params)
+        return coefficients, origins, scales, weights
+
+    # Higher degrees start from the line too, with zero curvature
+    coefficients = np.zeros((n_segments, n_params))
+    coefficients[:, :2] = _theil_sen_fits(segments, t, wear, starts, n_segments)
+    coefficients[~valid] = np.nan
+
+    # The residual scale is taken once, from the starting line, so later passes cannot inflate it
+    residuals = residuals_of(coefficients)
+    residual_scale = residual_scales(residuals, starts)[segments]
+    if method == "theil_sen":
+        return coefficients, origins, scales, robust_weights(residuals, residual_scale, method)
+
+    for _ in range(ROBUST_ITERATIONS):
+        new_weights = robust_weights(residuals_of(coefficients), residual_scale, method)
+        if method == "trimmed":
+            kept = np.bincount(segments, weights=new_weights, minlength=n_segments)
+            new_weights = np.where((kept < min_points)[segments], 1.0, new_weights)
+        settled = np.allclose(new_weights, weights, rtol=0.0, atol=ROBUST_TOLERANCE)
+        weights = new_weights
+        coefficients = _weighted_fits(segments, powers, wear, weights, valid, n_segments, n_params)
+        if settled:
+            break
+    return coefficients, origins, scales, weights
+
+
+def segment_polynomial_fits(segments, days, wear, n_segments, degree=1, method=DEFAULT_FIT_METHOD):
+    """Polynomial of every segment, solved as one batched system.
+
+    segments must be non-decreasing (as returned by segment_index). Days are
+    mapped to t = (day - origin) / scale per segment, like WearPredictionModel.
+    method is one of FIT_METHODS (see robust_segment_fits); the default is
+    least squares. Returns (coefficients, origins, scales): coefficients has
+    shape (n_segments, degree + 1) in increasing powers of t, and is NaN for
+    segments with fewer than max(3, degree + 1) readings or a single day.
+    """
+    coefficients, origins, scales, _ = robust_segment_fits(segments, days, wear, n_segments, degree, method)
+    return coefficients, origins, scales
+
+
+def segment_covariances(segments, days, wear, coefficients, origins, scales, weights):
+    """Coefficient covariance σ²(XᵀWX)⁻¹ of every segment's fit, as WearPredictionModel computes it.
+
+    Takes the outputs of robust_segment_fits. σ² is the weighted residual
+    sum of squares over the readings with a nonzero weight less the number
+    of coefficients. Returns shape (n_segments, p, p), NaN for segments
+    without a fit or without residual degrees of freedom.
+    """
+    n_segments, n_params = coefficients.shape
+    days = np.asarray(days, dtype=float)
+    wear = np.asarray(wear, dtype=float)
+    t = (days - origins[segments]) / scales[segments]
+    powers = t[:, None] ** np.arange(2 * n_params - 1)
+
+    weighted = powers * weights[:, None]
+    moments = np.stack([np.bincount(segments, weights=weighted[:, k], minlength=n_segments)
+                        for k in range(2 * n_params - 1)], axis=1)
+    xtx = moments[:, np.arange(n_params)[:, None] + np.arange(n_params)[None, :]]
+
+    residuals = wear - np.einsum('ij,ij->i', powers[:, :n_params], coefficients[segments])
+    rss = np.bincount(segments, weights=weights * residuals ** 2, minlength=n_segments)
+    dof = np.bincount(segments, weights=(weights > 0).astype(float), minlength=n_segments) - n_params
+
+    covariances = np.full((n_segments, n_params, n_params), np.nan)
+    valid = np.isfinite(coefficients).all(axis=1) & (dof > 0)
+    if valid.any():
+        covariances[valid] = (rss[valid] / dof[valid])[:, None, None] * np.linalg.pinv(xtx[valid])
+    return covariances
+
+
+def period_starts(days, resolution):
+    """First day of the week ("W", starting Monday) or month ("M") containing each day."""
+    days = np.asarray(days, dtype=np.int64)
+    if resolution == "W":
+        # 1970-01-01 was a Thursday, three days after the Monday starting its week
+        return (days + 3) // 7 * 7 - 3
+    months = days.astype('datetime64[D]').astype('datetime64[M]')
+    return months.astype('datetime64[D]').astype(np.int64)
+
+
+def rollup_periods(codes, days, wear, resolution):
+    """Min, max and mean wear per asset, wear segment and calendar period.
+
+    Inputs are grouped by asset and sorted by date as group_measurements
+    returns them. Segments are numbered from 0 within each asset, so a period
+    containing a maintenance reset gives one row per segment. Returns
+    (codes, segments, period_starts, min, max, mean, counts), ordered by
+    asset and then date.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    wear = np.asarray(wear, dtype=float)
+    if len(codes) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, np.array([]), np.array([]), np.array([]), empty
+
+    segments, segment_codes = segment_index(codes, wear)
+    asset_segments = segments - np.searchsorted(segment_codes, codes)
+    starts = period_starts(days, resolution)
+
+    # Rows of one (asset, segment, period) group are contiguous in date order
+    new_group = np.ones(len(codes), dtype=bool)
+    new_group[1:] = (segments[1:] != segments[:-1]) | (starts[1:] != starts[:-1])
+    first = np.flatnonzero(new_group)
+    counts = np.diff(np.append(first, len(codes)))
+    return (codes[first], asset_segments[first], starts[first],
+            np.minimum.reduceat(wear, first), np.maximum.reduceat(wear, first),
+            np.add.reduceat(wear, first) / counts, counts)
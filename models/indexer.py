@@ -1,17 +1,34 @@
-class Indexer:
-    """Model representing a train indexer."""
+from dataclasses import dataclass
+from datetime import date
+from models.measurement import parse_date
+
+@dataclass(frozen=True, slots=True)
+class TUL:
+    """Model representing a train unloader (TUL)."""
     
-    def __init__(self, indexer_id, location="", installation_date=None, notes=""):
-        self.indexer_id = indexer_id
-        self.location = location
-        self.installation_date = installation_date
-        self.notes = notes
+    tul_id: str
+    location: str = ""
+    installation_date: date = None
+    notes: str = ""
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build a TUL from a DatabaseManager.get_tuls row."""
+        return cls(row[0], row[1] or "", parse_date(row[2]), row[3] or "")
         
     def to_dict(self):
         """Convert to dictionary for database storage."""
         return {
-            "IndexerID": self.indexer_id,
+            "TULID": self.tul_id,
             "Location": self.location,
             "InstallationDate": self.installation_date,
             "Notes": self.notes
-        }
\ No newline at end of file
+        }
+        
+    @property
+    def indexer_id(self):
+        """Former name of tul_id."""
+        return self.tul_id
+
+# TULs were called indexers before assets were tracked separately
+Indexer = TUL
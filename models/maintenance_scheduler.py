@@ -0,0 +1,124 @@
+# File: models/maintenance_scheduler.py
+
+from datetime import date, timedelta
+import numpy as np
+from utils.instrumentation import timed
+
+# Planning horizon and how early an asset may be serviced before its deadline
+PLAN_HORIZON_DAYS = 730
+MAX_ADVANCE_DAYS = 30
+
+# Extra look-ahead for readings taken before the plan start; older readings
+# need a second, longer forecast search
+READING_AGE_ALLOWANCE_DAYS = 365
+
+def group_service_windows(deadlines, cycles, max_advance, horizon):
+    """Group the repeating service deadlines of one TUL's assets into stops.
+    
+    deadlines are the days (from the plan start) by which each asset must be
+    serviced, and cycles the days from a service until it is due again (inf if
+    it never is). An asset may be serviced up to max_advance days early. Each
+    stop is placed at the earliest pending deadline and takes every asset whose
+    window is already open; for one round of deadlines this greedy choice needs
+    the fewest stops. Returns a list of (day, asset indices, their deadlines).
+    """
+    deadlines = np.array(deadlines, dtype=float)
+    # Cycles must be positive; sub-day ones are serviced daily so the loop always advances
+    cycles = np.maximum(np.asarray(cycles, dtype=float), 1.0)
+    
+    stops = []
+    while len(deadlines):
+        day = deadlines.min()
+        if not day <= horizon:
+            break
+        served = np.flatnonzero(deadlines - max_advance <= day)
+        stops.append((day, served, deadlines[served]))
+        deadlines[served] = day + cycles[served]
+    return stops
+
+class MaintenanceScheduler:
+    """Plans maintenance stops per TUL that keep every asset below its threshold.
+    
+    Deadlines and wear rates come from PredictionService. After a service an
+    asset is assumed to return to the wear at the start of its current segment
+    and wear at the segment's average rate until it is due again.
+    """
+    
+    def __init__(self, prediction_service, max_advance_days=MAX_ADVANCE_DAYS):
+        self.prediction_service = prediction_service
+        self.reference_data = prediction_service.reference_data
+        self.max_advance_days = max_advance_days
+        
+    def asset_deadlines(self, start_date, horizon_days):
+        """Collect (asset_id, tul_id, deadline day, cycle days) for every plannable asset.
+        
+        Returns (plannable, unplanned) where unplanned lists assets without
+        a wear rate, of their own or pooled from their asset type, and assets
+        whose reset wear is already at the threshold, so no service cycle
+        keeps them below it.
+        """
+        tul_by_asset = {row[0]: row[1] for row in self.reference_data.get_assets()}
+        plannable = []
+        unplanned = []
+        
+        for asset_type in self.reference_data.get_asset_types():
+            days_ahead = horizon_days + READING_AGE_ALLOWANCE_DAYS
+            threshold, forecasts = self.prediction_service.crossing_dates(asset_type[0], days_ahead=days_ahead)
+            
+            # Search far enough ahead that old readings still cover the whole horizon
+            stale_days = max([(start_date - f["last_date"]).days for f in forecasts.values()] + [0])
+            if stale_days > READING_AGE_ALLOWANCE_DAYS:
+                threshold, forecasts = self.prediction_service.crossing_dates(
+                    asset_type[0], days_ahead=horizon_days + stale_days)
+            
+            for asset_id, forecast in forecasts.items():
+                if forecast["wear_rate"] is None:
+                    unplanned.append(asset_id)
+                    continue
+                
+                if forecast["crossing_date"]:
+                    deadline = max((forecast["crossing_date"] - start_date).days, 0)
+                else:
+                    deadline = np.inf
+                
+                if forecast["wear_rate"] > 0:
+                    cycle = (threshold - forecast["reset_wear"]) / forecast["wear_rate"]
+                else:
+                    cycle = np.inf
+                if not cycle > 0:
+                    unplanned.append(asset_id)
+                    continue
+                plannable.append((asset_id, tul_by_asset.get(asset_id), deadline, cycle))
+        
+        return plannable, unplanned
+        
+    @timed("scheduler.plan")
+    def plan(self, start_date=None, horizon_days=PLAN_HORIZON_DAYS):
+        """Plan maintenance stops from start_date over horizon_days.
+        
+        Returns (stops, unplanned). Each stop is a dict with tul_id, date and
+        assets, a list of (asset_id, deadline date) serviced at that stop; stops
+        are sorted by date. Overdue assets are due on start_date.
+        """
+        start_date = start_date or date.today()
+        plannable, unplanned = self.asset_deadlines(start_date, horizon_days)
+        
+        by_tul = {}
+        for asset_id, tul_id, deadline, cycle in plannable:
+            by_tul.setdefault(tul_id, []).append((asset_id, deadline, cycle))
+        
+        stops = []
+        for tul_id, assets in by_tul.items():
+            asset_ids = [a[0] for a in assets]
+            windows = group_service_windows([a[1] for a in assets], [a[2] for a in assets],
+                                            self.max_advance_days, horizon_days)
+            for day, served, deadlines in windows:
+                stops.append({
+                    "tul_id": tul_id,
+                    "date": start_date + timedelta(days=int(day)),
+                    "assets": [(asset_ids[i], start_date + timedelta(days=int(d)))
+                               for i, d in zip(served, deadlines)],
+                })
+        
+        stops.sort(key=lambda stop: (stop["date"], str(stop["tul_id"])))
+        return stops, sorted(unplanned)
@@ -1,24 +1,110 @@
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import date, datetime
+import numpy as np
 
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+def parse_date(value):
+    """Convert a stored 'YYYY-MM-DD' string (or a date) to a date."""
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+@dataclass(frozen=True, slots=True)
 class Measurement:
-    """Model representing an indexer wear measurement."""
+    """Model representing an asset wear measurement."""
+    
+    asset_id: str
+    measurement_date: date
+    wear_value: float = 0.0
+    shims_added: float = 0.0
+    notes: str = ""
+    measurement_id: int = None
     
-    def __init__(self, indexer_id, measurement_date=None, wear_value=0.0, 
-                 shims_added=0.0, notes="", measurement_id=None):
-        self.measurement_id = measurement_id
-        self.indexer_id = indexer_id
-        self.measurement_date = measurement_date or datetime.now().date()
-        self.wear_value = wear_value
-        self.shims_added = shims_added
-        self.notes = notes
+    @classmethod
+    def from_row(cls, row):
+        """Build a measurement from a DatabaseManager.get_measurements row."""
+        return cls(row[1], parse_date(row[2]), row[3], row[4] or 0.0, row[5] or "", row[0])
         
     def to_dict(self):
         """Convert to dictionary for database storage."""
         return {
             "MeasurementID": self.measurement_id,
-            "IndexerID": self.indexer_id,
+            "AssetID": self.asset_id,
             "MeasurementDate": self.measurement_date,
             "WearValue": self.wear_value,
             "ShimsAdded": self.shims_added,
             "Notes": self.notes
-        }
\ No newline at end of file
+        }
+
+class MeasurementSeries:
+    """Measurement history for many assets stored as parallel NumPy arrays.
+    
+    Readings are sorted by asset then date. Each reading takes 16 bytes
+    (int32 ID, asset code and day, float32 wear), so ten million readings fit
+    in about 160 MB. asset_ids[codes[i]] is the asset of reading i and days
+    count from 1970-01-01. The arrays may be read-only memory maps.
+    """
+    
+    __slots__ = ("asset_ids", "measurement_ids", "codes", "days", "wear", "offsets", "_code_by_id")
+    
+    def __init__(self, asset_ids, measurement_ids, codes, days, wear, offsets=None):
+        self.asset_ids = list(asset_ids)
+        self.measurement_ids = np.asarray(measurement_ids, dtype=np.int32)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.days = np.asarray(days, dtype=np.int32)
+        self.wear = np.asarray(wear, dtype=np.float32)
+        
+        # Start of each asset's readings; asset i spans offsets[i]:offsets[i + 1]
+        if offsets is None:
+            offsets = np.searchsorted(self.codes, np.arange(len(self.asset_ids) + 1))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._code_by_id = {asset_id: code for code, asset_id in enumerate(self.asset_ids)}
+        
+    @classmethod
+    def empty(cls):
+        """A series without readings."""
+        return cls([], [], [], [], [])
+        
+    def __len__(self):
+        return len(self.days)
+        
+    @property
+    def nbytes(self):
+        """Memory held by the arrays."""
+        return sum(a.nbytes for a in (self.measurement_ids, self.codes, self.days, self.wear, self.offsets))
+        
+    def dates(self):
+        """Reading dates as a datetime64[D] array."""
+        return EPOCH + self.days.astype('timedelta64[D]')
+        
+    def history(self, asset_id):
+        """(days, wear) views of one asset's readings; empty arrays if it has none."""
+        code = self._code_by_id.get(asset_id)
+        if code is None:
+            return self.days[:0], self.wear[:0]
+        start, end = self.offsets[code], self.offsets[code + 1]
+        return self.days[start:end], self.wear[start:end]
+        
+    def subset(self, asset_ids):
+        """New series with the readings of the given assets, ordered by asset ID.
+        
+        Assets without readings are left out, as in group_measurements.
+        """
+        picked = sorted(asset_id for asset_id in set(asset_ids) if asset_id in self._code_by_id)
+        old_codes = np.array([self._code_by_id[asset_id] for asset_id in picked], dtype=np.int64)
+        starts = self.offsets[old_codes]
+        counts = self.offsets[old_codes + 1] - starts
+        has_readings = counts > 0
+        picked = [asset_id for asset_id, keep in zip(picked, has_readings) if keep]
+        starts, counts = starts[has_readings], counts[has_readings]
+        
+        # Row index of every picked reading: each asset's start plus 0..count-1
+        first = np.cumsum(counts) - counts
+        rows = np.repeat(starts - first, counts) + np.arange(counts.sum())
+        return MeasurementSeries(picked, self.measurement_ids[rows], np.repeat(np.arange(len(picked)), counts),
+                                 self.days[rows], self.wear[rows])
+        
+    def grouped(self):
+        """(asset_ids, codes, days, wear) in the form fleet_analytics.group_measurements returns."""
+        return self.asset_ids, self.codes.astype(np.int64), self.days.astype(np.int64), self.wear.astype(float)
@@ -0,0 +1,148 @@
+# File: models/parallel_forecast.py
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from models.fleet_analytics import DEFAULT_FIT_METHOD
+from models.prediction_service import PredictionService, forecast_asset_history
+
+# Fleets smaller than this are fitted in-process; starting workers costs more
+MIN_PARALLEL_ASSETS = 200
+
+# Work items per worker, so uneven histories still balance across processes
+CHUNKS_PER_WORKER = 4
+
+# Arrays a worker needs, attached from shared memory by _attach
+_shared = {}
+
+class SharedArrays:
+    """NumPy arrays copied once into named shared memory blocks.
+    
+    spec describes the blocks, so worker processes can attach to them
+    without the data being pickled. The creating process unlinks the blocks
+    on close().
+    """
+    
+    def __init__(self, **arrays):
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.spec[name] = (block.name, array.dtype.str, array.shape)
+        
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def _attach(spec):
+    """Worker initializer: map the shared arrays described by spec."""
+    for name, (block_name, dtype, shape) in spec.items():
+        # Spawned workers share the parent's resource tracker, so attaching does not take ownership
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared[name] = (block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+
+def _forecast_codes(offsets, days, wear, first_code, end_code, threshold, days_ahead, fit_method, with_range,
+                    seed):
+    """Forecast assets first_code..end_code - 1 as (code, forecast) pairs."""
+    results = []
+    for code in range(first_code, end_code):
+        start, end = offsets[code], offsets[code + 1]
+        if end > start:
+            # Seeding per asset keeps the sampled ranges independent of how assets are chunked
+            rng = np.random.default_rng((seed, code))
+            results.append((code, forecast_asset_history(days[start:end], wear[start:end], threshold, days_ahead,
+                                                          with_range=with_range, fit_method=fit_method, rng=rng)))
+    return results
+
+def _forecast_chunk(args):
+    """Worker task: forecast one chunk of assets from the shared arrays."""
+    return _forecast_codes(_shared["offsets"][1], _shared["days"][1], _shared["wear"][1], *args)
+
+def forecast_series(series, threshold, days_ahead=365, workers=None, fit_method=DEFAULT_FIT_METHOD,
+                    with_range=True, seed=0):
+    """Fit a best-degree WearPredictionModel to every asset in a MeasurementSeries.
+    
+    Assets are split into contiguous chunks and fitted in worker processes
+    that read the series from shared memory. workers defaults to the CPU
+    count; with one worker or a small fleet everything runs in-process.
+    fit_method is passed on to fit_best_degree, and with_range adds each
+    fit's crossing_range, sampled from a generator seeded with seed and the
+    asset's position.
+    Returns {asset_id: forecast_asset_history result} in series order, the
+    same whatever the number of workers.
+    """
+    n_assets = len(series.asset_ids)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or n_assets < MIN_PARALLEL_ASSETS:
+        results = _forecast_codes(series.offsets, series.days, series.wear, 0, n_assets, threshold, days_ahead,
+                                  fit_method, with_range, seed)
+        return {series.asset_ids[code]: forecast for code, forecast in results}
+    
+    bounds = np.linspace(0, n_assets, min(n_assets, workers * CHUNKS_PER_WORKER) + 1).astype(int)
+    chunks = [(int(a), int(b), threshold, days_ahead, fit_method, with_range, seed)
+              for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    
+    # Spawned workers do not inherit the Tk process's threads and connections
+    context = multiprocessing.get_context("spawn")
+    forecasts = {}
+    with SharedArrays(offsets=series.offsets, days=series.days, wear=series.wear) as shared:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_attach, initargs=(shared.spec,)) as pool:
+            # map yields chunks in submission order, so the result order is fixed
+            for results in pool.map(_forecast_chunk, chunks):
+                for code, forecast in results:
+                    forecasts[series.asset_ids[code]] = forecast
+    return forecasts
+
+def main():
+    """Write best-degree forecasts of every asset as CSV, for scheduled runs."""
+    from data.database_manager import DatabaseManager
+    
+    parser = argparse.ArgumentParser(description="Forecast threshold crossings with per-asset best-degree fits")
+    parser.add_argument("--db", default="./tul_maintenance.db", help="SQLite database path")
+    parser.add_argument("--asset-type", action="append", help="Asset type to forecast (default: all)")
+    parser.add_argument("--days-ahead", type=int, default=365)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", help="CSV file to write (default: standard output)")
+    args = parser.parse_args()
+    
+    db_manager = DatabaseManager(args.db)
+    db_manager.create_tables()
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        service = PredictionService(db_manager)
+        writer = csv.writer(output)
+        writer.writerow(["asset_type_id", "asset_id", "last_date", "last_wear", "degree", "crossing_date",
+                         "days_until", "probability", "p10", "p50", "p90"])
+        for asset_type_id in args.asset_type or [row[0] for row in service.reference_data.get_asset_types()]:
+            _, forecasts = service.forecast_models(asset_type_id, args.days_ahead, args.workers)
+            for asset_id, forecast in forecasts.items():
+                crossing_range = forecast.get("crossing_range") or {}
+                writer.writerow([asset_type_id, asset_id, forecast["last_date"], f"{forecast['last_wear']:.2f}",
+                                 forecast["degree"], forecast["crossing_date"], forecast["days_until"],
+                                 crossing_range.get("probability"), crossing_range.get("p10"),
+                                 crossing_range.get("p50"), crossing_range.get("p90")])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        db_manager.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,121 @@
 # File: models/prediction_model.py
 
 import numpy as np
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 import pickle
+from models.fleet_analytics import RESET_DROP_RATIO, DEFAULT_FIT_METHOD, robust_segment_fits, robust_weights
+from utils.instrumentation import instrument_class, timed
+
+def sample_crossing_days(coefficients, covariance, design, threshold, n_samples=2000, rng=None):
+    """Monte Carlo first threshold crossing for draws of the model coefficients.
+    
+    coefficients (..., p) and covariance (..., p, p) describe the coefficient
+    distribution, design (..., H, p) holds the features of H future days, and
+    threshold is a scalar or broadcasts against the leading dimensions. All
+    draws are predicted with one batched matrix product. Returns the index of
+    the first day at or above threshold for every draw, shape (..., n_samples),
+    with -1 where a draw never crosses.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    coefficients = np.asarray(coefficients, dtype=float)
+    covariance = np.asarray(covariance, dtype=float)
+    
+    # Symmetric square root via eigh tolerates semi-definite covariances
+    eigvals, eigvecs = np.linalg.eigh(covariance)
+    root = eigvecs * np.sqrt(np.clip(eigvals, 0.0, None))[..., None, :]
+    
+    normals = rng.standard_normal(coefficients.shape[:-1] + (n_samples, coefficients.shape[-1]))
+    draws = coefficients[..., None, :] + normals @ np.swapaxes(root, -1, -2)
+    
+    # (..., n_samples, p) @ (..., p, H) -> (..., n_samples, H)
+    predictions = draws @ np.swapaxes(design, -1, -2)
+    crossed = predictions >= np.asarray(threshold, dtype=float)[..., None, None]
+    first = np.argmax(crossed, axis=-1)
+    return np.where(crossed.any(axis=-1), first, -1)
+
+def crossing_range(first, start_date, percentiles=(10, 50, 90)):
+    """Summarize one model's sampled crossing days from sample_crossing_days.
+    
+    Returns a dict with the crossing date at each percentile (None when that
+    share of draws does not cross) and the probability of crossing at all.
+    """
+    # Draws that never cross sort after every crossing day
+    crossing_days = np.where(first >= 0, first, np.inf)
+    result = {"probability": float(np.mean(first >= 0))}
+    for p in percentiles:
+        day = np.quantile(crossing_days, p / 100, method="inverted_cdf")
+        result[f"p{p}"] = start_date + timedelta(days=int(day)) if np.isfinite(day) else None
+    return result
+
 
 class WearPredictionModel:
-    """Handles the polynomial regression modeling for wear prediction."""
+    """Handles the polynomial regression modeling for wear prediction.
+    
+    Days are mapped to t = (day - origin) / scale before building polynomial
+    features, which keeps higher degrees well conditioned. The fitted
+    polynomial is held in `coefficients` (increasing powers of t), and the
+    normal-equation statistics XᵀX and Xᵀy of the current wear segment are
+    kept so that `update` can absorb new readings without a refit.
     
-    def __init__(self, degree=2):
+    fit_method selects least squares ("ols") or one of the robust fits of
+    fleet_analytics.robust_segment_fits. Robust fits keep the statistics
+    weighted by each reading's final weight, so a mistyped reading barely
+    counts towards the fit or its uncertainty.
+    """
+    
+    family = "polynomial"
+    
+    def __init__(self, degree=2, fit_method=DEFAULT_FIT_METHOD):
         self.model = None
         self.poly_features = None
         self.degree = degree
+        self.fit_method = fit_method
+        self.coefficients = None
+        self.origin = 0.0
+        self.scale = 1.0
+        
+        # Weight of each fitted reading, in the order given to fit()
+        self.weights = None
+        
+        # Robust spread of the residuals, used to weight readings passed to update()
+        self.residual_scale = None
+        
+        # Sufficient statistics for the current segment
+        self.xtx = None
+        self.xty = None
+        self.xtx_inv = None
+        self.yty = 0.0
+        self.n_points = 0
+        self.last_wear = None
+        self.last_day = None
+        
+    def is_trained(self):
+        """Whether the model can make predictions."""
+        return self.coefficients is not None
+        
+    def design_matrix(self, days):
+        """Polynomial features [1, t, t², ...] for the given days."""
+        t = (np.asarray(days, dtype=float) - self.origin) / self.scale
+        return np.vander(t, self.degree + 1, increasing=True)
         
     def fit(self, days, wear_values):
         """Train the model on the provided data."""
         if len(days) < 3:
             return False, "Need at least 3 data points for prediction"
-            
-        # Reshape for sklearn
-        X = np.array(days).reshape(-1, 1)
-        y = np.array(wear_values)
+        if self.fit_method != DEFAULT_FIT_METHOD:
+            return self._fit_robust(days, wear_values)
+        
+        # scikit-learn is slow to import, so load it on the first fit
+        from sklearn.preprocessing import PolynomialFeatures
+        from sklearn.linear_model import LinearRegression
+        
+        days = np.asarray(days, dtype=float)
+        y = np.asarray(wear_values, dtype=float)
+        
+        # Shift and scale days so the features stay well conditioned
+        self.origin = float(days.min())
+        self.scale = max(float(days.max()) - self.origin, 1.0)
+        X = ((days - self.origin) / self.scale).reshape(-1, 1)
         
         # Create polynomial features
         self.poly_features = PolynomialFeatures(degree=self.degree)
@@ -31,29 +125,183 @@ class WearPredictionModel:
         self.model = LinearRegression()
         self.model.fit(X_poly, y)
         
+        self.coefficients = self.model.coef_.astype(float)
+        self.coefficients[0] += self.model.intercept_
+        
+        # Start the running statistics used by update()
+        self._start_statistics(days, y, X_poly, np.ones(len(y)))
         return True, "Model trained successfully"
         
+    def _fit_robust(self, days, wear_values):
+        """fit() for the robust methods, as a single segment of robust_segment_fits."""
+        days = np.asarray(days, dtype=float)
+        y = np.asarray(wear_values, dtype=float)
+        order = np.argsort(days, kind="stable")
+        try:
+            coefficients, origins, scales, weights = robust_segment_fits(
+                np.zeros(len(days), dtype=np.int64), days[order], y[order], 1, self.degree, self.fit_method)
+        except ValueError as e:
+            return False, str(e)
+        if not np.isfinite(coefficients[0]).all():
+            return False, "Readings span a single day"
+        
+        self.model = None
+        self.poly_features = None
+        self.coefficients = coefficients[0]
+        self.origin, self.scale = float(origins[0]), float(scales[0])
+        
+        # Weights back in the caller's order
+        self.weights = np.empty(len(y))
+        self.weights[order] = weights
+        residuals = y - self.design_matrix(days) @ self.coefficients
+        self.residual_scale = 1.4826 * float(np.median(np.abs(residuals - np.median(residuals))))
+        
+        self._start_statistics(days, y, self.design_matrix(days), self.weights)
+        down_weighted = int(np.sum(self.weights < 1.0))
+        return True, f"Model trained successfully ({down_weighted} readings down-weighted)"
+        
+    def _start_statistics(self, days, y, X_poly, weights):
+        """Weighted XᵀX, Xᵀy and yᵀy of a fresh fit, the starting point of update()."""
+        self.weights = weights
+        weighted = X_poly * weights[:, None]
+        self.xtx = X_poly.T @ weighted
+        self.xty = weighted.T @ y
+        self.xtx_inv = np.linalg.pinv(self.xtx)
+        self.yty = float(y @ (weights * y))
+        self.n_points = int(np.count_nonzero(weights))
+        
+        # The latest reading that counts, so a mistyped one does not look like a reset later
+        counted = np.flatnonzero(weights > 0)
+        self.last_wear = float(y[counted[np.argmax(days[counted])]])
+        self.last_day = float(np.max(days))
+        
+    def update(self, day, wear_value):
+        """Absorb one new reading into the fit in O(degree²).
+        
+        XᵀX and Xᵀy are updated in place and (XᵀX)⁻¹ with a Sherman-Morrison
+        rank-one update. A reading below RESET_DROP_RATIO of the previous one
+        is treated as a maintenance reset and starts a fresh segment; the model
+        is untrained again until the new segment has enough readings. Robust
+        models weight the reading by its residual from the current fit.
+        Readings not after the latest one are refused: a refit keeps only the
+        last reading of a day and places back-dated ones in date order.
+        """
+        if self.xtx is None:
+            return False, "Model not trained"
+        if self.last_day is not None and day <= self.last_day:
+            return False, "Reading is not after the last one; refit instead"
+        
+        n_params = self.degree + 1
+        reset = self.last_wear is not None and wear_value < self.last_wear * RESET_DROP_RATIO
+        if reset:
+            self.origin = float(day)
+            self.xtx = np.zeros((n_params, n_params))
+            self.xty = np.zeros(n_params)
+            self.xtx_inv = None
+            self.yty = 0.0
+            self.n_points = 0
+            self.coefficients = None
+            self.model = None
+            self.poly_features = None
+        
+        self.last_day = float(day)
+        x = self.design_matrix([day])[0]
+        weight = 1.0
+        if self.fit_method != DEFAULT_FIT_METHOD and self.is_trained() and self.residual_scale is not None:
+            weight = float(robust_weights(wear_value - x @ self.coefficients, self.residual_scale, self.fit_method))
+            if weight == 0.0:
+                return True, "Reading left out as an outlier"
+        
+        self.xtx += weight * np.outer(x, x)
+        self.xty += weight * x * wear_value
+        self.yty += weight * wear_value * wear_value
+        self.n_points += 1
+        self.last_wear = float(wear_value)
+        
+        if self.n_points < max(3, n_params):
+            return True, "Waiting for more readings in the new segment"
+        
+        if self.xtx_inv is None:
+            # First solve in this segment
+            self.xtx_inv = np.linalg.pinv(self.xtx)
+        else:
+            inv_x = self.xtx_inv @ x
+            self.xtx_inv -= weight * np.outer(inv_x, inv_x) / (1.0 + weight * (x @ inv_x))
+        self.coefficients = self.xtx_inv @ self.xty
+        
+        return True, "Maintenance reset detected, new segment started" if reset else "Model updated"
+        
     def predict(self, days):
         """Predict wear for the given days."""
-        if self.model is None or self.poly_features is None:
+        if not self.is_trained():
             return None, "Model not trained"
-            
-        # Convert to numpy array and reshape
-        X = np.array(days).reshape(-1, 1)
         
-        # Transform to polynomial features
-        X_poly = self.poly_features.transform(X)
-        
-        # Predict
-        predictions = self.model.predict(X_poly)
+        predictions = self.design_matrix(days) @ self.coefficients
         
         return predictions, "Prediction completed"
         
+    def residual_variance(self):
+        """Residual variance of the current segment's fit, or None if undefined."""
+        dof = self.n_points - (self.degree + 1)
+        if not self.is_trained() or self.xtx is None or dof <= 0:
+            return None
+        
+        # RSS = yᵀWy - 2βᵀXᵀWy + βᵀXᵀWXβ, which holds for robust β as well
+        beta = self.coefficients
+        rss = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        return max(float(rss), 0.0) / dof
+        
+    def coefficient_covariance(self):
+        """Covariance of the coefficients, σ²(XᵀX)⁻¹, or None if undefined."""
+        variance = self.residual_variance()
+        if variance is None:
+            return None
+        return variance * self.xtx_inv
+        
+    def predict_interval(self, days, confidence=0.9):
+        """Predict wear with a prediction interval for new readings.
+        
+        Returns (predictions, lower, upper); lower and upper are None when the
+        fit has no residual degrees of freedom.
+        """
+        predictions, message = self.predict(days)
+        covariance = self.coefficient_covariance()
+        if predictions is None or covariance is None:
+            return predictions, None, None
+        
+        # Student t quantile for the residual degrees of freedom
+        from scipy.stats import t as student_t
+        dof = self.n_points - (self.degree + 1)
+        quantile = student_t.ppf(0.5 + confidence / 2, dof)
+        
+        X = self.design_matrix(days)
+        mean_variance = np.einsum('ij,jk,ik->i', X, covariance, X)
+        spread = quantile * np.sqrt(mean_variance + self.residual_variance())
+        return predictions, predictions - spread, predictions + spread
+        
+    def crossing_date_distribution(self, start_day, days_ahead, start_date, threshold,
+                                   n_samples=2000, percentiles=(10, 50, 90), rng=None):
+        """Distribution of the threshold crossing date from coefficient uncertainty.
+        
+        Returns a dict with the crossing date at each percentile (None when that
+        share of draws does not cross within days_ahead) and the probability
+        of crossing within the window.
+        """
+        if not self.is_trained():
+            return None, "Model not trained"
+        covariance = self.coefficient_covariance()
+        if covariance is None:
+            return None, "Not enough readings to estimate uncertainty"
+        
+        design = self.design_matrix(np.arange(start_day, start_day + days_ahead + 1))
+        first = sample_crossing_days(self.coefficients, covariance, design, threshold, n_samples, rng)
+        return crossing_range(first, start_date, percentiles), "Crossing distribution computed"
+        
     def calculate_threshold_crossing(self, start_day, days_ahead, start_date, threshold):
         """Calculate when wear crosses the maintenance threshold."""
-        if self.model is None or self.poly_features is None:
+        if not self.is_trained():
             return None, "Model not trained"
-            
+        
         # Generate sequence of days for prediction
         future_days = range(start_day, start_day + days_ahead + 1)
         
@@ -67,26 +315,108 @@ class WearPredictionModel:
                 crossing_date = start_date + timedelta(days=i)
                 days_until = i
                 return crossing_date, days_until
-                
+        
         return None, "Threshold not reached within prediction window"
         
     def save_model(self, filename):
         """Save trained model to file."""
-        if self.model is None:
+        if not self.is_trained():
             return False, "No model to save"
-            
+        
+        state = {
+            "degree": self.degree,
+            "fit_method": self.fit_method,
+            "residual_scale": self.residual_scale,
+            "model": self.model,
+            "poly_features": self.poly_features,
+            "coefficients": self.coefficients,
+            "origin": self.origin,
+            "scale": self.scale,
+            "xtx": self.xtx,
+            "xty": self.xty,
+            "yty": self.yty,
+            "n_points": self.n_points,
+            "last_wear": self.last_wear,
+            "last_day": self.last_day,
+        }
         try:
             with open(filename, 'wb') as f:
-                pickle.dump((self.model, self.poly_features, self.degree), f)
+                pickle.dump(state, f)
             return True, "Model saved successfully"
         except Exception as e:
             return False, f"Error saving model: {str(e)}"
-            
+        
     def load_model(self, filename):
         """Load trained model from file."""
         try:
             with open(filename, 'rb') as f:
-                self.model, self.poly_features, self.degree = pickle.load(f)
+                state = pickle.load(f)
+            
+            if isinstance(state, tuple):
+                # Older files hold (model, poly_features, degree) fitted on raw days
+                self.model, self.poly_features, self.degree = state
+                self.coefficients = self.model.coef_.astype(float)
+                self.coefficients[0] += self.model.intercept_
+                self.origin, self.scale = 0.0, 1.0
+                self.xtx = self.xty = self.xtx_inv = None
+                self.yty, self.n_points, self.last_wear, self.last_day = 0.0, 0, None, None
+            else:
+                for name, value in state.items():
+                    setattr(self, name, value)
+                self.xtx_inv = np.linalg.pinv(self.xtx) if self.xtx is not None else None
             return True, "Model loaded successfully"
         except Exception as e:
-            return False, f"Error loading model: {str(e)}"
\ No newline at end of file
+            return False, f"Error loading model: {str(e)}"
+
+@timed("model.fit_best_degree")
+def fit_best_degree(days, wear_values, max_degree=3, fit_method=DEFAULT_FIT_METHOD):
+    """Fit polynomials of degree 1 to max_degree and return the one with the lowest AICc.
+    
+    The in-sample fit never gets worse as the degree rises, so the corrected
+    Akaike criterion charges each extra coefficient, heavily for short
+    segments, and a higher degree has to explain clearly more of the wear.
+    Degrees above 1 must leave at least two residual degrees of freedom,
+    so they can neither pass through every reading nor leave no spread for
+    prediction intervals. Degrees are limited to 1 for Theil-Sen fits.
+    Residuals are weighted by the degree-1 fit's reading weights for every
+    degree, so readings a robust fit left out do not count against it, and a
+    degree cannot score better by leaving out more readings. Returns None if
+    no degree could be fitted.
+    """
+    y = np.asarray(wear_values, dtype=float)
+    if fit_method == "theil_sen":
+        max_degree = 1
+    if len(days) < 2:
+        return None
+    
+    best_model = None
+    best_score = float('inf')
+    weights = None
+    for degree in range(1, min(max_degree + 1, len(days))):
+        model = WearPredictionModel(degree=degree, fit_method=fit_method)
+        success, _ = model.fit(days, y)
+        if not success:
+            continue
+        
+        predictions, _ = model.predict(days)
+        if weights is None:
+            weights = model.weights
+        ss_residual = float(np.sum(weights * (y - predictions) ** 2))
+        
+        # Readings the degree-1 fit kept, and the coefficients plus residual variance estimated from them
+        kept = np.count_nonzero(weights)
+        n_params = degree + 2
+        if kept - n_params - 1 < 1:
+            # Only a line through three or fewer readings gets here; nothing to compare it with
+            if best_model is None:
+                best_model = model
+            continue
+        score = (kept * np.log(max(ss_residual / kept, np.finfo(float).tiny)) + 2 * n_params
+                 + 2 * n_params * (n_params + 1) / (kept - n_params - 1))
+        if score < best_score:
+            best_model = model
+            best_score = score
+    return best_model
+
+instrument_class(WearPredictionModel, "model", methods=[
+    "fit", "update", "predict", "predict_interval", "crossing_date_distribution", "calculate_threshold_crossing"])
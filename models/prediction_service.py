@@ -0,0 +1,326 @@
+# File: models/prediction_service.py
+
+from datetime import date, timedelta
+import numpy as np
+from data.reference_cache import ReferenceDataCache
+from models.fleet_analytics import (asset_offsets, segment_index, robust_segment_fits, segment_covariances,
+                                    pooled_wear_rates, FIT_METHODS, DEFAULT_FIT_METHOD)
+from models.prediction_model import fit_best_degree, sample_crossing_days, crossing_range
+from models.wear_models import PooledWearModel
+from utils.instrumentation import instrument_class
+
+# Used when an asset type has no WearThreshold set
+DEFAULT_WEAR_THRESHOLD = 60.0
+
+EPOCH = date(1970, 1, 1)
+
+# Coefficient draws per asset for fleet crossing ranges, and the number of
+# (draw, day) predictions held in memory at once
+FLEET_RANGE_SAMPLES = 500
+RANGE_BATCH_ELEMENTS = 1 << 23
+
+def threshold_crossings(coefficients, origins, scales, last_days, threshold, days_ahead):
+    """First day at or above threshold for many fitted polynomials at once.
+    
+    Each row of coefficients is evaluated on its own last day plus 0..days_ahead
+    days, the same window calculate_threshold_crossing searches. Returns the
+    number of days until crossing per row, with -1 where the threshold is not
+    reached in the window or the fit is missing.
+    """
+    offsets = np.arange(days_ahead + 1, dtype=float)
+    t = (last_days[:, None] + offsets[None, :] - origins[:, None]) / scales[:, None]
+    
+    # Horner's rule keeps memory at one (rows, days) array whatever the degree
+    predictions = np.zeros_like(t)
+    for k in range(coefficients.shape[1] - 1, -1, -1):
+        predictions = predictions * t + coefficients[:, k, None]
+    
+    crossed = predictions >= np.asarray(threshold, dtype=float)[..., None]
+    first = np.argmax(crossed, axis=1)
+    return np.where(crossed.any(axis=1), first, -1)
+
+def crossing_ranges(coefficients, covariances, origins, scales, last_days, threshold, days_ahead,
+                    n_samples=FLEET_RANGE_SAMPLES, rng=None):
+    """Sampled crossing days for many fitted polynomials, searched like threshold_crossings.
+    
+    Rows are sampled in batches with sample_crossing_days. Returns an
+    (n_rows, n_samples) array of days after each row's last day, -1 for draws
+    that do not cross, and None for rows without a finite covariance.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n_rows, n_params = coefficients.shape
+    offsets = np.arange(days_ahead + 1, dtype=float)
+    rows = np.flatnonzero(np.isfinite(covariances).all(axis=(1, 2)))
+    batch = max(1, RANGE_BATCH_ELEMENTS // (n_samples * len(offsets)))
+    
+    first = [None] * n_rows
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        t = (last_days[chunk, None] + offsets[None, :] - origins[chunk, None]) / scales[chunk, None]
+        design = t[..., None] ** np.arange(n_params)
+        for row, days in zip(chunk, sample_crossing_days(coefficients[chunk], covariances[chunk], design,
+                                                         threshold, n_samples, rng)):
+            first[row] = days
+    return first
+
+def forecast_asset_history(days, wear, threshold, days_ahead, with_range=False, fit_method=DEFAULT_FIT_METHOD,
+                           rng=None):
+    """Fit the best-degree model to one asset's current wear segment and forecast its crossing.
+    
+    days (from 1970-01-01) and wear are the asset's readings in date order,
+    and fit_method one of FIT_METHODS. Returns a dict with last_date,
+    last_wear, degree, crossing_date and days_until, the last three None
+    without a fit or crossing; with_range adds crossing_range from
+    crossing_date_distribution, None without a fit, sampled with rng.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    wear = np.asarray(wear, dtype=float)
+    segments, _ = segment_index(np.zeros(len(days), dtype=np.int64), wear)
+    current = segments == segments[-1]
+    segment_days = days[current] - days[current][0]
+    last_date = EPOCH + timedelta(days=int(days[-1]))
+    
+    result = {"last_date": last_date, "last_wear": float(wear[-1]), "degree": None,
+              "crossing_date": None, "days_until": None}
+    if with_range:
+        result["crossing_range"] = None
+    model = fit_best_degree(segment_days, wear[current], fit_method=fit_method)
+    if model is None:
+        return result
+    
+    last_day = int(segment_days[-1])
+    crossing_date, days_until = model.calculate_threshold_crossing(last_day, days_ahead, last_date, threshold)
+    result.update(degree=model.degree, crossing_date=crossing_date, days_until=days_until if crossing_date else None)
+    if with_range:
+        result["crossing_range"], _ = model.crossing_date_distribution(last_day, days_ahead, last_date, threshold,
+                                                                       rng=rng)
+    return result
+
+class PredictionService:
+    """Fleet-wide threshold crossing forecasts per asset type.
+    
+    The threshold and fit method come from AssetTypes and the readings from
+    the memory-mapped history cache. Each asset's current wear segment is fitted and
+    searched for the crossing in one vectorized pass over the whole type, and
+    the result is cached until a reading, asset or the type itself changes.
+    Assets with too few readings for a fit follow their pooled rate (see
+    pooled_rates) instead.
+    
+    Every asset is fitted at the same degree (1 unless given), unlike the
+    prediction tab's single-asset forecast, which picks each asset's best
+    degree with fit_best_degree. The two crossing dates can therefore differ
+    for curved wear; forecast_models gives the best-degree dates for a whole
+    type.
+    """
+    
+    def __init__(self, db_manager, reference_data=None, degree=1):
+        self.db_manager = db_manager
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
+        self.degree = degree
+        
+        # asset type -> (threshold, days_ahead, with_range, forecasts)
+        self._cache = {}
+        
+        # asset type -> (rates, residual_variance) from pooled_rates
+        self._pooled = {}
+        
+        db_manager.add_measurement_listener(self.on_measurement_added)
+        db_manager.add_change_listener(self.on_data_changed)
+        
+    def on_measurement_added(self, asset_id, measurement_date, wear_value):
+        """Drop the cached forecasts of the new reading's asset type."""
+        asset = self.reference_data.get_asset(asset_id)
+        if asset is None:
+            self._cache.clear()
+            self._pooled.clear()
+        else:
+            self._cache.pop(asset[2], None)
+            self._pooled.pop(asset[2], None)
+        
+    def on_data_changed(self, table):
+        """Drop cached forecasts when types, assets or readings change."""
+        if table in ("AssetTypes", "Assets", "TULs", "Measurements"):
+            self._cache.clear()
+            self._pooled.clear()
+        
+    def get_threshold(self, asset_type_id):
+        """Wear threshold of an asset type, or DEFAULT_WEAR_THRESHOLD if it has none."""
+        asset_type = self.reference_data.get_asset_type(asset_type_id)
+        if asset_type is None or asset_type[3] is None:
+            return DEFAULT_WEAR_THRESHOLD
+        return float(asset_type[3])
+        
+    def get_fit_method(self, asset_type_id):
+        """Fit method of an asset type (see FIT_METHODS), least squares if it has none."""
+        asset_type = self.reference_data.get_asset_type(asset_type_id)
+        if asset_type is None or len(asset_type) < 5 or asset_type[4] not in FIT_METHODS:
+            return DEFAULT_FIT_METHOD
+        return asset_type[4]
+        
+    def crossing_dates(self, asset_type_id, days_ahead=365, with_range=False):
+        """Forecast the threshold crossing of every asset of a type.
+        
+        Returns (threshold, forecasts) where forecasts maps asset ID to a dict
+        with last_date, last_wear, crossing_date and days_until; the last two
+        are None when the threshold is not reached within days_ahead or the
+        asset has no wear rate at all. reset_wear is the fitted wear at the
+        start of the segment and wear_rate the segment's average fitted rate
+        in mm/day (None without a fit). pooled is True for assets with too
+        few readings in their current segment, whose line follows the pooled
+        rate through the mean of those readings. with_range adds
+        crossing_range, the P10/P50/P90 crossing dates and the probability of
+        crossing within days_ahead from sampled coefficients (None for
+        pooled assets and fits without spare readings).
+        """
+        cached = self._cache.get(asset_type_id)
+        if cached and cached[1] >= days_ahead and cached[0] == self.get_threshold(asset_type_id):
+            threshold, cached_days, cached_range, forecasts = cached
+            if cached_days == days_ahead and cached_range >= with_range:
+                return threshold, forecasts
+            if not with_range:
+                # A longer cached window holds every crossing of the shorter one, but not
+                # its crossing probabilities, so ranges are left out
+                trimmed = {}
+                for asset_id, forecast in forecasts.items():
+                    forecast = {key: value for key, value in forecast.items() if key != "crossing_range"}
+                    if forecast["days_until"] is not None and forecast["days_until"] > days_ahead:
+                        forecast.update(crossing_date=None, days_until=None)
+                    trimmed[asset_id] = forecast
+                return threshold, trimmed
+        
+        threshold, forecasts = self.forecast_type(asset_type_id, days_ahead, with_range)
+        self._cache[asset_type_id] = (threshold, days_ahead, with_range, forecasts)
+        return threshold, forecasts
+        
+    def forecast_type(self, asset_type_id, days_ahead=365, with_range=False):
+        """Uncached version of crossing_dates, always reading the latest measurements."""
+        series = self.db_manager.get_measurement_history(asset_type_id=asset_type_id)
+        threshold = self.get_threshold(asset_type_id)
+        return threshold, self.forecast_series(series, threshold, days_ahead, self.get_fit_method(asset_type_id),
+                                               with_range)
+        
+    def forecast_models(self, asset_type_id, days_ahead=365, workers=None):
+        """Fit a best-degree WearPredictionModel to every asset of a type.
+        
+        Slower but more flexible than crossing_dates, so the fits run in
+        worker processes (see parallel_forecast.forecast_series). Returns
+        (threshold, forecasts) with forecasts ordered by asset ID, each with
+        its crossing_range. `python -m models.parallel_forecast` writes
+        them for every type as CSV.
+        """
+        from models.parallel_forecast import forecast_series
+        
+        threshold = self.get_threshold(asset_type_id)
+        series = self.db_manager.get_measurement_history(asset_type_id=asset_type_id)
+        return threshold, forecast_series(series, threshold, days_ahead, workers, self.get_fit_method(asset_type_id))
+        
+    def pooled_rates(self, asset_type_id):
+        """Wear rate of every asset of a type, shrunk toward its TUL and the type.
+        
+        Returns (rates, residual_variance) where rates maps asset ID to
+        (rate, rate_variance) in mm/day, NaN if no asset of the type has a
+        rate; see fleet_analytics.pooled_wear_rates. Cached like the forecasts.
+        """
+        if asset_type_id not in self._pooled:
+            series = self.db_manager.get_measurement_history(asset_type_id=asset_type_id)
+            asset_ids, codes, days, wear = series.grouped()
+            rates, rate_variances, residual_variance = self._pool(asset_ids, codes, days, wear)
+            self._pooled[asset_type_id] = ({asset_id: (float(rate), float(variance))
+                                            for asset_id, rate, variance in zip(asset_ids, rates, rate_variances)},
+                                           residual_variance)
+        return self._pooled[asset_type_id]
+        
+    def pooled_model(self, asset_id):
+        """An untrained PooledWearModel at the asset's pooled rate, or None without one."""
+        asset = self.reference_data.get_asset(asset_id)
+        if asset is None:
+            return None
+        rates, residual_variance = self.pooled_rates(asset[2])
+        rate, rate_variance = rates.get(asset_id, (np.nan, np.nan))
+        if not np.isfinite(rate):
+            return None
+        return PooledWearModel(rate, rate_variance, residual_variance)
+        
+    def _pool(self, asset_ids, codes, days, wear):
+        """pooled_wear_rates of grouped readings, with each asset's TUL looked up."""
+        tul_of = {row[0]: row[1] for row in self.reference_data.get_assets_by_ids(asset_ids)}
+        tul_codes = {}
+        asset_tuls = np.array([tul_codes.setdefault(tul_of.get(asset_id), len(tul_codes)) for asset_id in asset_ids],
+                              dtype=np.int64)
+        return pooled_wear_rates(codes, days, wear, len(asset_ids), asset_tuls, len(tul_codes))
+        
+    def forecast_series(self, series, threshold, days_ahead, fit_method=DEFAULT_FIT_METHOD, with_range=False,
+                        rng=None):
+        """Fit and search the current segment of every asset in a MeasurementSeries.
+        
+        with_range samples every fit's coefficients for crossing_range (see
+        crossing_dates), drawing from rng.
+        """
+        asset_ids, codes, days, wear = series.grouped()
+        n_assets = len(asset_ids)
+        if n_assets == 0:
+            return {}
+        
+        segments, segment_codes = segment_index(codes, wear)
+        coefficients, origins, scales, weights = robust_segment_fits(
+            segments, days, wear, len(segment_codes), self.degree, fit_method)
+        if with_range:
+            covariances = segment_covariances(segments, days, wear, coefficients, origins, scales, weights)
+        
+        # The current segment of each asset is its last one
+        last_segments = np.searchsorted(segment_codes, np.arange(n_assets), side="right") - 1
+        last_rows = asset_offsets(codes, n_assets)[1:] - 1
+        last_days = days[last_rows].astype(float)
+        
+        coefficients = coefficients[last_segments]
+        origins = origins[last_segments]
+        scales = scales[last_segments]
+        if with_range:
+            # Sampled before pooled lines fill the missing fits, which have no covariance
+            first = crossing_ranges(coefficients, covariances[last_segments], origins, scales, last_days,
+                                    threshold, days_ahead, rng=rng)
+        
+        # Assets without a fit of their own get a line at their pooled rate through the segment's mean reading
+        rates, _, _ = self._pool(asset_ids, codes, days, wear)
+        pooled = np.isnan(coefficients).any(axis=1) & np.isfinite(rates)
+        if pooled.any():
+            n_segments = len(segment_codes)
+            counts = np.bincount(segments, minlength=n_segments)[last_segments]
+            mean_days = np.bincount(segments, weights=days, minlength=n_segments)[last_segments] / counts
+            mean_wear = np.bincount(segments, weights=wear, minlength=n_segments)[last_segments] / counts
+            first_days = days[np.searchsorted(segments, last_segments)].astype(float)
+            coefficients[pooled] = 0.0
+            coefficients[pooled, 0] = (mean_wear - rates * (mean_days - first_days))[pooled]
+            coefficients[pooled, 1] = rates[pooled]
+            origins[pooled] = first_days[pooled]
+            scales[pooled] = 1.0
+        days_until = threshold_crossings(coefficients, origins, scales, last_days, threshold, days_ahead)
+        
+        # Average fitted rate from the start of the segment to the last reading
+        reset_wear = coefficients[:, 0]
+        t_last = (last_days - origins) / scales
+        fitted_last = np.polynomial.polynomial.polyval(t_last, coefficients.T, tensor=False)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            wear_rate = (fitted_last - reset_wear) / (last_days - origins)
+        wear_rate[pooled] = rates[pooled]
+        
+        forecasts = {}
+        for i, asset_id in enumerate(asset_ids):
+            last_date = EPOCH + timedelta(days=int(last_days[i]))
+            crossed = days_until[i] >= 0
+            forecasts[asset_id] = {
+                "last_date": last_date,
+                "last_wear": float(wear[last_rows[i]]),
+                "crossing_date": last_date + timedelta(days=int(days_until[i])) if crossed else None,
+                "days_until": int(days_until[i]) if crossed else None,
+                "reset_wear": float(reset_wear[i]) if np.isfinite(reset_wear[i]) else None,
+                "wear_rate": float(wear_rate[i]) if np.isfinite(wear_rate[i]) else None,
+                "pooled": bool(pooled[i]),
+            }
+            if with_range:
+                forecasts[asset_id]["crossing_range"] = (crossing_range(first[i], last_date)
+                                                         if first[i] is not None else None)
+        return forecasts
+
+instrument_class(PredictionService, "forecast", methods=["crossing_dates", "forecast_type", "forecast_models",
+                                                    "forecast_series"])
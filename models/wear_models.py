@@ -0,0 +1,244 @@
+# File: models/wear_models.py
+
+import numpy as np
+from datetime import timedelta
+from statistics import NormalDist
+from models.fleet_analytics import DEFAULT_FIT_METHOD
+from models.prediction_model import WearPredictionModel, fit_best_degree
+from utils.instrumentation import instrument_class
+
+# Model families a wear segment can be fitted with; "polynomial" is WearPredictionModel
+MODEL_FAMILIES = ("polynomial", "monotone", "power", "exponential")
+DEFAULT_MODEL_FAMILY = "polynomial"
+
+# The monotone model extrapolates with its average fitted rate over this many final days
+RATE_WINDOW_DAYS = 180
+
+class WearModel:
+    """Shared interface of the wear models that are not polynomials.
+    
+    They offer the WearPredictionModel methods the prediction tab and the
+    forecasts use. Fits are cheap, so update() asks for a refit instead of
+    absorbing the reading, and there is no coefficient uncertainty to give
+    prediction intervals or crossing date ranges.
+    """
+    
+    family = None
+    degree = None
+    fit_method = DEFAULT_FIT_METHOD
+    weights = None
+    
+    def __init__(self):
+        self.origin = 0.0
+        self.n_points = 0
+        
+    def is_trained(self):
+        """Whether the model can make predictions."""
+        return self.n_points > 0
+        
+    def update(self, day, wear_value):
+        """Not supported; the caller refits on the full segment instead."""
+        return False, "Model needs a refit"
+        
+    def predict(self, days):
+        """Predict wear for the given days."""
+        if not self.is_trained():
+            return None, "Model not trained"
+        return self._predict(np.asarray(days, dtype=float) - self.origin), "Prediction completed"
+        
+    def predict_interval(self, days, confidence=0.9):
+        """Predictions without an interval: (predictions, None, None)."""
+        predictions, _ = self.predict(days)
+        return predictions, None, None
+        
+    def crossing_date_distribution(self, start_day, days_ahead, start_date, threshold, **kwargs):
+        """Not available; only polynomial models estimate their uncertainty."""
+        return None, "Crossing distribution needs a polynomial model"
+        
+    def calculate_threshold_crossing(self, start_day, days_ahead, start_date, threshold):
+        """Calculate when wear crosses the maintenance threshold."""
+        if not self.is_trained():
+            return None, "Model not trained"
+        
+        predictions, _ = self.predict(np.arange(start_day, start_day + days_ahead + 1))
+        crossed = predictions >= threshold
+        if not crossed.any():
+            return None, "Threshold not reached within prediction window"
+        days_until = int(np.argmax(crossed))
+        return start_date + timedelta(days=days_until), days_until
+
+class MonotoneWearModel(WearModel):
+    """Non-decreasing piecewise-linear wear from an isotonic regression.
+    
+    Wear only grows between maintenance resets, so the readings are fitted
+    with the closest non-decreasing sequence and interpolated linearly
+    between reading days. Past the last reading, wear grows at the fitted
+    average rate of the final RATE_WINDOW_DAYS, which is never negative.
+    """
+    
+    family = "monotone"
+    
+    def __init__(self):
+        super().__init__()
+        self.knot_days = None
+        self.knot_wear = None
+        self.rate = 0.0
+        
+    def fit(self, days, wear_values):
+        """Train the model on the provided data."""
+        if len(days) < 3:
+            return False, "Need at least 3 data points for prediction"
+        
+        # scikit-learn is slow to import, so load it on the first fit
+        from sklearn.isotonic import IsotonicRegression
+        
+        days = np.asarray(days, dtype=float)
+        y = np.asarray(wear_values, dtype=float)
+        self.origin = float(days.min())
+        t = days - self.origin
+        if t.max() <= 0:
+            return False, "Readings span a single day"
+        
+        # Readings of the same day are pooled into one knot
+        isotonic = IsotonicRegression(increasing=True).fit(t, y)
+        self.knot_days = isotonic.X_thresholds_.astype(float)
+        self.knot_wear = isotonic.y_thresholds_.astype(float)
+        
+        last_day = self.knot_days[-1]
+        window_start = max(last_day - RATE_WINDOW_DAYS, self.knot_days[0])
+        window_wear = np.interp(window_start, self.knot_days, self.knot_wear)
+        self.rate = (self.knot_wear[-1] - window_wear) / max(last_day - window_start, 1.0)
+        self.n_points = len(y)
+        return True, "Model trained successfully"
+        
+    def _predict(self, t):
+        # np.interp holds the end values outside the knots; extend the last one at the fitted rate
+        fitted = np.interp(t, self.knot_days, self.knot_wear)
+        beyond = t > self.knot_days[-1]
+        fitted[beyond] = self.knot_wear[-1] + self.rate * (t[beyond] - self.knot_days[-1])
+        return fitted
+
+class LogLinearWearModel(WearModel):
+    """Power-law or exponential wear, fitted by least squares on log wear.
+    
+    form "power" fits wear = a·t^b and "exponential" fits wear = a·e^(bt),
+    with t in days since the first reading; both are straight lines in log
+    wear. A power law starts from zero wear, as a segment does after a
+    reset. b is kept non-negative so wear never falls. Readings without a
+    logarithm (zero wear, or t = 0 for a power law) are left out of the fit.
+    """
+    
+    FORMS = ("power", "exponential")
+    
+    def __init__(self, form="power"):
+        if form not in self.FORMS:
+            raise ValueError(f"Unknown log-linear form {form!r}")
+        super().__init__()
+        self.family = form
+        self.form = form
+        self.log_a = None
+        self.b = None
+        
+    def _feature(self, t):
+        if self.form == "power":
+            with np.errstate(divide="ignore"):
+                return np.log(t)
+        return t
+        
+    def fit(self, days, wear_values):
+        """Train the model on the provided data."""
+        if len(days) < 3:
+            return False, "Need at least 3 data points for prediction"
+        
+        days = np.asarray(days, dtype=float)
+        y = np.asarray(wear_values, dtype=float)
+        self.origin = float(days.min())
+        x = self._feature(days - self.origin)
+        usable = (y > 0) & np.isfinite(x)
+        x, log_y = x[usable], np.log(y[usable])
+        if len(x) < 2 or np.ptp(x) <= 0:
+            return False, "Need readings above zero on at least 2 days after the first"
+        
+        self.b, self.log_a = np.polyfit(x, log_y, 1)
+        if self.b < 0:
+            # Falling wear is not physical; keep the level and drop the trend
+            self.b, self.log_a = 0.0, float(log_y.mean())
+        self.n_points = len(log_y)
+        return True, "Model trained successfully"
+        
+    def _predict(self, t):
+        if self.b == 0:
+            return np.full(len(t), np.exp(self.log_a))
+        # exp(-inf) gives the zero wear of a power law at t = 0
+        return np.exp(self.log_a + self.b * self._feature(np.maximum(t, 0.0)))
+
+class PooledWearModel(WearModel):
+    """Straight-line wear at a rate pooled across sister assets.
+    
+    For assets with too few readings for a fit of their own. rate and
+    rate_variance are the asset's empirical-Bayes rate from
+    pooled_wear_rates, which leans on its TUL and asset type, and
+    residual_variance the scatter of readings about their lines. fit()
+    only anchors the line at the mean of the readings, so one reading is
+    enough.
+    """
+    
+    family = "pooled"
+    
+    def __init__(self, rate, rate_variance, residual_variance):
+        super().__init__()
+        self.rate = float(rate)
+        self.rate_variance = float(rate_variance)
+        self.residual_variance = float(residual_variance)
+        self.level = None
+        
+    def fit(self, days, wear_values):
+        """Anchor the pooled rate at the provided readings."""
+        if len(days) == 0:
+            return False, "Need at least 1 data point for prediction"
+        
+        # The line through the mean reading is the least-squares fit with the slope fixed
+        self.origin = float(np.mean(days))
+        self.level = float(np.mean(wear_values))
+        self.n_points = len(days)
+        return True, "Model trained successfully"
+        
+    def _predict(self, t):
+        return self.level + self.rate * t
+        
+    def predict_interval(self, days, confidence=0.9):
+        """Predictions with a normal interval from the rate and level uncertainty."""
+        predictions, _ = self.predict(days)
+        if predictions is None:
+            return None, None, None
+        
+        t = np.asarray(days, dtype=float) - self.origin
+        spread = np.sqrt(self.rate_variance * t ** 2 + self.residual_variance * (1.0 + 1.0 / self.n_points))
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return predictions, predictions - z * spread, predictions + z * spread
+
+def create_wear_model(family, degree=2, fit_method=DEFAULT_FIT_METHOD):
+    """A new, untrained model of one of MODEL_FAMILIES."""
+    if family == "polynomial":
+        return WearPredictionModel(degree=degree, fit_method=fit_method)
+    if family == "monotone":
+        return MonotoneWearModel()
+    if family in LogLinearWearModel.FORMS:
+        return LogLinearWearModel(family)
+    raise ValueError(f"Unknown model family {family!r}")
+
+def fit_wear_model(family, days, wear_values, fit_method=DEFAULT_FIT_METHOD):
+    """Fit one wear segment with a model family; polynomials get their best degree.
+    
+    Returns the trained model, or None if it could not be fitted.
+    """
+    if family == "polynomial":
+        return fit_best_degree(days, wear_values, fit_method=fit_method)
+    
+    model = create_wear_model(family)
+    success, _ = model.fit(days, wear_values)
+    return model if success else None
+
+instrument_class(MonotoneWearModel, "model.monotone", methods=["fit", "predict", "calculate_threshold_crossing"])
+instrument_class(LogLinearWearModel, "model.loglinear", methods=["fit", "predict", "calculate_threshold_crossing"])
+instrument_class(PooledWearModel, "model.pooled", methods=["fit", "predict", "calculate_threshold_crossing"])
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import pytest
+from data.database_manager import DatabaseManager
+from datetime import date, timedelta
+
+web = pytest.importorskip("aiohttp.web")
+from aiohttp.test_utils import TestClient, TestServer
+from api.server import create_app
+
+def make_database(path):
+    """Create a database with one asset that has three readings and one that has none."""
+    db = DatabaseManager(path)
+    db.connect()
+    db.create_tables()
+    db.add_asset("TUL1-INDPIN-01", "TUL1", "INDPIN", 1, date(2024, 1, 1))
+    db.add_asset("TUL1-INDPIN-02", "TUL1", "INDPIN", 2, date(2024, 1, 1))
+    for i, wear in enumerate([10.0, 12.0, 14.0]):
+        db.add_measurement("TUL1-INDPIN-01", date(2024, 1, 1) + timedelta(days=30 * i), wear)
+    db.close()
+
+def run_requests(requests):
+    """Start the API on a fresh database and send (method, path, json) requests.
+
+    Returns [(status, text)] in order.
+    """
+    async def run(db_path):
+        client = TestClient(TestServer(create_app(db_path, read_workers=1)))
+        await client.start_server()
+        try:
+            results = []
+            for method, path, body in requests:
+                response = await client.request(method, path, json=body)
+                results.append((response.status, await response.text()))
+            return results
+        finally:
+            await client.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "api.db")
+        make_database(db_path)
+        return asyncio.run(run(db_path))
+
+def test_post_rejects_bad_wear_and_shims():
+    """Non-finite, negative, missing and null amounts get a 400 and store nothing."""
+    base = {"asset_id": "TUL1-INDPIN-01", "date": "2024-05-01"}
+    bad = [dict(base, wear="nan"), dict(base, wear="inf"), dict(base, wear=-1.5), dict(base),
+           dict(base, wear=None), dict(base, wear="thin"), dict(base, wear=15.0, shims="nan"),
+           dict(base, wear=15.0, shims=-2), dict(base, wear=15.0, shims=None), ["not", "an", "object"]]
+    results = run_requests([("POST", "/measurements", body) for body in bad]
+                           + [("GET", "/measurements?asset_id=TUL1-INDPIN-01", None)])
+
+    for body, (status, text) in zip(bad, results):
+        assert status == 400, (body, status, text)
+    status, text = results[-1]
+    assert status == 200
+    assert [row["wear"] for row in json.loads(text)["measurements"]] == [10.0, 12.0, 14.0]
+
+def test_post_accepts_valid_measurement():
+    status, text = run_requests([("POST", "/measurements",
+                                  {"asset_id": "TUL1-INDPIN-01", "date": "2024-05-01", "wear": "15.5"})])[0]
+    assert status == 201
+    assert len(json.loads(text)["ids"]) == 1
+
+def test_forecast_always_has_crossing_range():
+    """The asset forecast includes crossing_range, null when there is no fit."""
+    (status, text), = run_requests([("GET", "/assets/TUL1-INDPIN-01/forecast", None)])
+    assert status == 200
+    forecast = json.loads(text)
+    assert forecast["threshold"] == 60.0
+    assert "crossing_range" in forecast
+
+    # A single reading cannot be fitted
+    (_, _), (status, text) = run_requests([
+        ("POST", "/measurements", {"asset_id": "TUL1-INDPIN-02", "date": "2024-05-01", "wear": 5.0}),
+        ("GET", "/assets/TUL1-INDPIN-02/forecast", None),
+    ])
+    assert status == 200
+    forecast = json.loads(text)
+    assert forecast["degree"] is None
+    assert forecast["crossing_range"] is None
+
+def test_wal_server_leaves_no_sidecar_files():
+    """With --wal the database runs in WAL mode and is switched back when the server stops."""
+    async def run(db_path):
+        client = TestClient(TestServer(create_app(db_path, read_workers=2, wal=True)))
+        await client.start_server()
+        try:
+            for path in ("/assets", "/assets/TUL1-INDPIN-01/forecast"):
+                assert (await client.get(path)).status == 200
+            response = await client.post("/measurements", json={"asset_id": "TUL1-INDPIN-01", "date": "2024-05-01",
+                                                                 "wear": 15.0})
+            assert response.status == 201
+            assert os.path.exists(db_path + "-wal")
+        finally:
+            await client.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "api.db")
+        make_database(db_path)
+        asyncio.run(run(db_path))
+        assert not os.path.exists(db_path + "-wal")
+        assert not os.path.exists(db_path + "-shm")
+        db = DatabaseManager(db_path)
+        db.connect()
+        assert db.connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert len(db.get_measurements(asset_id="TUL1-INDPIN-01")) == 4
+        db.close()
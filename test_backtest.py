@@ -0,0 +1,71 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from models.backtest import (MIN_TRAIN_READINGS, backtest_models, format_cycle_summary, replay_cycles,
+                             replay_windows, summarize_backtest, summarize_cycles)
+from models.measurement import MeasurementSeries
+
+THRESHOLD = 60.0
+
+def cycling_series(n_assets=3, cycles=3, cycle_days=240, step=10, rate=0.25):
+    """Straight wear from 5 mm at rate mm/day, reset every cycle_days, read every step days.
+
+    Each cycle crosses THRESHOLD at day 220 and the reset shows at day 240.
+    """
+    asset_ids, codes, days, wear = [], [], [], []
+    for code in range(n_assets):
+        asset_ids.append(f"TUL1-INDPIN-{code + 1:02d}")
+        cycle_day = np.tile(np.arange(0, cycle_days, step), cycles)
+        asset_days = 19000 + np.arange(len(cycle_day)) * step
+        codes.extend([code] * len(asset_days))
+        days.extend(asset_days.tolist())
+        wear.extend((5 + rate * cycle_day).tolist())
+    return MeasurementSeries(asset_ids, np.arange(1, len(days) + 1), codes, days, wear)
+
+def test_backtest_models_on_straight_wear():
+    """Lines predict held-out straight wear and its crossing; every family is timed on every segment."""
+    series = cycling_series()
+    results = backtest_models(series, threshold=THRESHOLD)
+    n_segments = 3 * 3
+
+    polynomial = results["polynomial"]
+    assert len(polynomial["fit_seconds"]) == n_segments
+    assert polynomial["failed"] == 0
+    assert len(polynomial["errors"]) == len(polynomial["horizons"]) == n_segments * 12
+    assert np.abs(polynomial["errors"]).max() < 1e-3
+    assert (polynomial["horizons"] > 0).all()
+    assert len(polynomial["crossing_errors"]) == n_segments
+    assert np.abs(polynomial["crossing_errors"]).max() <= 1
+
+    summary = summarize_backtest(results)
+    assert set(summary) == {"polynomial", "monotone", "power", "exponential"}
+    assert summary["monotone"]["mae"] < 1e-3
+    assert summary["exponential"]["mae"] > summary["polynomial"]["mae"]
+
+def test_replay_cycles_against_the_resets():
+    """Windows before the crossing forecast it 20 days before the reset, later ones at their last reading."""
+    series = cycling_series()
+    window_rows, row_windows, last_days, reset_days, window_segments = replay_windows(series)
+
+    # Two completed cycles per asset; the last cycle has no reset yet
+    assert len(np.unique(window_segments)) == 3 * 2
+    assert len(last_days) == 3 * 2 * (24 - MIN_TRAIN_READINGS + 1)
+    assert np.bincount(row_windows).tolist()[:3] == [3, 4, 5]
+    assert ((reset_days - last_days) % 240 > 0).all()
+
+    result = replay_cycles(series, THRESHOLD)
+    assert result["cycles"] == 6
+    before = result["lead_days"] > 20
+    assert np.abs(result["errors"][before] + 20).max() <= 1
+    assert (result["errors"][~before] == -result["lead_days"][~before]).all()
+    assert result["lead_days"].min() == 10 and result["lead_days"].max() == 220
+
+    # A short search window cannot reach the crossing from the early windows
+    early = replay_cycles(series, THRESHOLD, days_ahead=30)
+    assert np.isnan(early["errors"][early["lead_days"] > 50]).all()
+
+    summary = summarize_cycles({("INDPIN", 1): result})[("INDPIN", 1)]
+    assert summary["windows"] == summary["forecasts"] == len(last_days)
+    assert -20 <= summary["bias_days"] <= -19
+    assert "INDPIN" in format_cycle_summary({("INDPIN", 1): summary})
@@ -0,0 +1,36 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from utils.downsampling import binned_percentiles, lttb
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50.0)
+    y[437] = 5.0
+    indices = lttb(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert (np.diff(indices) > 0).all()
+    assert 437 in indices
+
+    # Short series and tiny budgets are returned whole
+    assert lttb(x[:50], y[:50], 100).tolist() == list(range(50))
+    assert lttb(x[:50], y[:50], 2).tolist() == list(range(50))
+
+def test_binned_percentiles_across_series():
+    """Each series counts once per bin with its mean, and empty bins are left out."""
+    codes = [0, 0, 1, 2, 2, 0]
+    days = [0, 5, 3, 9, 1, 25]
+    values = [1.0, 3.0, 10.0, 20.0, 40.0, 7.0]
+    centres, bands = binned_percentiles(codes, days, values, 3, 10, percentiles=(0, 50, 100))
+
+    # Bin 0 holds series means 2, 10 and 30; bin 1 is empty; bin 2 has series 0 only
+    assert centres.tolist() == [5.0, 25.0]
+    assert bands[0].tolist() == [2.0, 7.0]
+    assert bands[50].tolist() == [10.0, 7.0]
+    assert bands[100].tolist() == [30.0, 7.0]
+
+    centres, bands = binned_percentiles([], [], [], 0, 10)
+    assert len(centres) == 0 and all(len(band) == 0 for band in bands.values())
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from data.database_manager import DatabaseManager
+from data.federated_manager import FederatedDatabaseManager
+from datetime import date, timedelta
+
+def make_site(path, asset_id, wear_values):
+    """Create a site database with one INDPIN asset read every 30 days from 2024-01-01."""
+    db = DatabaseManager(path)
+    db.connect()
+    db.create_tables()
+    db.add_asset(asset_id, "TUL1", "INDPIN", 1, date(2024, 1, 1))
+    for i, wear in enumerate(wear_values):
+        db.add_measurement(asset_id, date(2024, 1, 1) + timedelta(days=30 * i), wear)
+    db.close()
+
+def test_fan_out_merges_sites():
+    """Rows from every site are merged with the site name as the last column."""
+    with tempfile.TemporaryDirectory() as directory:
+        north = os.path.join(directory, "north.db")
+        south = os.path.join(directory, "south.db")
+        make_site(north, "TUL1-INDPIN-01", [10.0, 12.0, 14.0])
+        make_site(south, "TUL1-INDPIN-02", [20.0, 21.0])
+
+        manager = FederatedDatabaseManager({"north": north, "south": south,
+                                            "missing": os.path.join(directory, "missing.db")})
+        try:
+            assert sorted(manager.sites) == ["north", "south"]
+            assets = manager.get_assets(asset_type_id="INDPIN")
+            assert sorted((row[0], row[-1]) for row in assets) == [("TUL1-INDPIN-01", "north"),
+                                                                   ("TUL1-INDPIN-02", "south")]
+            measurements = manager.get_measurements(asset_type_id="INDPIN")
+            assert sum(1 for row in measurements if row[-1] == "north") == 3
+            assert sum(1 for row in measurements if row[-1] == "south") == 2
+        finally:
+            manager.close()
+
+def test_crossing_dates_see_site_changes():
+    """A threshold change and a new reading written by another program show up on the next call."""
+    with tempfile.TemporaryDirectory() as directory:
+        north = os.path.join(directory, "north.db")
+        make_site(north, "TUL1-INDPIN-01", [10.0, 12.0, 14.0, 16.0])
+
+        manager = FederatedDatabaseManager({"north": north})
+        try:
+            before = manager.crossing_dates("INDPIN", days_ahead=3650)[("north", "TUL1-INDPIN-01")]
+            assert before["threshold"] == 60.0
+            assert before["last_date"] == date(2024, 3, 31)
+
+            other = sqlite3.connect(north)
+            other.execute("UPDATE AssetTypes SET WearThreshold = 40 WHERE AssetTypeID = 'INDPIN'")
+            other.execute("INSERT INTO Measurements (AssetID, MeasurementDate, WearValue, ShimsAdded, Notes) "
+                          "VALUES ('TUL1-INDPIN-01', '2024-05-30', 18.0, 0, '')")
+            other.commit()
+            other.close()
+
+            after = manager.crossing_dates("INDPIN", days_ahead=3650)[("north", "TUL1-INDPIN-01")]
+            assert after["threshold"] == 40.0
+            assert after["last_date"] == date(2024, 5, 30)
+            assert after["last_wear"] == 18.0
+            assert after["days_until"] < before["days_until"]
+        finally:
+            manager.close()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import data.history_cache as history_cache
+from data.database_manager import DatabaseManager
+from datetime import date, timedelta
+
+def test_edit_after_compaction(monkeypatch):
+    """An edit made after the tail was compacted still invalidates the cache."""
+    monkeypatch.setattr(history_cache, "COMPACT_ROWS", 2)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "history.db")
+        db = DatabaseManager(db_path)
+        db.connect()
+        db.create_tables()
+        db.add_asset("TUL1-INDROL-01", "TUL1", "INDROL", 1, date(2024, 1, 1))
+        
+        start = date(2024, 1, 1)
+        db.add_measurement("TUL1-INDROL-01", start, 1.0)
+        assert db.get_measurement_history().wear.tolist() == [1.0]
+        
+        # Two appended readings fill the tail, which the next load compacts
+        db.add_measurement("TUL1-INDROL-01", start + timedelta(days=10), 2.0)
+        db.add_measurement("TUL1-INDROL-01", start + timedelta(days=20), 3.0)
+        assert db.get_measurement_history().wear.tolist() == [1.0, 2.0, 3.0]
+        assert db.history_cache.read_meta()["tail_rows"] == 0
+        
+        other = sqlite3.connect(db_path)
+        other.execute("UPDATE Measurements SET WearValue = 99 WHERE MeasurementID = 1")
+        other.commit()
+        other.close()
+        
+        assert db.get_measurement_history().wear.tolist() == [99.0, 2.0, 3.0]
+        db.close()
+
+def test_read_only_managers_never_write_the_cache():
+    """A mode=ro manager uses a current cache but never creates, appends to or rebuilds it."""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "history.db")
+        db = DatabaseManager(db_path)
+        db.connect()
+        db.create_tables()
+        db.add_asset("TUL1-INDROL-01", "TUL1", "INDROL", 1, date(2024, 1, 1))
+        db.add_measurement("TUL1-INDROL-01", date(2024, 1, 1), 1.0)
+        db.close()
+        
+        reader = DatabaseManager(db_path, read_only=True)
+        assert reader.get_measurement_history().wear.tolist() == [1.0]
+        assert not os.path.exists(db_path + ".history")
+        
+        db = DatabaseManager(db_path)
+        assert db.get_measurement_history().wear.tolist() == [1.0]
+        generation = db.history_cache.read_meta()["generation"]
+        
+        other = sqlite3.connect(db_path)
+        other.execute("INSERT INTO Measurements (AssetID, MeasurementDate, WearValue, ShimsAdded, Notes) "
+                      "VALUES ('TUL1-INDROL-01', '2024-01-11', 2.0, 0, '')")
+        other.commit()
+        other.close()
+        
+        # The stale cache is left for the writer to catch up
+        assert reader.get_measurement_history().wear.tolist() == [1.0, 2.0]
+        meta = db.history_cache.read_meta()
+        assert (meta["generation"], meta["high_water"], meta["tail_rows"]) == (generation, 1, 0)
+        reader.close()
+        db.close()
@@ -0,0 +1,52 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from models.maintenance_scheduler import MaintenanceScheduler, group_service_windows
+from datetime import date, timedelta
+
+START = date(2025, 1, 1)
+
+class StubReferenceData:
+    def get_assets(self):
+        return [("TUL1-INDPIN-01", "TUL1"), ("TUL1-INDPIN-02", "TUL1"), ("TUL1-INDPIN-03", "TUL1"),
+                ("TUL1-INDPIN-04", "TUL1"), ("TUL2-INDPIN-01", "TUL2")]
+
+    def get_asset_types(self):
+        return [("INDPIN", "Indexing pin", 60.0)]
+
+class StubPredictionService:
+    """crossing_dates for one asset type with fixed forecasts."""
+
+    reference_data = StubReferenceData()
+
+    def __init__(self, forecasts):
+        self.forecasts = forecasts
+
+    def crossing_dates(self, asset_type_id, days_ahead=365):
+        return 60.0, self.forecasts
+
+def forecast(rate, reset_wear, days_until):
+    return {"wear_rate": rate, "reset_wear": reset_wear, "last_date": START,
+            "crossing_date": START + timedelta(days=days_until) if days_until is not None else None}
+
+def test_assets_without_a_positive_cycle_are_unplanned():
+    """Reset wear at or above the threshold leaves no cycle; such assets are not serviced daily."""
+    service = StubPredictionService({
+        "TUL1-INDPIN-01": forecast(0.5, 10.0, 40),
+        "TUL1-INDPIN-02": forecast(0.5, 60.0, 0),
+        "TUL1-INDPIN-03": forecast(0.5, 75.0, 0),
+        "TUL1-INDPIN-04": forecast(None, None, None),
+        "TUL2-INDPIN-01": forecast(0.0, 10.0, None),
+    })
+    stops, unplanned = MaintenanceScheduler(service).plan(START, horizon_days=365)
+
+    assert unplanned == ["TUL1-INDPIN-02", "TUL1-INDPIN-03", "TUL1-INDPIN-04"]
+    served = [asset_id for stop in stops for asset_id, _ in stop["assets"]]
+    assert set(served) == {"TUL1-INDPIN-01"}
+    # Every 100 days from the first deadline on day 40
+    assert [stop["date"] for stop in stops] == [START + timedelta(days=d) for d in (40, 140, 240, 340)]
+
+def test_service_windows_share_stops():
+    """Assets due within the advance window of the earliest deadline are served together, early if need be."""
+    stops = group_service_windows([10, 25, 80], [100, 100, float("inf")], max_advance=30, horizon=150)
+    assert [(day, served.tolist()) for day, served, _ in stops] == [(10, [0, 1]), (80, [0, 1, 2])]
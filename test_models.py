@@ -0,0 +1,48 @@
+import dataclasses
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import pytest
+from data.database_manager import DatabaseManager
+from models.asset import Asset, AssetType
+from models.indexer import TUL, Indexer
+from models.measurement import Measurement
+from datetime import date
+
+def make_database():
+    db = DatabaseManager(":memory:")
+    db.connect()
+    db.create_tables()
+    db.add_asset("TUL1-INDPIN-01", "TUL1", "INDPIN", 1, "2024-01-01", "north end")
+    db.add_measurement("TUL1-INDPIN-01", "2024-02-01", 12.5, 1.0, "after shimming")
+    return db
+
+def test_records_from_database_rows():
+    """Records are built from the rows DatabaseManager returns, with typed dates."""
+    db = make_database()
+
+    measurement = Measurement.from_row(db.get_measurements(asset_id="TUL1-INDPIN-01")[0])
+    assert measurement == Measurement("TUL1-INDPIN-01", date(2024, 2, 1), 12.5, 1.0, "after shimming", 1)
+    assert measurement.to_dict() == {"MeasurementID": 1, "AssetID": "TUL1-INDPIN-01",
+                                     "MeasurementDate": date(2024, 2, 1), "WearValue": 12.5,
+                                     "ShimsAdded": 1.0, "Notes": "after shimming"}
+
+    asset = Asset.from_row(db.get_asset("TUL1-INDPIN-01"))
+    assert (asset.tul_id, asset.asset_type_id, asset.installation_date) == ("TUL1", "INDPIN", date(2024, 1, 1))
+    assert asset.to_dict()["AssetID"] == "TUL1-INDPIN-01"
+
+    asset_type = AssetType.from_row([row for row in db.get_asset_types() if row[0] == "INDPIN"][0])
+    assert (asset_type.wear_threshold, asset_type.fit_method) == (60.0, "ols")
+
+    tul = TUL.from_row(db.get_tuls()[0])
+    assert tul.tul_id == tul.indexer_id == "TUL1"
+    assert Indexer is TUL
+    db.close()
+
+def test_records_are_slotted_and_frozen():
+    measurement = Measurement("TUL1-INDPIN-01", date(2024, 2, 1), 12.5)
+    assert not hasattr(measurement, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        measurement.wear_value = 13.0
+    for record in (Asset("A", "TUL1", "INDPIN"), AssetType("INDPIN"), TUL("TUL1")):
+        assert not hasattr(record, "__dict__")
@@ -0,0 +1,49 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import models.parallel_forecast as parallel_forecast
+from models.measurement import MeasurementSeries
+from models.prediction_model import fit_best_degree
+
+def synthetic_series(n_assets=24, n_readings=10, seed=3):
+    """Noisy linear and curved wear for n_assets assets read every 14 days."""
+    rng = np.random.default_rng(seed)
+    asset_ids, codes, days, wear = [], [], [], []
+    for code in range(n_assets):
+        asset_ids.append(f"TUL1-INDPIN-{code + 1:02d}")
+        asset_days = 19000 + 14 * np.arange(n_readings)
+        t = asset_days - asset_days[0]
+        curve = 0.002 * t ** 2 / 100 if code % 3 == 0 else 0.0
+        codes.extend([code] * n_readings)
+        days.extend(asset_days.tolist())
+        wear.extend((5 + 0.15 * t + curve + rng.normal(0, 0.4, n_readings)).tolist())
+    return MeasurementSeries(asset_ids, np.arange(1, len(days) + 1), codes, days, wear)
+
+def test_worker_counts_give_the_same_forecasts(monkeypatch):
+    """One worker and two worker processes return identical forecasts, with ranges filled in."""
+    monkeypatch.setattr(parallel_forecast, "MIN_PARALLEL_ASSETS", 0)
+    series = synthetic_series()
+
+    single = parallel_forecast.forecast_series(series, 60.0, 365, workers=1)
+    pooled = parallel_forecast.forecast_series(series, 60.0, 365, workers=2)
+    assert list(single) == list(pooled) == series.asset_ids
+    assert single == pooled
+
+    for forecast in single.values():
+        assert forecast["degree"] is not None
+        assert forecast["crossing_range"] is not None
+        assert forecast["crossing_range"]["p10"] is not None
+
+def test_best_degree_leaves_residual_freedom():
+    """Short segments are not interpolated, straight wear gets a line and curved wear a curve."""
+    rng = np.random.default_rng(5)
+    for n in range(3, 9):
+        days = 14.0 * np.arange(n)
+        model = fit_best_degree(days, 2 + 0.1 * days + rng.normal(0, 0.3, n))
+        assert model.degree <= max(1, n - 4)
+        assert model.coefficient_covariance() is not None
+
+    days = 7.0 * np.arange(30)
+    assert fit_best_degree(days, 2 + 0.1 * days + rng.normal(0, 0.3, 30)).degree == 1
+    assert fit_best_degree(days, 2 + 0.001 * days ** 2 + rng.normal(0, 0.3, 30)).degree == 2
@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import models.parallel_forecast as parallel_forecast
+from data.database_manager import DatabaseManager
+from models.prediction_service import PredictionService
+from datetime import date, timedelta
+
+def make_database():
+    """Well-read assets wearing 0.2 mm/day on TUL1 and 0.4 mm/day on TUL2, plus one sparse asset on each."""
+    rng = np.random.default_rng(11)
+    db = DatabaseManager(":memory:")
+    db.connect()
+    db.create_tables()
+    records = []
+    for tul_id, rate, n_assets in (("TUL1", 0.2, 4), ("TUL2", 0.4, 3)):
+        for position in range(1, n_assets + 2):
+            asset_id = f"{tul_id}-INDPIN-{position:02d}"
+            db.add_asset(asset_id, tul_id, "INDPIN", position, date(2024, 1, 1))
+            # The last asset of each TUL has only two readings
+            n_readings = 2 if position == n_assets + 1 else 12
+            for i in range(n_readings):
+                wear = 5.0 + rate * 14 * i + rng.normal(0, 0.3)
+                records.append((asset_id, str(date(2024, 1, 1) + timedelta(days=14 * i)), wear, 0, ""))
+    db.add_measurements(records)
+    return db
+
+def test_sparse_assets_follow_their_sister_assets():
+    db = make_database()
+    service = PredictionService(db)
+    threshold, forecasts = service.crossing_dates("INDPIN", days_ahead=3650)
+
+    assert not any(forecast["pooled"] for asset_id, forecast in forecasts.items()
+                   if asset_id not in ("TUL1-INDPIN-05", "TUL2-INDPIN-04"))
+    slow, fast = forecasts["TUL1-INDPIN-05"], forecasts["TUL2-INDPIN-04"]
+    assert slow["pooled"] and fast["pooled"]
+    assert 0.15 < slow["wear_rate"] < fast["wear_rate"] < 0.45
+    assert slow["days_until"] > fast["days_until"] > 0
+
+    # The pooled model gives the same line, with an interval that widens with the horizon
+    model = service.pooled_model("TUL1-INDPIN-05")
+    assert model.rate == slow["wear_rate"]
+    readings = db.get_measurements(asset_id="TUL1-INDPIN-05")
+    days = [(date.fromisoformat(str(row[2])) - date(2024, 1, 1)).days for row in readings]
+    assert model.fit(days, [row[3] for row in readings])[0]
+    predictions, lower, upper = model.predict_interval([14, 200, 400])
+    assert ((lower < predictions) & (predictions < upper)).all()
+    assert np.all(np.diff(upper - lower) > 0)
+    db.close()
+
+def test_forecast_models_is_the_same_with_any_worker_count(monkeypatch):
+    monkeypatch.setattr(parallel_forecast, "MIN_PARALLEL_ASSETS", 0)
+    db = make_database()
+    service = PredictionService(db)
+
+    threshold, single = service.forecast_models("INDPIN", days_ahead=3650, workers=1)
+    _, pooled = service.forecast_models("INDPIN", days_ahead=3650, workers=2)
+    assert threshold == 60.0
+    assert single == pooled
+    assert len(single) == 9
+    assert single["TUL1-INDPIN-01"]["crossing_range"]["p10"] is not None
+    db.close()
@@ -0,0 +1,46 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from data.query_audit import QueryAuditor, query_shape
+
+def make_connection():
+    auditor = QueryAuditor()
+    connection = auditor.connect(":memory:")
+    connection.execute("CREATE TABLE Readings (ID INTEGER PRIMARY KEY, Wear REAL)")
+    return auditor, connection
+
+def test_executemany_is_explained_with_its_parameters():
+    auditor, connection = make_connection()
+    sql = "INSERT INTO Readings (Wear) VALUES (?)"
+    connection.cursor().executemany(sql, ((float(i),) for i in range(5)))
+    assert connection.execute("SELECT COUNT(*) FROM Readings").fetchone()[0] == 5
+    assert auditor.stats[query_shape(sql)][2] == 5
+
+    # The EXPLAIN ran with a parameter row instead of failing on the missing binding
+    sql = "UPDATE Readings SET Wear = ? WHERE ID = ?"
+    connection.cursor().executemany(sql, [(1.0, 1), (2.0, 2)])
+    details, flags = auditor.plans[query_shape(sql)]
+    assert details and not flags
+
+def test_fetchmany_counts_every_chunk():
+    auditor, connection = make_connection()
+    connection.cursor().executemany("INSERT INTO Readings (Wear) VALUES (?)", [(float(i),) for i in range(25)])
+    shape = query_shape("SELECT ID, Wear FROM Readings ORDER BY ID")
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT ID, Wear FROM Readings ORDER BY ID")
+    fetched = 0
+    while True:
+        rows = cursor.fetchmany(10)
+        fetched += len(rows)
+        if not rows:
+            break
+        assert shape not in auditor.stats or len(rows) < 10
+    assert fetched == 25
+    assert auditor.stats[shape][:1] + auditor.stats[shape][2:] == (1, 25)
+
+    # A cursor that runs its next statement reports the rows fetched so far
+    cursor.execute("SELECT ID, Wear FROM Readings ORDER BY ID")
+    cursor.fetchmany(10)
+    cursor.execute("SELECT COUNT(*) FROM Readings").fetchone()
+    assert auditor.stats[shape][:1] + auditor.stats[shape][2:] == (2, 35)
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import models.fleet_analytics as fleet_analytics
+from data.database_manager import DatabaseManager
+from models.fleet_analytics import robust_segment_fits
+from models.prediction_service import PredictionService
+from datetime import date, timedelta
+
+def segments_with_outliers(lengths, slope=0.25, seed=7):
+    """Segments of daily readings with a known slope, noise and 10% wild readings."""
+    rng = np.random.default_rng(seed)
+    segments, days, wear = [], [], []
+    for segment, n in enumerate(lengths):
+        segment_days = np.arange(n, dtype=float)
+        segment_wear = 5.0 + segment + slope * segment_days + rng.normal(0, 0.2, n)
+        wild = rng.choice(n, n // 10, replace=False)
+        segment_wear[wild] += rng.uniform(20, 40, len(wild))
+        segments.extend([segment] * n)
+        days.extend(segment_days.tolist())
+        wear.extend(segment_wear.tolist())
+    return np.array(segments), np.array(days), np.array(wear)
+
+def slopes_of(segments, days, wear, method):
+    n_segments = segments[-1] + 1
+    coefficients, origins, scales, weights = robust_segment_fits(segments, days, wear, n_segments, method=method)
+    return coefficients[:, 1] / scales
+
+def test_robust_fits_find_the_slope_despite_outliers():
+    """Short segments use every pair, long ones the lagged pairs; both recover the slope."""
+    segments, days, wear = segments_with_outliers([12, 60, 100, 101, 1500])
+    ols = slopes_of(segments, days, wear, "ols")
+    assert not np.allclose(ols, 0.25, atol=0.05)
+    for method in ("theil_sen", "huber", "trimmed"):
+        assert np.allclose(slopes_of(segments, days, wear, method), 0.25, atol=0.02), method
+
+def test_long_segments_use_a_linear_number_of_pairs(monkeypatch):
+    segments, days, wear = segments_with_outliers([50000])
+    starts = np.array([0, len(segments)])
+    first, second = fleet_analytics._theil_sen_pairs(segments, starts)
+    assert len(first) <= fleet_analytics.THEIL_SEN_LAGS * len(segments)
+    assert (second > first).all()
+
+    started = time.perf_counter()
+    assert abs(slopes_of(segments, days, wear, "theil_sen")[0] - 0.25) < 0.001
+    assert time.perf_counter() - started < 10
+
+    # With every pair allowed the estimate barely moves
+    short = slice(0, 2000)
+    lagged = slopes_of(segments[short], days[short], wear[short], "theil_sen")[0]
+    monkeypatch.setattr(fleet_analytics, "THEIL_SEN_ALL_PAIRS", 2000)
+    assert abs(slopes_of(segments[short], days[short], wear[short], "theil_sen")[0] - lagged) < 0.001
+
+def test_old_databases_get_a_fit_method_column():
+    """create_tables adds FitMethod to databases made before it existed, defaulting to least squares."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE AssetTypes (AssetTypeID TEXT PRIMARY KEY, Name TEXT, "
+                           "Description TEXT, WearThreshold REAL)")
+        connection.execute("INSERT INTO AssetTypes VALUES ('PIN', 'Pin', '', 50.0)")
+        connection.commit()
+        connection.close()
+
+        db = DatabaseManager(path)
+        db.create_tables()
+        assert [row for row in db.get_asset_types() if row[0] == "PIN"] == [("PIN", "Pin", "", 50.0, "ols")]
+
+        assert db.set_asset_type_fit_method("PIN", "huber")
+        assert not db.set_asset_type_fit_method("PIN", "median")
+        assert [row[4] for row in db.get_asset_types() if row[0] == "PIN"] == ["huber"]
+        db.close()
+
+def test_asset_type_fit_method_resists_a_mistyped_reading():
+    """Switching a type to a robust fit brings an asset's rate back despite one wild reading."""
+    db = DatabaseManager(":memory:")
+    db.connect()
+    db.create_tables()
+    db.add_asset("TUL1-INDPIN-01", "TUL1", "INDPIN", 1, date(2024, 1, 1))
+    for i in range(12):
+        wear = 30.0 + 0.2 * 10 * i + (15.0 if i == 10 else 0.0)
+        db.add_measurement("TUL1-INDPIN-01", date(2024, 1, 1) + timedelta(days=10 * i), wear)
+    service = PredictionService(db)
+
+    ols_rate = service.crossing_dates("INDPIN")[1]["TUL1-INDPIN-01"]["wear_rate"]
+    assert abs(ols_rate - 0.2) > 0.02
+    for method in ("huber", "theil_sen", "trimmed"):
+        assert db.set_asset_type_fit_method("INDPIN", method)
+        rate = service.crossing_dates("INDPIN")[1]["TUL1-INDPIN-01"]["wear_rate"]
+        assert abs(rate - 0.2) < 0.005, method
+    db.close()
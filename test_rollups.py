@@ -0,0 +1,102 @@
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from data.database_manager import DatabaseManager, ROLLUP_RESOLUTIONS
+from models.fleet_analytics import rollup_periods
+from datetime import date, timedelta
+
+ASSETS = (("TUL1-INDPIN-01", "TUL1"), ("TUL1-INDROL-01", "TUL1"), ("TUL2-INDPIN-01", "TUL2"))
+
+def stored_rollups(db):
+    """MeasurementRollups rows, checking they are current so get_rollup_series reads them."""
+    cursor = db.connection.cursor()
+    cursor.execute("SELECT Seq FROM ChangeConsumers WHERE Name = 'MeasurementRollups'")
+    assert cursor.fetchone()[0] == db.latest_change_seq()
+    cursor.execute("SELECT Resolution, AssetID, Segment, PeriodStart, MinWear, MaxWear, MeanWear, ReadingCount "
+                   "FROM MeasurementRollups ORDER BY Resolution, AssetID, Segment, PeriodStart")
+    return cursor.fetchall()
+
+def expected_rollups(db):
+    """The same rows computed from the raw history."""
+    asset_ids, codes, days, wear = db.get_measurement_history().grouped()
+    rows = []
+    for resolution in ROLLUP_RESOLUTIONS:
+        for code, segment, start, low, high, mean, count in zip(
+                *(column.tolist() for column in rollup_periods(codes, days, wear, resolution))):
+            rows.append((resolution, asset_ids[code], segment, str(date(1970, 1, 1) + timedelta(days=start)),
+                         low, high, mean, count))
+    return sorted(rows)
+
+def assert_rollups_match(db):
+    stored = stored_rollups(db)
+    expected = expected_rollups(db)
+    assert [row[:4] + row[7:] for row in stored] == [row[:4] + row[7:] for row in expected]
+    assert np.allclose([row[4:7] for row in stored], [row[4:7] for row in expected])
+
+def make_database(path):
+    db = DatabaseManager(path)
+    db.connect()
+    db.create_tables()
+    records = []
+    for i, (asset_id, tul_id) in enumerate(ASSETS):
+        db.add_asset(asset_id, tul_id, asset_id.split("-")[1], 1, date(2024, 1, 1))
+        for day in range(0, 240, 9):
+            # Every asset is reset to low wear after 150 days
+            wear = 5.0 + i + 0.1 * (day % 150)
+            records.append((asset_id, str(date(2024, 1, 1) + timedelta(days=day)), wear, 0, ""))
+    db.add_measurements(records)
+    return db
+
+def test_rollups_follow_inserts():
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_database(os.path.join(directory, "rollups.db"))
+        assert_rollups_match(db)
+
+        # One reading only rewrites the rollups of its own asset
+        before = db.connection.total_changes
+        db.add_measurement("TUL1-INDROL-01", date(2024, 9, 1), 14.0)
+        own_rows = sum(1 for row in stored_rollups(db) if row[1] == "TUL1-INDROL-01")
+        assert db.connection.total_changes - before <= 2 * own_rows + 2
+        assert_rollups_match(db)
+
+        # The rollup series are read back from the table
+        series = db.get_rollup_series("M", asset_id="TUL1-INDROL-01")
+        assert len(series) == sum(1 for row in stored_rollups(db) if row[:2] == ("M", "TUL1-INDROL-01"))
+        db.close()
+
+def test_rollups_follow_deletes():
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_database(os.path.join(directory, "rollups.db"))
+
+        db.delete_measurement(1)
+        assert_rollups_match(db)
+
+        db.delete_asset("TUL1-INDROL-01")
+        assert "TUL1-INDROL-01" not in {row[1] for row in stored_rollups(db)}
+        assert_rollups_match(db)
+
+        db.delete_tul("TUL2")
+        assert {row[1] for row in stored_rollups(db)} == {"TUL1-INDPIN-01"}
+        assert_rollups_match(db)
+        db.close()
+
+def test_create_tables_builds_missing_rollups():
+    """Databases whose rollups were never built get them on the next create_tables."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rollups.db")
+        db = make_database(path)
+        db.connection.execute("DELETE FROM MeasurementRollups")
+        db.connection.execute("DELETE FROM ChangeConsumers")
+        db.connection.commit()
+
+        # A write alone does not rebuild the whole table
+        db.add_measurement("TUL1-INDPIN-01", date(2024, 9, 1), 20.0)
+        assert db.connection.execute("SELECT COUNT(*) FROM MeasurementRollups").fetchone()[0] == 0
+        db.close()
+
+        db = DatabaseManager(path)
+        db.create_tables()
+        assert_rollups_match(db)
+        db.close()
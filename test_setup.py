@@ -60,8 +60,32 @@ def test_prediction_model():
     plt.close()
     
     print("Prediction test complete! Check prediction_test.png for results.")
+    
+def test_incremental_update():
+    """Test that updating a model with new readings matches a fresh fit."""
+    days = [0, 7, 15, 30, 44, 60, 75, 91, 104, 120]
+    wear = [1.0, 1.6, 2.1, 3.4, 4.0, 5.2, 6.1, 7.3, 8.0, 9.4]
+    
+    model = WearPredictionModel(degree=2)
+    model.fit(days[:6], wear[:6])
+    for day, wear_value in zip(days[6:], wear[6:]):
+        success, message = model.update(day, wear_value)
+        assert success, message
+    
+    fresh = WearPredictionModel(degree=2)
+    fresh.fit(days, wear)
+    check_days = list(range(0, 200, 10))
+    assert np.allclose(model.predict(check_days)[0], fresh.predict(check_days)[0])
+    assert np.isclose(model.residual_variance(), fresh.residual_variance())
+    
+    # A refit keeps one reading per day in date order, so same-day and back-dated readings are refused
+    success, _ = model.update(days[-1], 9.6)
+    assert not success
+    success, _ = model.update(50, 4.5)
+    assert not success
 
 if __name__ == "__main__":
     test_database()
     test_prediction_model()
+    test_incremental_update()
 
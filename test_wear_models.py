@@ -0,0 +1,60 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import pytest
+from models.prediction_model import WearPredictionModel
+from models.wear_models import (LogLinearWearModel, MonotoneWearModel, RATE_WINDOW_DAYS,
+                                create_wear_model, fit_wear_model)
+from datetime import date, timedelta
+
+def test_monotone_model_never_falls():
+    """Noisy readings give a non-decreasing fit that keeps growing at the recent rate."""
+    rng = np.random.default_rng(2)
+    days = 10.0 * np.arange(40)
+    wear = 5 + 0.1 * days + rng.normal(0, 1.5, len(days))
+    model = MonotoneWearModel()
+    assert model.fit(days, wear)[0]
+
+    predictions, _ = model.predict(np.arange(0, 700))
+    assert (np.diff(predictions) >= -1e-9).all()
+    assert 0.05 < model.rate < 0.15
+
+    # Past the last reading it extrapolates at the rate of the final RATE_WINDOW_DAYS
+    ahead, _ = model.predict([days[-1], days[-1] + RATE_WINDOW_DAYS])
+    assert ahead[1] - ahead[0] == pytest.approx(model.rate * RATE_WINDOW_DAYS)
+
+    crossing, days_until = model.calculate_threshold_crossing(days[-1], 365, date(2024, 1, 1), 60.0)
+    assert crossing == date(2024, 1, 1) + timedelta(days=days_until)
+    assert model.predict([days[-1] + days_until])[0][0] >= 60.0
+
+def test_log_linear_models_recover_their_curves():
+    days = 7.0 * np.arange(1, 30)
+    power = LogLinearWearModel("power")
+    assert power.fit(days, 0.8 * (days - days[0] + 7) ** 0.6)[0]
+    assert power.b > 0
+
+    exponential = LogLinearWearModel("exponential")
+    assert exponential.fit(days, 4.0 * np.exp(0.01 * days))[0]
+    assert exponential.b == pytest.approx(0.01)
+    assert exponential.predict([days[-1] + 30])[0][0] == pytest.approx(4.0 * np.exp(0.01 * (days[-1] + 30)))
+
+    # Falling wear keeps its level instead of a negative trend
+    falling = LogLinearWearModel("exponential")
+    assert falling.fit(days, 30 - 0.05 * days)[0]
+    assert falling.b == 0.0
+    assert np.ptp(falling.predict(days)[0]) == 0.0
+
+def test_model_families_share_one_interface():
+    days = 14.0 * np.arange(12)
+    wear = 5 + 0.2 * days
+    for family in ("polynomial", "monotone", "power", "exponential"):
+        model = fit_wear_model(family, days, wear)
+        assert model is not None, family
+        assert model.is_trained()
+        assert len(model.predict(days)[0]) == len(days)
+        assert fit_wear_model(family, days[:2], wear[:2]) is None
+
+    assert isinstance(create_wear_model("polynomial", degree=1), WearPredictionModel)
+    with pytest.raises(ValueError):
+        create_wear_model("spline")
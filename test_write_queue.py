@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import pytest
+from data.database_manager import DatabaseManager
+from data.write_queue import MeasurementWriteQueue
+from datetime import date, timedelta
+
+def make_database(path):
+    """A database with one asset that rejects negative wear readings."""
+    db = DatabaseManager(path)
+    db.connect()
+    db.create_tables()
+    db.add_asset("TUL1-INDPIN-01", "TUL1", "INDPIN", 1, date(2024, 1, 1))
+    db.connection.execute("CREATE TRIGGER RejectNegativeWear BEFORE INSERT ON Measurements "
+                          "WHEN NEW.WearValue < 0 BEGIN SELECT RAISE(ABORT, 'negative wear'); END")
+    db.connection.commit()
+    db.close()
+
+def stored_wear(path):
+    db = DatabaseManager(path)
+    db.connect()
+    wear = sorted(row[0] for row in db.connection.execute("SELECT WearValue FROM Measurements"))
+    db.close()
+    return wear
+
+def test_flush_commits_queued_readings_in_one_batch():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "queue.db")
+        make_database(path)
+        write_queue = MeasurementWriteQueue(path, max_delay=5.0)
+        try:
+            tickets = [write_queue.put("TUL1-INDPIN-01", date(2024, 1, 1) + timedelta(days=i), 10.0 + i)
+                       for i in range(5)]
+            assert write_queue.flush(timeout=10)
+
+            events = write_queue.poll()
+            assert [(kind, event_tickets) for kind, event_tickets, *_ in events] == [("committed", tickets)]
+            assert len(events[0][2]) == 5
+            assert stored_wear(path) == [10.0, 11.0, 12.0, 13.0, 14.0]
+            assert write_queue.poll() == []
+        finally:
+            write_queue.close()
+
+def test_failed_batch_is_retried_one_reading_at_a_time():
+    """A bad reading fails on its own and the rest of its batch is still saved."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "queue.db")
+        make_database(path)
+        write_queue = MeasurementWriteQueue(path, max_delay=5.0)
+        try:
+            good = write_queue.put("TUL1-INDPIN-01", date(2024, 2, 1), 12.0)
+            bad = write_queue.put("TUL1-INDPIN-01", date(2024, 3, 1), -1.0)
+            last = write_queue.put("TUL1-INDPIN-01", date(2024, 4, 1), 14.0)
+            assert write_queue.flush(timeout=10)
+
+            events = write_queue.poll()
+            assert [(kind, tickets) for kind, tickets, *_ in events] == [
+                ("committed", [good]), ("failed", [bad]), ("committed", [last])]
+            assert "TUL1-INDPIN-01" in events[1][3]
+            assert stored_wear(path) == [12.0, 14.0]
+        finally:
+            write_queue.close()
+
+def test_close_commits_the_remaining_readings():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "queue.db")
+        make_database(path)
+        write_queue = MeasurementWriteQueue(path, max_delay=5.0)
+        for i in range(3):
+            write_queue.put("TUL1-INDPIN-01", date(2024, 1, 1) + timedelta(days=i), 20.0 + i)
+        write_queue.close(timeout=10)
+
+        assert stored_wear(path) == [20.0, 21.0, 22.0]
+        with pytest.raises(RuntimeError):
+            write_queue.put("TUL1-INDPIN-01", date(2024, 2, 1), 30.0)
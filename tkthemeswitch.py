@@ -1,23 +1,63 @@
-import customtkinter as ct 
-from customtkinter import *
+# File: tkthemeswitch.py
 
-ct.set_appearance_mode("dark")
-ct.set_default_theme("dark-blue")
+from tkinter import ttk
+from utils.theme import DARK
 
+# Style options overridden in dark mode
+DARK_STYLES = {
+    "TFrame": {"background": "#2E2E2E"},
+    "TLabel": {"background": "#2E2E2E", "foreground": "#FFFFFF"},
+    "TButton": {"background": "#505050", "foreground": "#FFFFFF"},
+    "TEntry": {"fieldbackground": "#3E3E3E", "foreground": "#FFFFFF"},
+    "TCombobox": {"fieldbackground": "#3E3E3E", "foreground": "#FFFFFF"},
+    "TNotebook": {"background": "#2E2E2E", "tabmargins": [2, 5, 2, 0]},
+    "TNotebook.Tab": {"background": "#2E2E2E", "foreground": "#FFFFFF", "padding": [10, 2]},
+    "Delete.TButton": {"foreground": "#FF6B6B"},
+}
+DARK_MAPS = {
+    "TNotebook.Tab": {"background": [("selected", "#505050")]},
+}
 
-main_window = CTk()
-main_window.geometry("600*400 + 200 + 150")
-main_window.title("CTKswitch")
+LIGHT_STYLES = {
+    "Delete.TButton": {"foreground": "#D32F2F"},
+}
 
-def changeMode():
-    val = switch.get()
-    if val:
-        ct.set_appearance_mode("light")
+# Original option values, captured before the first dark override so that
+# switching back to light mode restores the platform theme.
+_saved_styles = {}
+_saved_maps = {}
+
+
+def _save_defaults(style):
+    """Remember the current values of every option the dark theme touches."""
+    for style_name, options in DARK_STYLES.items():
+        saved = _saved_styles.setdefault(style_name, {})
+        for option in options:
+            if option not in saved:
+                saved[option] = style.lookup(style_name, option)
+    for style_name, options in DARK_MAPS.items():
+        saved = _saved_maps.setdefault(style_name, {})
+        for option in options:
+            if option not in saved:
+                saved[option] = style.map(style_name, query_opt=option) or []
+
+
+def apply_theme(theme, style=None):
+    """Switch the ttk styles used by the application to the given theme."""
+    style = style or ttk.Style()
+
+    if theme == DARK:
+        _save_defaults(style)
+        for style_name, options in DARK_STYLES.items():
+            style.configure(style_name, **options)
+        for style_name, options in DARK_MAPS.items():
+            style.map(style_name, **options)
     else:
-        ct.set_appearance_mode("dark")
+        for style_name, options in _saved_styles.items():
+            style.configure(style_name, **options)
+        for style_name, options in _saved_maps.items():
+            style.map(style_name, **options)
+        for style_name, options in LIGHT_STYLES.items():
+            style.configure(style_name, **options)
 
-switch = CTkswitch(main_window, text="Dark Mode", command=changeMode,
-                   onvalue = 1, offvalue = 0, command=changeMode)
-switch.pack(pady=20)
-print(switch.get())
-main_window.mainloop()
+    return style
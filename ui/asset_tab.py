@@ -1,20 +1,24 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from data.reference_cache import ReferenceDataCache
+from models.fleet_analytics import FIT_METHODS, DEFAULT_FIT_METHOD
 
 class AssetManagementTab:
     """Implements the Asset Management tab functionality."""
     
-    def __init__(self, parent, db_manager, status_var):
+    def __init__(self, parent, db_manager, status_var, reference_data=None):
         self.parent = parent
         self.db_manager = db_manager
         self.status_var = status_var
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
         
         # Variables for Asset Type form
         self.asset_type_id_var = tk.StringVar()
         self.asset_type_name_var = tk.StringVar()
         self.asset_type_desc_var = tk.StringVar()
         self.wear_threshold_var = tk.DoubleVar(value=60.0)
+        self.fit_method_var = tk.StringVar(value=DEFAULT_FIT_METHOD)
         
         # Variables for Asset Instance form
         self.asset_id_var = tk.StringVar()
@@ -78,8 +82,12 @@ class AssetManagementTab:
         ttk.Label(type_frame, text="Wear Threshold:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
         ttk.Spinbox(type_frame, from_=0, to=100, increment=5.0, textvariable=self.wear_threshold_var, width=10).grid(row=3, column=1, padx=5, pady=2)
         
+        ttk.Label(type_frame, text="Fit Method:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(type_frame, textvariable=self.fit_method_var, values=FIT_METHODS, width=10,
+                     state="readonly").grid(row=4, column=1, sticky=tk.W, padx=5, pady=2)
+        
         button_frame = ttk.Frame(type_frame)
-        button_frame.grid(row=4, column=0, columnspan=2, pady=5)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=5)
         
         ttk.Button(button_frame, text="Add Asset Type", command=self.add_asset_type).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Clear Form", command=self.clear_asset_type_form).pack(side=tk.LEFT, padx=5)
@@ -92,12 +100,13 @@ class AssetManagementTab:
         refresh_frame.pack(fill=tk.X, pady=5)
         
         ttk.Button(refresh_frame, text="Refresh List", command=self.load_asset_types).pack(side=tk.RIGHT)
+        ttk.Button(refresh_frame, text="Apply Fit Method", command=self.apply_fit_method).pack(side=tk.RIGHT, padx=5)
         
         # Create Treeview for Asset Types
         self.type_tree_frame = ttk.Frame(right_frame)
         self.type_tree_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
-        columns = ("id", "name", "description", "threshold")
+        columns = ("id", "name", "description", "threshold", "fit_method")
         self.type_tree = ttk.Treeview(self.type_tree_frame, columns=columns, show="headings")
         
         # Define column headings
@@ -105,12 +114,14 @@ class AssetManagementTab:
         self.type_tree.heading("name", text="Name")
         self.type_tree.heading("description", text="Description")
         self.type_tree.heading("threshold", text="Wear Threshold")
+        self.type_tree.heading("fit_method", text="Fit Method")
         
         # Define column widths
         self.type_tree.column("id", width=100)
         self.type_tree.column("name", width=150)
         self.type_tree.column("description", width=200)
         self.type_tree.column("threshold", width=100)
+        self.type_tree.column("fit_method", width=80)
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(self.type_tree_frame, orient=tk.VERTICAL, command=self.type_tree.yview)
@@ -232,12 +243,13 @@ class AssetManagementTab:
         name = self.asset_type_name_var.get().strip()
         desc = self.asset_type_desc_var.get().strip()
         threshold = self.wear_threshold_var.get()
+        fit_method = self.fit_method_var.get()
         
         if not type_id or not name:
             messagebox.showerror("Input Error", "Type ID and Name are required.")
             return
             
-        success = self.db_manager.add_asset_type(type_id, name, desc, threshold)
+        success = self.db_manager.add_asset_type(type_id, name, desc, threshold, fit_method)
         
         if success:
             self.status_var.set(f"Asset Type {name} added successfully.")
@@ -252,6 +264,22 @@ class AssetManagementTab:
         self.asset_type_name_var.set("")
         self.asset_type_desc_var.set("")
         self.wear_threshold_var.set(60.0)
+        self.fit_method_var.set(DEFAULT_FIT_METHOD)
+        
+    def apply_fit_method(self):
+        """Set the selected asset type's fit method to the one chosen in the form."""
+        selected = self.type_tree.selection()
+        if not selected:
+            messagebox.showerror("Selection Error", "Please select an asset type to update.")
+            return
+        
+        type_id = self.type_tree.item(selected[0])["values"][0]
+        fit_method = self.fit_method_var.get()
+        if self.db_manager.set_asset_type_fit_method(type_id, fit_method):
+            self.status_var.set(f"Asset Type {type_id} now uses the {fit_method} fit.")
+            self.load_asset_types()
+        else:
+            messagebox.showerror("Database Error", f"Failed to update the fit method of {type_id}.")
         
     def add_asset(self):
         """Add a new asset instance to the database."""
@@ -304,7 +332,7 @@ class AssetManagementTab:
         
     def load_tuls(self):
         """Load TUL data for dropdowns."""
-        tuls = self.db_manager.get_tuls()
+        tuls = self.reference_data.get_tuls()
         tul_ids = [""] + [tul[0] for tul in tuls]  # Add empty option for filtering
         
         self.tul_combo['values'] = tul_ids
@@ -317,7 +345,7 @@ class AssetManagementTab:
             self.type_tree.delete(item)
             
         # Get all asset types
-        asset_types = self.db_manager.get_asset_types()
+        asset_types = self.reference_data.get_asset_types()
         
         # Update dropdown values
         type_ids = [asset_type[0] for asset_type in asset_types]
@@ -330,8 +358,8 @@ class AssetManagementTab:
             
         # Add each asset type to the treeview
         for asset_type in asset_types:
-            type_id, name, desc, threshold = asset_type
-            self.type_tree.insert("", tk.END, values=(type_id, name, desc, threshold))
+            type_id, name, desc, threshold, fit_method = asset_type
+            self.type_tree.insert("", tk.END, values=(type_id, name, desc, threshold, fit_method or DEFAULT_FIT_METHOD))
             
         self.status_var.set(f"Loaded {len(asset_types)} asset types.")
         
@@ -346,7 +374,7 @@ class AssetManagementTab:
         type_filter = self.filter_asset_type_var.get()
         
         # Get assets with filters
-        assets = self.db_manager.get_assets(
+        assets = self.reference_data.get_assets(
             tul_id=tul_filter if tul_filter else None,
             asset_type_id=type_filter if type_filter else None
         )
@@ -2,21 +2,38 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-import statistics
+from data.database_manager import DEFAULT_PLOT_WIDTH
+from data.reference_cache import ReferenceDataCache
+from models.fleet_analytics import (OUTLIER_Z, asset_offsets,
+                                    fleet_wear_rates, robust_z_scores)
+from utils.downsampling import lttb, binned_percentiles
+from utils.plotting import load_tk_backend
+from utils.instrumentation import span, timed
+
+# In "Auto" chart mode, fleets larger than this are drawn as aggregate bands
+AGGREGATE_ASSET_THRESHOLD = 50
+
+# Longest series drawn point-for-point; longer ones are downsampled with LTTB
+MAX_POINTS_PER_SERIES = 300
+
+# Number of day bins used for the aggregate percentile bands
+AGGREGATE_BINS = 200
+
+# Status text for the history resolutions get_wear_history can pick
+RESOLUTION_LABELS = {"raw": "", "W": ", weekly averages", "M": ", monthly averages"}
+
+# Days covered by each time range choice
+TIME_RANGE_DAYS = {"Last Year": 365, "Last 6 Months": 180, "Last 3 Months": 90, "Last Month": 30}
 
 class ComparisonTab:
     """Implements the Comparison Analysis tab functionality."""
     
-    def __init__(self, parent, db_manager, prediction_model, status_var):
+    def __init__(self, parent, db_manager, prediction_model, status_var, reference_data=None):
         self.parent = parent
         self.db_manager = db_manager
         self.prediction_model = prediction_model
         self.status_var = status_var
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
         
         # Variables for comparison controls
         self.comparison_mode_var = tk.StringVar(value="By Asset Type")
@@ -25,9 +42,11 @@ class ComparisonTab:
         self.time_range_var = tk.StringVar(value="All Time")
         self.invert_y_var = tk.BooleanVar(value=True)  # Default to inverted Y-axis
         self.highlight_outliers_var = tk.BooleanVar(value=True)
+        self.chart_mode_var = tk.StringVar(value="Auto")
         
         # UI components
         self.canvas = None
+        self.resolution = "raw"
         self.setup_ui()
         
     def setup_ui(self):
@@ -77,6 +96,13 @@ class ComparisonTab:
         ttk.Checkbutton(options_frame, text="Highlight Outliers", 
                         variable=self.highlight_outliers_var).pack(anchor=tk.W, padx=5, pady=2)
         
+        chart_mode_frame = ttk.Frame(options_frame)
+        chart_mode_frame.pack(anchor=tk.W, padx=5, pady=2)
+        ttk.Label(chart_mode_frame, text="Chart:").pack(side=tk.LEFT)
+        chart_mode_combo = ttk.Combobox(chart_mode_frame, textvariable=self.chart_mode_var, width=16, state="readonly")
+        chart_mode_combo.pack(side=tk.LEFT, padx=5)
+        chart_mode_combo['values'] = ["Auto", "Individual Lines", "Aggregate Bands"]
+        
         # Buttons
         button_frame = ttk.Frame(control_frame)
         button_frame.grid(row=1, column=3, padx=5, pady=5, sticky=tk.E)
@@ -104,7 +130,7 @@ class ComparisonTab:
         
     def load_tuls(self):
         """Load TUL data for dropdowns."""
-        tuls = self.db_manager.get_tuls()
+        tuls = self.reference_data.get_tuls()
         tul_ids = [row[0] for row in tuls]
         
         self.tul_combo['values'] = tul_ids
@@ -113,7 +139,7 @@ class ComparisonTab:
             
     def load_asset_types(self):
         """Load asset type data for dropdowns."""
-        asset_types = self.db_manager.get_asset_types()
+        asset_types = self.reference_data.get_asset_types()
         asset_type_ids = [row[0] for row in asset_types]
         
         self.asset_type_combo['values'] = asset_type_ids
@@ -133,6 +159,7 @@ class ComparisonTab:
             self.tul_combo.config(state="readonly")
             self.asset_type_combo.config(state="readonly")
             
+    @timed("comparison.generate")
     def generate_comparison(self):
         """Generate the comparison visualization based on selected options."""
         mode = self.comparison_mode_var.get()
@@ -156,7 +183,7 @@ class ComparisonTab:
         # Get the data based on comparison mode
         if mode == "By Asset Type":
             # Get assets of the selected type, optionally filtered by TUL
-            assets = self.db_manager.get_assets(tul_id=tul_id if tul_id else None, asset_type_id=asset_type_id)
+            assets = self.reference_data.get_assets(tul_id=tul_id if tul_id else None, asset_type_id=asset_type_id)
             
             if not assets:
                 ttk.Label(self.graph_container, text="No assets found matching the selected criteria", 
@@ -167,19 +194,14 @@ class ComparisonTab:
             if tul_id:
                 title += f" in {tul_id}"
                 
-            # Get measurements for these assets
-            all_measurements = []
-            for asset in assets:
-                asset_id = asset[0]
-                measurements = self.db_manager.get_measurements(asset_id=asset_id)
-                if measurements:
-                    all_measurements.append((asset_id, measurements))
+            # Get the history of these assets at a resolution suited to the range and plot width
+            history = self.load_history(time_range, tul_id=tul_id if tul_id else None, asset_type_id=asset_type_id)
                     
-            self.plot_comparison(all_measurements, title, time_range)
+            self.plot_comparison(history, title, time_range)
                 
         else:  # By TUL
             # Get assets in the selected TUL, optionally filtered by type
-            assets = self.db_manager.get_assets(tul_id=tul_id, asset_type_id=asset_type_id if asset_type_id else None)
+            assets = self.reference_data.get_assets(tul_id=tul_id, asset_type_id=asset_type_id if asset_type_id else None)
             
             if not assets:
                 ttk.Label(self.graph_container, text="No assets found matching the selected criteria", 
@@ -190,132 +212,98 @@ class ComparisonTab:
             if asset_type_id:
                 title += f" for {asset_type_id} Assets"
                 
-            # Get measurements for these assets
-            all_measurements = []
-            for asset in assets:
-                asset_id = asset[0]
-                measurements = self.db_manager.get_measurements(asset_id=asset_id)
-                if measurements:
-                    all_measurements.append((asset_id, measurements))
+            # Get the history of these assets at a resolution suited to the range and plot width
+            history = self.load_history(time_range, tul_id=tul_id, asset_type_id=asset_type_id if asset_type_id else None)
                     
-            self.plot_comparison(all_measurements, title, time_range)
+            self.plot_comparison(history, title, time_range)
             
-    def plot_comparison(self, all_measurements, title, time_range):
-        """Plot the comparison chart based on measurement data."""
-        if not all_measurements:
+    def cutoff_date(self, time_range):
+        """Earliest date shown for a time range choice, or None for all time."""
+        if time_range not in TIME_RANGE_DAYS:
+            return None
+        return datetime.now().date() - timedelta(days=TIME_RANGE_DAYS[time_range])
+        
+    def load_history(self, time_range, tul_id=None, asset_type_id=None):
+        """Raw readings or weekly/monthly rollups, whichever fits the range and graph width."""
+        width = self.graph_container.winfo_width()
+        self.resolution, history = self.db_manager.get_wear_history(
+            tul_id=tul_id, asset_type_id=asset_type_id, start_date=self.cutoff_date(time_range),
+            pixel_width=width if width > 1 else DEFAULT_PLOT_WIDTH)
+        return history
+        
+    def plot_comparison(self, history, title, time_range):
+        """Plot the comparison chart from the MeasurementSeries of many assets."""
+        if not len(history):
             ttk.Label(self.graph_container, text="No measurement data available for the selected assets", 
                       font=('Arial', 11), foreground='gray').pack(pady=100)
             return
             
+        plt, FigureCanvasTkAgg = load_tk_backend()
+        
         # Create figure and axis
         fig = plt.Figure(figsize=(10, 6), dpi=100)
         ax = fig.add_subplot(111)
         
         # Filter by time range if needed
-        cutoff_date = None
-        if time_range != "All Time":
-            today = datetime.now().date()
-            if time_range == "Last Year":
-                cutoff_date = today - timedelta(days=365)
-            elif time_range == "Last 6 Months":
-                cutoff_date = today - timedelta(days=180)
-            elif time_range == "Last 3 Months":
-                cutoff_date = today - timedelta(days=90)
-            elif time_range == "Last Month":
-                cutoff_date = today - timedelta(days=30)
+        cutoff_date = self.cutoff_date(time_range)
         
         # Process and plot data for each asset
         colors = plt.cm.tab10.colors
         markers = ['o', 's', '^', 'D', 'v', '<', '>', 'p', '*', 'h']
         
-        # First pass: collect all wear rates for outlier detection
-        all_wear_rates = []
-        processed_data = []
+        # First pass: group all readings into per-asset arrays sorted by date
+        asset_ids, codes, days, wear = history.grouped()
+        n_assets = len(asset_ids)
         
-        for i, (asset_id, measurements) in enumerate(all_measurements):
-            # Sort by date
-            measurements.sort(key=lambda m: datetime.strptime(m[2], '%Y-%m-%d'))
-            
-            # Filter by time range if needed
-            if cutoff_date:
-                filtered_measurements = [m for m in measurements if datetime.strptime(m[2], '%Y-%m-%d').date() >= cutoff_date]
-                if filtered_measurements:
-                    measurements = filtered_measurements
-                    
-            # Skip if no measurements
-            if len(measurements) < 2:
-                continue
-                
-            # Extract dates and wear values
-            dates = [datetime.strptime(m[2], '%Y-%m-%d').date() for m in measurements]
-            wear_values = [float(m[3]) for m in measurements]
-            
-            # Calculate days since first measurement for each asset
-            start_date = dates[0]
-            days = [(date - start_date).days for date in dates]
-            
-            # Calculate wear rate (mm per day)
-            total_days = days[-1]
-            if total_days > 0:  # Avoid division by zero
-                wear_rate = (wear_values[-1] - wear_values[0]) / total_days
-                all_wear_rates.append(wear_rate)
-                
-                # Store processed data for plotting
-                processed_data.append({
-                    'asset_id': asset_id,
-                    'dates': dates,
-                    'days': days,
-                    'wear_values': wear_values,
-                    'wear_rate': wear_rate
-                })
+        # Filter by time range, keeping full history for assets with nothing in range
+        if cutoff_date:
+            in_range = days >= np.datetime64(cutoff_date, 'D').astype(np.int64)
+            has_recent = np.bincount(codes[in_range], minlength=n_assets) > 0
+            keep = in_range | ~has_recent[codes]
+            codes, days, wear = codes[keep], days[keep], wear[keep]
+        
+        # Days since each asset's first measurement
+        offsets = asset_offsets(codes, n_assets)
+        counts = np.diff(offsets)
+        days = days - days[offsets[:-1]][codes]
+        total_days = days[offsets[1:] - 1]
+        
+        # Wear rate from least-squares slopes within each maintenance segment
+        wear_rates = fleet_wear_rates(codes, days, wear, n_assets)
+        valid = (counts >= 2) & (total_days > 0)
         
         # Skip plotting if no valid data
-        if not processed_data:
+        if not valid.any():
             ttk.Label(self.graph_container, text="No valid measurement data available for comparison", 
                       font=('Arial', 11), foreground='gray').pack(pady=100)
             return
         
-        # Calculate outlier thresholds if needed
-        outlier_threshold = None
-        if self.highlight_outliers_var.get() and len(all_wear_rates) >= 3:
-            median_rate = statistics.median(all_wear_rates)
-            mad = statistics.median([abs(rate - median_rate) for rate in all_wear_rates])
-            outlier_threshold = median_rate + (3 * mad)  # Using Median Absolute Deviation
+        # Flag fast-wearing assets by the robust z-score of their wear rate
+        is_outlier = np.zeros(n_assets, dtype=bool)
+        if self.highlight_outliers_var.get() and valid.sum() >= 3:
+            z_scores = robust_z_scores(np.where(valid, wear_rates, np.nan))
+            is_outlier = valid & (z_scores > OUTLIER_Z)
+        
+        processed_data = []
+        for code in np.flatnonzero(valid):
+            start, end = offsets[code], offsets[code + 1]
+            processed_data.append({
+                'asset_id': asset_ids[code],
+                'days': days[start:end],
+                'wear_values': wear[start:end],
+                'wear_rate': wear_rates[code],
+                'is_outlier': bool(is_outlier[code])
+            })
             
         # Second pass: plot the data
-        for i, data in enumerate(processed_data):
-            color_idx = i % len(colors)
-            marker_idx = i % len(markers)
-            
-            # Check if this asset's wear rate is an outlier
-            is_outlier = outlier_threshold and data['wear_rate'] > outlier_threshold
-            
-            # Set line properties
-            line_props = {
-                'marker': markers[marker_idx],
-                'linestyle': '-',
-                'linewidth': 2 if is_outlier else 1.5,
-                'markersize': 8 if is_outlier else 6,
-                'alpha': 0.8
-            }
-            
-            if is_outlier:
-                line_props['color'] = 'red'
-                line_props['markeredgecolor'] = 'red'
-                line_props['markeredgewidth'] = 2
-            else:
-                line_props['color'] = colors[color_idx]
-            
-            # Plot the data
-            line, = ax.plot(data['days'], data['wear_values'], **line_props, label=data['asset_id'])
-            
-            # Add annotation for outliers
-            if is_outlier:
-                ax.annotate(f"Outlier: {data['asset_id']}", 
-                           xy=(data['days'][-1], data['wear_values'][-1]),
-                           xytext=(10, 0), textcoords="offset points",
-                           ha="left", va="center", fontsize=9,
-                           bbox=dict(boxstyle="round,pad=0.3", fc="yellow", alpha=0.7))
+        chart_mode = self.chart_mode_var.get()
+        aggregate = (chart_mode == "Aggregate Bands" or
+                     (chart_mode == "Auto" and len(processed_data) > AGGREGATE_ASSET_THRESHOLD))
+        
+        if aggregate:
+            self.plot_aggregate(ax, processed_data)
+        else:
+            self.plot_individual(ax, processed_data, colors, markers)
         
         # Invert Y-axis if requested to show wear increasing downward
         if self.invert_y_var.get():
@@ -328,7 +316,7 @@ class ComparisonTab:
         ax.grid(True, alpha=0.3)
         
         # Add legend
-        if len(processed_data) <= 10:
+        if aggregate or len(processed_data) <= 10:
             ax.legend(loc='best')
         else:
             # For many assets, move legend outside the plot
@@ -337,7 +325,8 @@ class ComparisonTab:
         
         # Create canvas for displaying the plot
         canvas = FigureCanvasTkAgg(fig, master=self.graph_container)
-        canvas.draw()
+        with span("plot.draw"):
+            canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
         # Save reference to canvas for export
@@ -345,7 +334,78 @@ class ComparisonTab:
         self.fig = fig
         
         # Update status
-        self.status_var.set(f"Comparison generated with {len(processed_data)} assets")
+        mode_text = " (aggregate view)" if aggregate else ""
+        self.status_var.set(f"Comparison generated with {len(processed_data)} assets{mode_text}"
+                            f"{RESOLUTION_LABELS[self.resolution]}")
+        
+    def plot_individual(self, ax, processed_data, colors, markers):
+        """Draw one line per asset, downsampling long series."""
+        for i, data in enumerate(processed_data):
+            color_idx = i % len(colors)
+            marker_idx = i % len(markers)
+            
+            is_outlier = data['is_outlier']
+            
+            # Set line properties
+            line_props = {
+                'marker': markers[marker_idx],
+                'linestyle': '-',
+                'linewidth': 2 if is_outlier else 1.5,
+                'markersize': 8 if is_outlier else 6,
+                'alpha': 0.8
+            }
+            
+            if is_outlier:
+                line_props['color'] = 'red'
+                line_props['markeredgecolor'] = 'red'
+                line_props['markeredgewidth'] = 2
+            else:
+                line_props['color'] = colors[color_idx]
+            
+            # Plot the data
+            days, wear_values = self.downsample(data['days'], data['wear_values'])
+            if len(days) < len(data['days']):
+                line_props['markersize'] = 0
+            line, = ax.plot(days, wear_values, **line_props, label=data['asset_id'])
+            
+            # Add annotation for outliers
+            if is_outlier:
+                self.annotate_outlier(ax, data)
+    
+    def plot_aggregate(self, ax, processed_data):
+        """Draw median and percentile bands across assets, plus outliers individually."""
+        codes = np.concatenate([np.full(len(data['days']), i) for i, data in enumerate(processed_data)])
+        days = np.concatenate([data['days'] for data in processed_data])
+        wear = np.concatenate([data['wear_values'] for data in processed_data])
+        
+        bin_width = max(1, int(np.ceil((days.max() + 1) / AGGREGATE_BINS)))
+        centres, bands = binned_percentiles(codes, days, wear, len(processed_data), bin_width)
+        
+        ax.fill_between(centres, bands[10], bands[90], color='tab:blue', alpha=0.15, label='P10-P90')
+        ax.fill_between(centres, bands[25], bands[75], color='tab:blue', alpha=0.3, label='P25-P75')
+        ax.plot(centres, bands[50], color='tab:blue', linewidth=2, label=f'Median ({len(processed_data)} assets)')
+        
+        # Only the outliers are drawn as individual lines
+        for data in processed_data:
+            if data['is_outlier']:
+                days_ds, wear_ds = self.downsample(data['days'], data['wear_values'])
+                ax.plot(days_ds, wear_ds, color='red', linewidth=1.5, alpha=0.8, label=data['asset_id'])
+                self.annotate_outlier(ax, data)
+    
+    def downsample(self, days, wear_values):
+        """Reduce a series to at most MAX_POINTS_PER_SERIES points for drawing."""
+        if len(days) <= MAX_POINTS_PER_SERIES:
+            return days, wear_values
+        keep = lttb(days, wear_values, MAX_POINTS_PER_SERIES)
+        return np.asarray(days)[keep], np.asarray(wear_values)[keep]
+    
+    def annotate_outlier(self, ax, data):
+        """Label an outlier asset at the end of its series."""
+        ax.annotate(f"Outlier: {data['asset_id']}", 
+                   xy=(data['days'][-1], data['wear_values'][-1]),
+                   xytext=(10, 0), textcoords="offset points",
+                   ha="left", va="center", fontsize=9,
+                   bbox=dict(boxstyle="round,pad=0.3", fc="yellow", alpha=0.7))
         
     def export_graph(self):
         """Export the current graph as an image file."""
@@ -1,14 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from data.reference_cache import ReferenceDataCache
+from data.write_queue import MeasurementWriteQueue
+
+# How often committed readings from the write queue are shown
+WRITE_POLL_MS = 100
 
 class MaintenanceTab:
     """Implements the Maintenance Records tab functionality for the expanded asset system."""
     
-    def __init__(self, parent, db_manager, status_var):
+    def __init__(self, parent, db_manager, status_var, reference_data=None):
         self.parent = parent
         self.db_manager = db_manager
         self.status_var = status_var
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
+        
+        # New records are saved in the background; an in-memory database has no second connection
+        self.write_queue = MeasurementWriteQueue(db_manager.db_path) if db_manager.db_path != ":memory:" else None
         
         # Variables for maintenance form
         self.tul_var = tk.StringVar()
@@ -26,6 +35,8 @@ class MaintenanceTab:
         
         # Create the UI
         self.setup_ui()
+        if self.write_queue:
+            self.poll_writes()
         
     def setup_ui(self):
         """Set up the user interface for the maintenance tab."""
@@ -129,6 +140,7 @@ class MaintenanceTab:
         self.history_tree.column("wear", width=80)
         self.history_tree.column("shims", width=80)
         self.history_tree.column("notes", width=200, stretch=tk.YES)
+        self.history_tree.tag_configure("pending", foreground="gray")
 
         # Add a scrollbar
         scrollbar = ttk.Scrollbar(self.tree_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
@@ -162,14 +174,14 @@ class MaintenanceTab:
     def refresh_dropdowns(self):
         """Refresh all dropdown lists."""
         # Load TULs
-        tuls = self.db_manager.get_tuls()
+        tuls = self.reference_data.get_tuls()
         tul_ids = [row[0] for row in tuls]
         
         self.tul_combo['values'] = tul_ids
         self.filter_tul_combo['values'] = [""] + tul_ids  # Add empty option for filtering
         
         # Load Asset Types
-        asset_types = self.db_manager.get_asset_types()
+        asset_types = self.reference_data.get_asset_types()
         asset_type_ids = [row[0] for row in asset_types]
         
         self.asset_type_combo['values'] = asset_type_ids
@@ -193,7 +205,7 @@ class MaintenanceTab:
     
     def update_asset_list(self, tul_id=None, asset_type_id=None):
         """Update the asset dropdown based on selected TUL and/or asset type."""
-        assets = self.db_manager.get_assets(tul_id=tul_id, asset_type_id=asset_type_id)
+        assets = self.reference_data.get_assets(tul_id=tul_id, asset_type_id=asset_type_id)
         asset_ids = [asset[0] for asset in assets]
         
         self.asset_combo['values'] = asset_ids
@@ -209,7 +221,7 @@ class MaintenanceTab:
         
         # Update asset type options if needed
         if tul_id:
-            assets = self.db_manager.get_assets(tul_id=tul_id)
+            assets = self.reference_data.get_assets(tul_id=tul_id)
             asset_types = set(asset[2] for asset in assets)
             self.filter_type_combo['values'] = [""] + list(asset_types)
         
@@ -223,7 +235,7 @@ class MaintenanceTab:
         
         # Update TUL options if needed
         if asset_type_id and not tul_id:
-            assets = self.db_manager.get_assets(asset_type_id=asset_type_id)
+            assets = self.reference_data.get_assets(asset_type_id=asset_type_id)
             tuls = set(asset[1] for asset in assets)
             self.filter_tul_combo['values'] = [""] + list(tuls)
         
@@ -232,7 +244,7 @@ class MaintenanceTab:
     
     def update_filter_asset_list(self, tul_id=None, asset_type_id=None):
         """Update the filter asset dropdown based on selected TUL and/or asset type."""
-        assets = self.db_manager.get_assets(
+        assets = self.reference_data.get_assets(
             tul_id=tul_id if tul_id else None,
             asset_type_id=asset_type_id if asset_type_id else None
         )
@@ -259,6 +271,17 @@ class MaintenanceTab:
         shims = self.shims_var.get()
         notes = self.notes_var.get()
         
+        if self.write_queue:
+            # Show the record straight away; poll_writes swaps in the saved row
+            ticket = self.write_queue.put(asset_id, date, wear, shims, notes)
+            asset = self.reference_data.get_asset(asset_id)
+            self.history_tree.insert("", 0, iid=f"pending-{ticket}", tags=("pending",),
+                                     values=(date, asset[1] if asset else "", asset[2] if asset else "",
+                                             asset_id, f"{wear:.1f}", f"{shims:.1f}", notes))
+            self.status_var.set(f"Saving maintenance record for {asset_id}...")
+            self.clear_form()
+            return
+        
         # Add to database
         success = self.db_manager.add_measurement(asset_id, date, wear, shims, notes)
         
@@ -269,6 +292,45 @@ class MaintenanceTab:
         else:
             messagebox.showerror("Database Error", "Failed to add maintenance record.")
             
+    def poll_writes(self):
+        """Apply write queue results every WRITE_POLL_MS."""
+        self.process_write_events()
+        self.parent.after(WRITE_POLL_MS, self.poll_writes)
+        
+    def process_write_events(self):
+        """Replace pending rows with saved ones and report readings that failed to save."""
+        saved = 0
+        errors = []
+        for event in self.write_queue.poll():
+            if event[0] == "committed":
+                _, tickets, ids, records = event
+                for ticket, measurement_id in zip(tickets, ids):
+                    pending = f"pending-{ticket}"
+                    if self.history_tree.exists(pending):
+                        index = self.history_tree.index(pending)
+                        values = self.history_tree.item(pending, "values")
+                        self.history_tree.delete(pending)
+                        self.history_tree.insert("", index, iid=str(measurement_id), values=values)
+                self.db_manager.notify_measurements_added(records)
+                saved += len(ids)
+            else:
+                _, tickets, records, message = event
+                for ticket in tickets:
+                    if self.history_tree.exists(f"pending-{ticket}"):
+                        self.history_tree.delete(f"pending-{ticket}")
+                errors.append(message)
+        
+        if saved:
+            self.status_var.set(f"Saved {saved} maintenance record{'s' if saved != 1 else ''}")
+        if errors:
+            messagebox.showerror("Database Error", "Failed to add maintenance records:\n\n" + "\n".join(errors))
+            
+    def close(self):
+        """Save any queued records before the application exits."""
+        if self.write_queue:
+            self.write_queue.close()
+            self.process_write_events()
+        
     def clear_form(self):
             """Clear the maintenance form."""
             self.wear_var.set(0.0)
@@ -386,11 +448,12 @@ class MaintenanceTab:
             
         record_id = selected_item[0]
         values = self.history_tree.item(record_id, "values")
+        asset = self.reference_data.get_asset(values[3])
         
         # Create a details window
         details_window = tk.Toplevel(self.parent)
         details_window.title("Maintenance Record Details")
-        details_window.geometry("400x320")
+        details_window.geometry("400x400")
         details_window.transient(self.parent)
         details_window.grab_set()
         
@@ -403,8 +466,10 @@ class MaintenanceTab:
         details = [
             ("Date:", values[0]),
             ("TUL:", values[1]),
-            ("Asset Type:", values[2]),
+            ("Location:", asset[7] if asset else ""),
+            ("Asset Type:", f"{values[2]} ({asset[6]})" if asset else values[2]),
             ("Asset ID:", values[3]),
+            ("Instance #:", asset[3] if asset else ""),
             ("Wear Measurement:", f"{values[4]} mm"),
             ("Shims Added:", values[5]),
             ("Notes:", values[6])
@@ -428,6 +493,9 @@ class MaintenanceTab:
             return
             
         record_id = selected_item[0]
+        if record_id.startswith("pending-"):
+            messagebox.showinfo("Record Saving", "This record is still being saved. Try again in a moment.")
+            return
         values = self.history_tree.item(record_id, "values")
         
         # Get record information for confirmation message
@@ -0,0 +1,127 @@
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime
+from utils.instrumentation import recorder
+
+# How often the timing tables refresh while the tab is visible
+REFRESH_MS = 1000
+
+class PerformanceTab:
+    """Implements the Performance tab showing recent timing spans."""
+    
+    def __init__(self, parent, db_manager, status_var, reference_data=None):
+        self.parent = parent
+        self.db_manager = db_manager
+        self.status_var = status_var
+        
+        self.auto_refresh_var = tk.BooleanVar(value=True)
+        self.profile_button_text = tk.StringVar(value="Start Profiling")
+        
+        self.setup_ui()
+        self.schedule_refresh()
+        
+    def setup_ui(self):
+        """Set up the user interface for the Performance tab."""
+        ttk.Label(self.parent, text="Performance", style="Title.TLabel").pack(anchor=tk.W, padx=10, pady=5)
+        
+        # Controls
+        control_frame = ttk.Frame(self.parent)
+        control_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Button(control_frame, text="Refresh", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, textvariable=self.profile_button_text,
+                   command=self.toggle_profiling).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Export Chrome Trace", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(control_frame, text="Auto Refresh", variable=self.auto_refresh_var).pack(side=tk.LEFT, padx=5)
+        
+        panes = ttk.PanedWindow(self.parent, orient=tk.VERTICAL)
+        panes.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        # Totals per span name
+        summary_frame = ttk.LabelFrame(panes, text="Totals by Operation")
+        columns = ("name", "count", "total", "mean", "max")
+        self.summary_tree = ttk.Treeview(summary_frame, columns=columns, show="headings", height=10)
+        for column, heading, width in zip(columns, ("Operation", "Calls", "Total (ms)", "Mean (ms)", "Max (ms)"),
+                                          (260, 80, 100, 100, 100)):
+            self.summary_tree.heading(column, text=heading)
+            self.summary_tree.column(column, width=width, anchor=tk.W if column == "name" else tk.E)
+        self.summary_tree.pack(fill=tk.BOTH, expand=True)
+        panes.add(summary_frame, weight=1)
+        
+        # Most recent spans
+        recent_frame = ttk.LabelFrame(panes, text="Recent Timings")
+        columns = ("time", "name", "duration")
+        self.recent_tree = ttk.Treeview(recent_frame, columns=columns, show="headings", height=10)
+        for column, heading, width in zip(columns, ("Time", "Operation", "Duration (ms)"), (120, 260, 120)):
+            self.recent_tree.heading(column, text=heading)
+            self.recent_tree.column(column, width=width, anchor=tk.E if column == "duration" else tk.W)
+        self.recent_tree.pack(fill=tk.BOTH, expand=True)
+        panes.add(recent_frame, weight=1)
+        
+        # cProfile output
+        profile_frame = ttk.LabelFrame(panes, text="Profile")
+        self.profile_text = tk.Text(profile_frame, wrap=tk.NONE, height=10, font=("Courier", 9))
+        self.profile_text.pack(fill=tk.BOTH, expand=True)
+        panes.add(profile_frame, weight=1)
+        
+        self.refresh()
+        
+    def schedule_refresh(self):
+        """Refresh the tables periodically while the tab is on screen."""
+        if self.auto_refresh_var.get() and self.parent.winfo_ismapped():
+            self.refresh()
+        self.parent.after(REFRESH_MS, self.schedule_refresh)
+        
+    def refresh(self):
+        """Reload the timing tables from the span recorder."""
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        summary = sorted(recorder.summary().items(), key=lambda item: item[1][1], reverse=True)
+        for name, (count, total, mean, longest) in summary:
+            self.summary_tree.insert("", tk.END, values=(name, count, f"{total:.1f}", f"{mean:.2f}", f"{longest:.2f}"))
+        
+        # Span starts are perf_counter_ns values; show them relative to now as wall-clock times
+        self.recent_tree.delete(*self.recent_tree.get_children())
+        now = datetime.now().timestamp()
+        now_ns = time.perf_counter_ns()
+        for name, start, duration, _ in recorder.recent(200):
+            started = datetime.fromtimestamp(now - (now_ns - start) / 1e9)
+            self.recent_tree.insert("", tk.END, values=(started.strftime('%H:%M:%S.%f')[:-3], name,
+                                                        f"{duration / 1e6:.2f}"))
+        
+    def clear(self):
+        """Drop all recorded spans."""
+        recorder.clear()
+        self.refresh()
+        self.status_var.set("Timing data cleared")
+        
+    def toggle_profiling(self):
+        """Start or stop a cProfile capture of the UI thread."""
+        if recorder.profiler is None:
+            recorder.start_profiling()
+            self.profile_button_text.set("Stop Profiling")
+            self.status_var.set("Profiling started")
+        else:
+            report = recorder.stop_profiling()
+            self.profile_button_text.set("Start Profiling")
+            self.profile_text.delete(1.0, tk.END)
+            self.profile_text.insert(tk.END, report)
+            self.status_var.set("Profiling stopped")
+        
+    def export_trace(self):
+        """Save the recorded spans as a Chrome trace JSON file."""
+        filename = filedialog.asksaveasfilename(
+            title="Export Chrome Trace",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        
+        if not filename:
+            return
+        
+        success, message = recorder.export_chrome_trace(filename)
+        if success:
+            self.status_var.set(message)
+        else:
+            messagebox.showerror("Export Error", message)
@@ -1,29 +1,41 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
-import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from data.reference_cache import ReferenceDataCache
+from models.fleet_analytics import RESET_DROP_RATIO, DEFAULT_FIT_METHOD
+from models.wear_models import MODEL_FAMILIES, DEFAULT_MODEL_FAMILY, fit_wear_model
+from models.prediction_service import PredictionService, DEFAULT_WEAR_THRESHOLD
+from models.maintenance_scheduler import MaintenanceScheduler, PLAN_HORIZON_DAYS
+from utils.plotting import load_tk_backend
+from utils.instrumentation import span, timed
 
 class PredictionTab:
     """Implements the Prediction tab functionality for the expanded asset system."""
     
-    def __init__(self, parent, db_manager, prediction_model, status_var):
+    def __init__(self, parent, db_manager, prediction_model, status_var, reference_data=None):
         self.parent = parent
         self.db_manager = db_manager
         self.status_var = status_var
         self.prediction_model = prediction_model
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
+        self.prediction_service = PredictionService(db_manager, self.reference_data)
+        self.scheduler = MaintenanceScheduler(self.prediction_service)
         
         # Variables for prediction controls
         self.tul_var = tk.StringVar()
         self.asset_type_var = tk.StringVar()
         self.asset_var = tk.StringVar()
         self.days_ahead_var = tk.IntVar(value=90)
-        self.threshold_var = tk.DoubleVar(value=60.0)
+        self.threshold_var = tk.DoubleVar(value=DEFAULT_WEAR_THRESHOLD)
+        self.model_family_var = tk.StringVar(value=DEFAULT_MODEL_FAMILY)
         self.invert_y_var = tk.BooleanVar(value=True)  # Default to inverted Y-axis
         
+        # Fitted model per asset as (model, first measurement date). New readings
+        # are absorbed with WearPredictionModel.update instead of refitting.
+        self.asset_models = {}
+        db_manager.add_measurement_listener(self.on_measurement_added)
+        db_manager.add_change_listener(self.on_data_changed)
+        
         # Create the UI
         self.setup_ui()
         
@@ -68,9 +80,14 @@ class PredictionTab:
         threshold_spinbox = ttk.Spinbox(control_frame, from_=0.1, to=100.0, increment=0.5, textvariable=self.threshold_var, width=10)
         threshold_spinbox.grid(row=4, column=1, padx=5, pady=5)
         
+        # Polynomial, or one of the wear models that never bend downward
+        ttk.Label(control_frame, text="Wear Model:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(control_frame, textvariable=self.model_family_var, values=MODEL_FAMILIES, width=12,
+                     state="readonly").grid(row=5, column=1, padx=5, pady=5)
+        
         # Display options
         ttk.Checkbutton(control_frame, text="Invert Y-Axis (Show Wear Downward)", 
-                       variable=self.invert_y_var).grid(row=5, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+                       variable=self.invert_y_var).grid(row=6, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
         
         # Action buttons
         button_frame = ttk.Frame(left_frame)
@@ -78,6 +95,8 @@ class PredictionTab:
         
         ttk.Button(button_frame, text="Generate Prediction", command=self.generate_prediction).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Show Maintenance Date", command=self.show_maintenance_date).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Fleet Forecast", command=self.show_fleet_forecast).pack(side=tk.LEFT, padx=5)
+        ttk.Button(left_frame, text="Plan Maintenance", command=self.plan_maintenance).pack(anchor=tk.W, padx=10)
         
         # Right frame - Results display with tabs
         results_notebook = ttk.Notebook(right_frame)
@@ -107,7 +126,7 @@ class PredictionTab:
         
     def load_tuls(self):
         """Load TUL data for dropdowns."""
-        tuls = self.db_manager.get_tuls()
+        tuls = self.reference_data.get_tuls()
         tul_ids = [row[0] for row in tuls]
         
         self.tul_combo['values'] = tul_ids
@@ -116,7 +135,7 @@ class PredictionTab:
             
     def load_asset_types(self):
         """Load asset type data for dropdowns."""
-        asset_types = self.db_manager.get_asset_types()
+        asset_types = self.reference_data.get_asset_types()
         asset_type_ids = [row[0] for row in asset_types]
         
         self.asset_type_combo['values'] = asset_type_ids
@@ -130,12 +149,8 @@ class PredictionTab:
         if not asset_type_id:
             return
             
-        # Get asset type details to find the default threshold
-        asset_types = self.db_manager.get_asset_types()
-        for asset_type in asset_types:
-            if asset_type[0] == asset_type_id:
-                self.threshold_var.set(asset_type[3])  # Set to WearThreshold value
-                break
+        # Use the asset type's WearThreshold as the default
+        self.threshold_var.set(self.prediction_service.get_threshold(asset_type_id))
                 
     def on_tul_selected(self, event=None):
         """Handle TUL selection to update asset list."""
@@ -156,7 +171,7 @@ class PredictionTab:
     
     def update_asset_list(self, tul_id=None, asset_type_id=None):
         """Update the asset dropdown based on selected TUL and/or asset type."""
-        assets = self.db_manager.get_assets(tul_id=tul_id, asset_type_id=asset_type_id)
+        assets = self.reference_data.get_assets(tul_id=tul_id, asset_type_id=asset_type_id)
         asset_ids = [asset[0] for asset in assets]
         
         self.asset_combo['values'] = asset_ids
@@ -165,6 +180,26 @@ class PredictionTab:
         else:
             self.asset_var.set("")
     
+    def on_measurement_added(self, asset_id, measurement_date, wear_value):
+        """Update the cached model for an asset with a newly entered reading."""
+        if asset_id not in self.asset_models:
+            return
+        
+        model, start_date = self.asset_models[asset_id]
+        if isinstance(measurement_date, str):
+            measurement_date = datetime.strptime(measurement_date, '%Y-%m-%d').date()
+        
+        success, _ = model.update((measurement_date - start_date).days, wear_value)
+        if not success or not model.is_trained():
+            # A back-dated reading or a reset that left too few readings; refit on the next prediction
+            del self.asset_models[asset_id]
+    
+    def on_data_changed(self, table):
+        """Drop cached models when readings, assets or fit methods change."""
+        if table in ("Measurements", "Assets", "TULs", "AssetTypes"):
+            self.asset_models.clear()
+    
+    @timed("prediction.generate")
     def generate_prediction(self):
         """Generate wear prediction for the selected asset."""
         asset_id = self.asset_var.get()
@@ -174,18 +209,12 @@ class PredictionTab:
             
         # Get the measurement data
         measurements = self.db_manager.get_measurements(asset_id=asset_id)
-        if len(measurements) < 3:
-            messagebox.showerror("Data Error", 
-                f"Not enough measurements for asset {asset_id}. Need at least 3 data points.")
+        if not measurements:
+            messagebox.showerror("Data Error", f"No measurements found for asset {asset_id}.")
             return
             
         # Get asset and type details for display
-        assets = self.db_manager.get_assets()
-        asset_details = None
-        for asset in assets:
-            if asset[0] == asset_id:
-                asset_details = asset
-                break
+        asset_details = self.reference_data.get_asset(asset_id)
                 
         if not asset_details:
             messagebox.showerror("Data Error", f"Could not find details for asset {asset_id}.")
@@ -200,18 +229,18 @@ class PredictionTab:
         wear_values = []
         
         # Convert to datetime and prepare for model
-        for m in measurements:
-            date_str = m[2]
-            try:
-                date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                dates.append(date)
-                wear_values.append(float(m[3]))  # Wear value
-            except ValueError:
-                continue
-        
-        if len(dates) < 3:
-            messagebox.showerror("Data Error", 
-                f"Not enough valid measurements for asset {asset_id}. Need at least 3 data points.")
+        with span("prediction.parse_dates"):
+            for m in measurements:
+                date_str = m[2]
+                try:
+                    date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                    dates.append(date)
+                    wear_values.append(float(m[3]))  # Wear value
+                except ValueError:
+                    continue
+        
+        if not dates:
+            messagebox.showerror("Data Error", f"No valid measurements found for asset {asset_id}.")
             return
             
         # Convert dates to days since start
@@ -239,7 +268,7 @@ class PredictionTab:
         
         for i in range(len(clean_days)):
             # If this is not the first point and there's a significant drop in wear
-            if i > 0 and clean_wear[i] < clean_wear[i-1] * 0.5:  # Drop of more than 50%
+            if i > 0 and clean_wear[i] < clean_wear[i-1] * RESET_DROP_RATIO:  # Drop of more than 50%
                 # Start a new segment
                 current_segment += 1
                 segments.append([])
@@ -248,47 +277,32 @@ class PredictionTab:
             segments[current_segment].append(clean_wear[i])
             segment_days[current_segment].append(clean_days[i])
         
-        # Use the last segment for prediction
-        if segments and len(segment_days[-1]) >= 3:
-            prediction_days = segment_days[-1]
-            prediction_wear = segments[-1]
-            
-            # Try different polynomial degrees
-            best_degree = 1
-            best_r2 = -float('inf')
-            
-            for degree in range(1, min(4, len(prediction_days))):
-                temp_model = type(self.prediction_model)(degree=degree)
-                success, _ = temp_model.fit(prediction_days, prediction_wear)
-                
-                if success:
-                    # Predict using the model
-                    pred, _ = temp_model.predict(prediction_days)
-                    
-                    # Calculate R²
-                    mean_wear = sum(prediction_wear) / len(prediction_wear)
-                    ss_total = sum((y - mean_wear) ** 2 for y in prediction_wear)
-                    ss_residual = sum((y - p) ** 2 for y, p in zip(prediction_wear, pred))
-                    r2 = 1 - (ss_residual / ss_total if ss_total > 0 else 0)
-                    
-                    if r2 > best_r2:
-                        best_r2 = r2
-                        best_degree = degree
+        fit_method = self.prediction_service.get_fit_method(asset_type_id)
+        family = self.model_family_var.get()
+        cached = self.asset_models.get(asset_id)
+        if cached and cached[1] == start_date and cached[0].family == family:
+            # Readings added since the last fit were absorbed incrementally
+            self.prediction_model = cached[0]
+        elif segments and len(segment_days[-1]) >= 3:
+            # Use the last segment for prediction; polynomials get the best-fitting degree
+            best_model = fit_wear_model(family, segment_days[-1], segments[-1], fit_method=fit_method)
             
-            # Train with best degree
-            self.prediction_model = type(self.prediction_model)(degree=best_degree)
-            success, message = self.prediction_model.fit(prediction_days, prediction_wear)
-            
-            if not success:
-                messagebox.showerror("Model Error", f"Failed to train model: {message}")
+            if best_model is None:
+                messagebox.showerror("Model Error", "Failed to train model on the latest wear segment")
                 return
+            self.prediction_model = best_model
         else:
-            # Fall back to all data if no valid segments
-            success, message = self.prediction_model.fit(days_since_start, wear_values)
-            
-            if not success:
-                messagebox.showerror("Model Error", f"Failed to train model: {message}")
+            # Too few readings since the last reset; follow the rate pooled from sister assets
+            pooled_model = self.prediction_service.pooled_model(asset_id)
+            if pooled_model is None:
+                messagebox.showerror("Data Error",
+                    f"Not enough measurements for asset {asset_id}. Need at least 3 data points "
+                    f"or other {asset_type_id} assets with a wear history.")
                 return
+            pooled_model.fit(segment_days[-1], segments[-1])
+            self.prediction_model = pooled_model
+        
+        self.asset_models[asset_id] = (self.prediction_model, start_date)
         
         # Get the threshold value
         threshold = self.threshold_var.get()
@@ -297,7 +311,7 @@ class PredictionTab:
         days_ahead = self.days_ahead_var.get()
         last_day = max(days_since_start)
         future_days = list(range(last_day + 1, last_day + days_ahead + 1))
-        predictions, _ = self.prediction_model.predict(future_days)
+        predictions, lower, upper = self.prediction_model.predict_interval(future_days)
         
         # Calculate threshold crossing
         crossing_date, days_until = self.prediction_model.calculate_threshold_crossing(
@@ -307,6 +321,14 @@ class PredictionTab:
             threshold=threshold
         )
         
+        # Spread of the crossing date from the coefficient uncertainty
+        crossing_range, _ = self.prediction_model.crossing_date_distribution(
+            start_day=last_day,
+            days_ahead=days_ahead,
+            start_date=dates[-1],
+            threshold=threshold
+        )
+        
         # Clear previous results
         self.result_text.delete(1.0, tk.END)
         
@@ -316,14 +338,25 @@ class PredictionTab:
         result_text += f"Asset Type: {asset_type_id}\n"
         result_text += f"Number of measurements: {len(dates)}\n"
         result_text += f"Date range: {min(dates)} to {max(dates)}\n"
-        result_text += f"Current wear: {wear_values[-1]:.2f} mm\n\n"
+        result_text += f"Current wear: {wear_values[-1]:.2f} mm\n"
+        result_text += f"Wear model: {self.prediction_model.family}"
+        if self.prediction_model.family == "polynomial":
+            result_text += f", fit method: {self.prediction_model.fit_method}"
+        elif self.prediction_model.family == "pooled":
+            result_text += f" ({self.prediction_model.rate:.4f} mm/day from TUL {tul_id} and {asset_type_id} assets)"
+        if self.prediction_model.weights is not None and self.prediction_model.fit_method != DEFAULT_FIT_METHOD:
+            result_text += f" ({int(sum(self.prediction_model.weights < 1.0))} readings down-weighted)"
+        result_text += "\n\n"
         result_text += f"Predicted wear in {days_ahead} days:\n"
         
         # Show a few prediction points
         for i, day in enumerate(future_days):
             if i % 10 == 0 or i == len(future_days) - 1:  # Show every 10th day and the last day
                 future_date = dates[-1] + timedelta(days=day - last_day)
-                result_text += f"{future_date}: {predictions[i]:.2f} mm\n"
+                if lower is not None:
+                    result_text += f"{future_date}: {predictions[i]:.2f} mm ({lower[i]:.2f} - {upper[i]:.2f})\n"
+                else:
+                    result_text += f"{future_date}: {predictions[i]:.2f} mm\n"
         
         result_text += f"\nMaintenance threshold: {threshold:.1f} mm\n"
         
@@ -334,10 +367,20 @@ class PredictionTab:
         else:
             result_text += f"Will not be reached within {days_ahead} days"
         
+        if crossing_range:
+            def date_text(date):
+                return date.strftime('%Y-%m-%d') if date else f"beyond {days_ahead} days"
+            
+            result_text += f"\n\nChance of reaching threshold within {days_ahead} days: {crossing_range['probability']:.0%}\n"
+            result_text += f"Crossing date P10: {date_text(crossing_range['p10'])}\n"
+            result_text += f"Crossing date P50: {date_text(crossing_range['p50'])}\n"
+            result_text += f"Crossing date P90: {date_text(crossing_range['p90'])}"
+        
         self.result_text.insert(tk.END, result_text)
         
         # Generate and display the plot
-        self.generate_plot(asset_id, tul_id, asset_type_id, dates, wear_values, future_days, predictions, threshold, crossing_date)
+        self.generate_plot(asset_id, tul_id, asset_type_id, dates, wear_values, future_days, predictions, threshold, crossing_date,
+                           interval=(lower, upper) if lower is not None else None)
         
         self.status_var.set(f"Prediction generated for {asset_id}")
         
@@ -349,7 +392,7 @@ class PredictionTab:
             return
             
         # Check if model has been trained
-        if self.prediction_model.model is None:
+        if not self.prediction_model.is_trained():
             # Generate prediction first
             self.generate_prediction()
             return
@@ -397,9 +440,73 @@ class PredictionTab:
             messagebox.showinfo("Maintenance Date", 
                 f"The maintenance threshold ({threshold:.1f} mm) will not be reached within the next 365 days.")
 
-    def generate_plot(self, asset_id, tul_id, asset_type_id, dates, wear_values, future_days, predictions, threshold, crossing_date):
+    def show_fleet_forecast(self):
+        """List the threshold crossing date of every asset of the selected type."""
+        asset_type_id = self.asset_type_var.get()
+        if not asset_type_id:
+            messagebox.showerror("Selection Error", "Please select an asset type.")
+            return
+        
+        days_ahead = self.days_ahead_var.get()
+        threshold, forecasts = self.prediction_service.crossing_dates(asset_type_id, days_ahead=days_ahead,
+                                                                      with_range=True)
+        if not forecasts:
+            messagebox.showinfo("Fleet Forecast", f"No measurements found for {asset_type_id} assets.")
+            return
+        
+        # Soonest crossings first, then assets that do not cross in the window
+        ordered = sorted(forecasts.items(),
+                         key=lambda item: (item[1]["days_until"] is None, item[1]["days_until"] or 0, item[0]))
+        
+        result_text = f"Fleet forecast for {asset_type_id} ({len(forecasts)} assets)\n"
+        result_text += f"Threshold: {threshold:.1f} mm, next {days_ahead} days\n"
+        # Fleet fits share one degree, so curved wear can cross earlier or later than in Predict
+        result_text += f"Degree {self.prediction_service.degree} fits for every asset\n\n"
+        for asset_id, forecast in ordered:
+            if forecast["crossing_date"]:
+                result_text += (f"{asset_id}: {forecast['crossing_date'].strftime('%Y-%m-%d')} "
+                                f"({forecast['days_until']} days, now {forecast['last_wear']:.2f} mm)")
+            else:
+                result_text += f"{asset_id}: not reached (now {forecast['last_wear']:.2f} mm)"
+            crossing_range = forecast["crossing_range"]
+            if crossing_range and crossing_range["p10"]:
+                p90 = crossing_range["p90"].strftime('%Y-%m-%d') if crossing_range["p90"] else "later"
+                result_text += f", P10-P90 {crossing_range['p10'].strftime('%Y-%m-%d')} to {p90}"
+            result_text += "\n"
+        
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, result_text)
+        
+        due = sum(1 for forecast in forecasts.values() if forecast["crossing_date"])
+        self.status_var.set(f"{due} of {len(forecasts)} {asset_type_id} assets reach the threshold within {days_ahead} days")
+        
+    def plan_maintenance(self):
+        """Show maintenance stops per TUL that keep all assets below their thresholds."""
+        start_date = datetime.now().date()
+        stops, unplanned = self.scheduler.plan(start_date=start_date)
+        
+        services = sum(len(stop["assets"]) for stop in stops)
+        result_text = f"Maintenance plan from {start_date} ({PLAN_HORIZON_DAYS} days)\n"
+        result_text += f"{services} asset services in {len(stops)} TUL stops\n\n"
+        
+        for stop in stops:
+            result_text += f"{stop['date'].strftime('%Y-%m-%d')}  {stop['tul_id']}\n"
+            for asset_id, deadline in stop["assets"]:
+                result_text += f"    {asset_id} (due {deadline.strftime('%Y-%m-%d')})\n"
+        
+        if unplanned:
+            result_text += f"\nCannot plan (no wear rate, or reset wear already at the threshold): {', '.join(unplanned)}"
+        
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, result_text)
+        self.status_var.set(f"Planned {services} asset services in {len(stops)} stops")
+        
+    def generate_plot(self, asset_id, tul_id, asset_type_id, dates, wear_values, future_days, predictions, threshold, crossing_date,
+                      interval=None):
         """Generate and display a plot with actual measurements and predictions."""
         try:
+            plt, FigureCanvasTkAgg = load_tk_backend()
+            
             # Clear previous content
             for widget in self.graph_frame.winfo_children():
                 widget.destroy()
@@ -417,6 +524,9 @@ class PredictionTab:
             
             # Plot prediction
             ax.plot(future_dates, predictions, 'g--', label='Predicted Wear')
+            if interval is not None:
+                ax.fill_between(future_dates, interval[0], interval[1], color='green', alpha=0.15,
+                                label='90% Prediction Interval')
             
             # Add maintenance threshold line
             ax.axhline(y=threshold, color='red', linestyle='--', 
@@ -452,7 +562,8 @@ class PredictionTab:
             
             # Create canvas
             canvas = FigureCanvasTkAgg(fig, master=self.graph_frame)
-            canvas.draw()
+            with span("plot.draw"):
+                canvas.draw()
             canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
             
         except Exception as e:
@@ -1,14 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from data.reference_cache import ReferenceDataCache
 
 class TULManagementTab:
     """Implements the TUL Management tab functionality."""
     
-    def __init__(self, parent, db_manager, status_var):
+    def __init__(self, parent, db_manager, status_var, reference_data=None):
         self.parent = parent
         self.db_manager = db_manager
         self.status_var = status_var
+        self.reference_data = reference_data or ReferenceDataCache(db_manager)
         
         # Variables for TUL form
         self.tul_id_var = tk.StringVar()
@@ -138,7 +140,7 @@ class TULManagementTab:
             self.tree.delete(item)
             
         # Get all TULs
-        tuls = self.db_manager.get_tuls()
+        tuls = self.reference_data.get_tuls()
         
         if not tuls:
             self.status_var.set("No TULs found in the database.")
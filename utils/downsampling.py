@@ -0,0 +1,96 @@
+# File: utils/downsampling.py
+
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most n_out points that preserve the visual shape
+    of the series. The first and last points are always kept.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the points between the first and last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+
+        # Average of the next bucket is the third triangle vertex
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[prev] - avg_x) * (bucket_y - y[prev]) -
+            (x[prev] - bucket_x) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(areas))
+        indices[i + 1] = prev
+
+    return indices
+
+
+def binned_percentiles(codes, days, values, n_series, bin_width, percentiles=(10, 25, 50, 75, 90)):
+    """Percentiles across series on a common grid of day bins.
+
+    codes identifies the series of each point (0..n_series-1). Each series
+    contributes its mean value per bin, and percentiles are taken across the
+    series present in that bin. Returns (bin_centres, {percentile: array}).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    days = np.asarray(days, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(days) == 0:
+        return np.array([]), {p: np.array([]) for p in percentiles}
+
+    bins = (days // bin_width).astype(np.int64)
+    n_bins = int(bins.max()) + 1
+
+    # Per-series mean in each bin, in one pass via a flattened (series, bin) key
+    key = codes * n_bins + bins
+    sums = np.bincount(key, weights=values, minlength=n_series * n_bins)
+    counts = np.bincount(key, minlength=n_series * n_bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grid = (sums / counts).reshape(n_series, n_bins)
+
+    # Only keep bins that at least one series reached
+    present = counts.reshape(n_series, n_bins).sum(axis=0) > 0
+    grid = grid[:, present]
+    centres = (np.flatnonzero(present) + 0.5) * bin_width
+
+    bands = np.nanpercentile(grid, percentiles, axis=0)
+    return centres, dict(zip(percentiles, bands))
+
+
+# Resolutions from finest to coarsest with their approximate period in days.
+# Raw readings are treated as at most one per day.
+RESOLUTION_PERIODS = (("raw", 1.0), ("W", 7.0), ("M", 30.44))
+
+# Horizontal pixels each plotted point should get at most
+PIXELS_PER_POINT = 4
+
+
+def choose_resolution(span_days, pixel_width, pixels_per_point=PIXELS_PER_POINT):
+    """Finest resolution whose points over span_days fit in pixel_width.
+
+    Returns "raw", "W" (weekly rollups) or "M" (monthly rollups).
+    """
+    budget = max(1, pixel_width // pixels_per_point)
+    for resolution, period_days in RESOLUTION_PERIODS:
+        if span_days / period_days <= budget:
+            return resolution
+    return RESOLUTION_PERIODS[-1][0]
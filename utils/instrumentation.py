@@ -0,0 +1,130 @@
+# File: utils/instrumentation.py
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Spans kept for the Performance tab and trace export
+MAX_SPANS = 5000
+
+class SpanRecorder:
+    """Keeps the most recent timing spans from every thread.
+    
+    Recording a span is one perf_counter_ns call on each side and a deque
+    append, so instrumentation can stay on in normal use.
+    """
+    
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.enabled = True
+        self.profiler = None
+        
+    def record(self, name, start_ns, end_ns):
+        """Store a finished span as (name, start ns, duration ns, thread ID)."""
+        self.spans.append((name, start_ns, end_ns - start_ns, threading.get_ident()))
+        
+    def clear(self):
+        """Drop all recorded spans."""
+        self.spans.clear()
+        
+    def recent(self, count=100):
+        """The most recent spans, newest first."""
+        spans = list(self.spans)
+        return spans[:-count - 1:-1]
+        
+    def summary(self):
+        """Per-name statistics as {name: (count, total ms, mean ms, max ms)}."""
+        totals = {}
+        for name, _, duration, _ in list(self.spans):
+            count, total, longest = totals.get(name, (0, 0, 0))
+            totals[name] = (count + 1, total + duration, max(longest, duration))
+        return {
+            name: (count, total / 1e6, total / count / 1e6, longest / 1e6)
+            for name, (count, total, longest) in totals.items()
+        }
+        
+    def start_profiling(self):
+        """Start a cProfile capture of the calling thread."""
+        if self.profiler is None:
+            # Profiling modules are only loaded when a capture is requested
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        
+    def stop_profiling(self, limit=30):
+        """Stop the cProfile capture and return the top functions by cumulative time."""
+        if self.profiler is None:
+            return ""
+        import io
+        import pstats
+        
+        self.profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        self.profiler = None
+        return output.getvalue()
+        
+    def export_chrome_trace(self, path):
+        """Write the recorded spans as a Chrome trace (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [
+            {"name": name, "cat": name.split(".")[0], "ph": "X", "ts": start / 1000,
+             "dur": duration / 1000, "pid": pid, "tid": tid}
+            for name, start, duration, tid in list(self.spans)
+        ]
+        try:
+            with open(path, "w") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            return True, f"Exported {len(events)} spans"
+        except OSError as e:
+            return False, f"Error exporting trace: {e}"
+
+recorder = SpanRecorder()
+
+class span:
+    """Context manager that records how long its block takes under name."""
+    
+    __slots__ = ("name", "start")
+    
+    def __init__(self, name):
+        self.name = name
+        
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        if recorder.enabled:
+            recorder.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+def timed(name=None):
+    """Decorator recording a span for every call; name defaults to the qualified name."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(span_name, start, time.perf_counter_ns())
+        return wrapper
+    return decorate
+
+def instrument_class(cls, prefix, methods=None):
+    """Wrap public methods of cls with timed spans named prefix.method.
+    
+    methods limits the wrapping to the given names. Returns cls.
+    """
+    names = methods or [name for name, value in vars(cls).items()
+                        if callable(value) and not name.startswith("_")]
+    for name in names:
+        setattr(cls, name, timed(f"{prefix}.{name}")(getattr(cls, name)))
+    return cls
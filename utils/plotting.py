@@ -0,0 +1,20 @@
+# File: utils/plotting.py
+
+_backend = None
+
+
+def load_tk_backend():
+    """Import matplotlib with the TkAgg backend on first use.
+
+    Returns a (pyplot, FigureCanvasTkAgg) tuple. Importing matplotlib costs
+    several hundred milliseconds, so the tabs call this when they first draw
+    a chart rather than at module import.
+    """
+    global _backend
+    if _backend is None:
+        import matplotlib
+        matplotlib.use('TkAgg')
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        _backend = (plt, FigureCanvasTkAgg)
+    return _backend
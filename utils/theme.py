@@ -0,0 +1,101 @@
+# File: utils/theme.py
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+DARK = "dark"
+LIGHT = "light"
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".tul_maintenance", "theme.json")
+
+
+def detect_system_theme():
+    """Detect whether the operating system is using a dark theme.
+
+    Only macOS needs a subprocess; it is never spawned on other platforms.
+    """
+    try:
+        if sys.platform == "darwin":
+            result = subprocess.run(
+                ['defaults', 'read', '-g', 'AppleInterfaceStyle'],
+                capture_output=True,
+                text=True,
+                timeout=2
+            )
+            return DARK if result.stdout.strip() == 'Dark' else LIGHT
+
+        if sys.platform == "win32":
+            import winreg
+            key = winreg.OpenKey(
+                winreg.HKEY_CURRENT_USER,
+                r"Software\Microsoft\Windows\CurrentVersion\Themes\Personalize"
+            )
+            with key:
+                value, _ = winreg.QueryValueEx(key, "AppsUseLightTheme")
+            return LIGHT if value else DARK
+
+        # Linux and others: only look at the environment, which is free
+        gtk_theme = os.environ.get("GTK_THEME", "").lower()
+        return DARK if gtk_theme.endswith((":dark", "-dark")) else LIGHT
+    except Exception:
+        # If there's any error, assume light mode
+        return LIGHT
+
+
+class ThemeDetector:
+    """Caches the system theme and refreshes it off the UI thread."""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH):
+        self.cache_path = cache_path
+        self.theme = None
+        self._results = queue.Queue()
+
+    def cached_theme(self):
+        """Return the last detected theme without running any detection."""
+        if self.theme is None:
+            self.theme = LIGHT
+            try:
+                with open(self.cache_path) as f:
+                    cached = json.load(f).get("theme")
+                if cached in (DARK, LIGHT):
+                    self.theme = cached
+            except (OSError, ValueError):
+                pass
+        return self.theme
+
+    def save(self, theme):
+        """Remember the detected theme for the next launch."""
+        self.theme = theme
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w") as f:
+                json.dump({"theme": theme}, f)
+        except OSError as e:
+            print(f"Error saving theme cache: {e}")
+
+    def detect_async(self, root, callback, poll_ms=50):
+        """Detect the theme on a worker thread and call callback(theme) from the Tk loop.
+
+        The callback only runs when the detected theme differs from the cached one.
+        """
+        previous = self.cached_theme()
+
+        def worker():
+            self._results.put(detect_system_theme())
+
+        def poll():
+            try:
+                theme = self._results.get_nowait()
+            except queue.Empty:
+                root.after(poll_ms, poll)
+                return
+            if theme != previous:
+                self.save(theme)
+                callback(theme)
+
+        threading.Thread(target=worker, name="theme-detect", daemon=True).start()
+        root.after(poll_ms, poll)